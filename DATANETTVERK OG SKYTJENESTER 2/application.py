@@ -18,7 +18,9 @@ def server(server, port, file, protocol,
            timeout=0.5,
            loss_prob=0.001,
            max_skips=0,
-           output=False):
+           output=False,
+           rcvbuf=0,
+           sndbuf=0):
     '''
     Description: This function implements the server side of the application.
     Parameters:
@@ -32,11 +34,14 @@ def server(server, port, file, protocol,
         loss_prob (float): probability of packet loss
         max_skips (int): maximum number of skipped ACKs
         output (bool): output mode (True: verbose, False: quiet)
+        rcvbuf (int): kernel receive buffer size in bytes (0: automatic)
+        sndbuf (int): kernel send buffer size in bytes (0: automatic)
     '''
     # Bind to server
     sock = DRTPSocket()
     # Configure socket
-    sock.config(payload_size, window, timeout, loss_prob, max_skips, output)
+    sock.config(payload_size, window, timeout, loss_prob, max_skips, output,
+                log_queue=LOG_QUEUE_SIZE, rcvbuf=rcvbuf, sndbuf=sndbuf)
 
     try:
         sock.bind((server, port))
@@ -65,7 +70,8 @@ def server(server, port, file, protocol,
     # Print statistics
     print('Received:', round(len(data) / 1000000, 2), 'MB')
     print('Time elapsed:', round(end - start, 2), 'seconds')
-    print('Throughput:', round(len(data) / (end - start) / 1000000, 2), 'Mbps\n')
+    print('Throughput:', round(len(data) / (end - start) / 1000000, 2), 'Mbps')
+    print_socket_stats(sock)
 
 
 ###################################################
@@ -78,7 +84,9 @@ def client(server, port, file, protocol,
            timeout=0.5,
            loss_prob=0.001,
            max_skips=1,
-           output=False):
+           output=False,
+           rcvbuf=0,
+           sndbuf=0):
     '''
     Description: This function implements the client side of the application.
     Parameters:
@@ -92,11 +100,14 @@ def client(server, port, file, protocol,
         loss_prob (float): probability of packet loss
         max_skips (int): maximum number of skipped ACKs
         output (bool): output mode (True: verbose, False: quiet)
+        rcvbuf (int): kernel receive buffer size in bytes (0: automatic)
+        sndbuf (int): kernel send buffer size in bytes (0: automatic)
     '''
     # Connect to server
     sock = DRTPSocket()
     # Configure socket
-    sock.config(payload_size, window, timeout, loss_prob, max_skips, output)
+    sock.config(payload_size, window, timeout, loss_prob, max_skips, output,
+                log_queue=LOG_QUEUE_SIZE, rcvbuf=rcvbuf, sndbuf=sndbuf)
 
     # Connect to server
     if not sock.connect((server, port)):
@@ -122,7 +133,24 @@ def client(server, port, file, protocol,
         sock.selective_repeat(data)
 
     # Print statistics
-    print('Sent:', round(len(data) / 1000000, 2), 'MB\n')
+    print('Sent:', round(len(data) / 1000000, 2), 'MB')
+    print_socket_stats(sock)
+
+
+def print_socket_stats(sock):
+    '''
+    Description: Prints the kernel socket buffer sizes and the number of datagrams dropped by the
+    kernel of this host, so that host-side drops can be told apart from loss on the network path.
+    Parameters:
+        sock (DRTPSocket): the socket used for the transfer
+    '''
+    stats = sock.stats
+    print('Socket buffers: rcvbuf', stats['rcvbuf'], 'bytes, sndbuf', stats['sndbuf'], 'bytes')
+    if stats['proc_drops'] is None and not sock.rxq_ovfl:
+        print('Host drops: not available')
+    else:
+        print('Host drops (receive buffer overflow):', sock.host_drops())
+    print()
 
 
 def parser():
@@ -155,6 +183,10 @@ def parser():
                         help='Test to be run: skipack (server-side), loss (client-side)')
     parser.add_argument('-o', '--output', action='store_true',
                         help='Print details of the packets sent and received')
+    parser.add_argument('--rcvbuf', default=RCVBUF,
+                        help='Kernel receive buffer size in bytes (0: sized from the window)')
+    parser.add_argument('--sndbuf', default=SNDBUF,
+                        help='Kernel send buffer size in bytes (0: sized from the window)')
 
     args = parser.parse_args()  # parse the command line arguments
 
@@ -236,6 +268,18 @@ def parser():
         print("Error: you must specify the path to the file")
         sys.exit(1)
 
+    # Check if the socket buffer sizes are valid
+    try:
+        args.rcvbuf = int(args.rcvbuf)
+        args.sndbuf = int(args.sndbuf)
+    except ValueError:
+        print("Error: socket buffer size must be an integer")
+        sys.exit(1)
+
+    if args.rcvbuf < 0 or args.sndbuf < 0:
+        print("Error: socket buffer size must be 0 or greater")
+        sys.exit(1)
+
     output = False
     if args.output:
         output = True
@@ -251,7 +295,9 @@ def parser():
                timeout=TIMEOUT,
                loss_prob=LOSS_PROB,
                max_skips=MAX_SKIP_ACKS if test else 0,
-               output=output)
+               output=output,
+               rcvbuf=args.rcvbuf,
+               sndbuf=args.sndbuf)
 
     elif args.client:
         client(server=args.server_ip,
@@ -263,7 +309,9 @@ def parser():
                timeout=TIMEOUT,
                loss_prob=LOSS_PROB,
                max_skips=MAX_LOSS_PACKETS if test else 0,
-               output=output)
+               output=output,
+               rcvbuf=args.rcvbuf,
+               sndbuf=args.sndbuf)
 
     else:
         sys.exit(1)
@@ -7,3 +7,6 @@ TIMEOUT = 0.5
 MAX_LOSS_PACKETS = 5
 MAX_SKIP_ACKS = 5
 LOSS_PROB = 0.001  # 0.1%
+LOG_QUEUE_SIZE = 10000  # max pending log messages with -o
+RCVBUF = 0  # kernel receive buffer in bytes (0: sized from WINDOW and PAYLOAD_SIZE)
+SNDBUF = 0  # kernel send buffer in bytes (0: sized from WINDOW and PAYLOAD_SIZE)
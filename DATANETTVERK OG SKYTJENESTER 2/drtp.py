@@ -1,8 +1,16 @@
+import os
 import socket
 import struct
 import random
 import time
 
+from drtplog import DRTPLogger, DEBUG, INFO
+
+# SO_RXQ_OVFL (Linux): the kernel attaches its per-socket drop counter to every received datagram
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40)
+# Kernel memory charged per queued datagram on top of the payload (skb overhead, truesize)
+SKB_OVERHEAD = 768
+
 
 class DRTPHeader:
     '''
@@ -95,6 +103,10 @@ class DRTPSocket:
         go_back_n(): Go Back N protocol
         selective_repeat(): Selective Repeat protocol
         recv(): receives a packet from the source address
+        recvfrom(): reads one datagram from the UDP socket
+        set_buffers(): sets the kernel socket buffer sizes
+        sample_drops(): samples the kernel drop counters of the socket
+        host_drops(): number of datagrams dropped by the kernel of this host
     '''
 
     def __init__(self):
@@ -111,6 +123,10 @@ class DRTPSocket:
         self.max_skips = 0
         self.num_skips = 0
         self.output = False
+        self.log = DRTPLogger(INFO)  # packet info is logged at DEBUG level when output is enabled
+        self.rxq_ovfl = False  # True if the kernel reports drops with SO_RXQ_OVFL
+        self.anc_size = 0  # size of the ancillary data buffer for recvmsg
+        self.stats = {'rcvbuf': 0, 'sndbuf': 0, 'rxq_ovfl_drops': 0, 'proc_drops': None}
 
     def bind(self, addr):
         '''
@@ -121,7 +137,8 @@ class DRTPSocket:
         '''
         self.sock.bind(addr)
 
-    def config(self, payload_size=1000, window=64, timeout=0.5, loss_prob=0.001, max_skips=0, output=False):
+    def config(self, payload_size=1000, window=64, timeout=0.5, loss_prob=0.001, max_skips=0, output=False,
+               log_queue=10000, rcvbuf=0, sndbuf=0):
         '''
         Description: Configures the socket with the given parameters.
         Parameters:
@@ -131,6 +148,9 @@ class DRTPSocket:
             loss_prob (float): the probability of packet loss or ack loss
             max_skips (int): the maximum number of skips
             output (bool): whether to print packet info or not
+            log_queue (int): max number of pending log messages before new ones are dropped
+            rcvbuf (int): kernel receive buffer size in bytes (0: sized from window and payload size)
+            sndbuf (int): kernel send buffer size in bytes (0: sized from window and payload size)
         Returns: None
         '''
         self.size = payload_size
@@ -139,6 +159,92 @@ class DRTPSocket:
         self.loss_prob = loss_prob
         self.max_skips = max_skips
         self.output = output
+        self.log = DRTPLogger(DEBUG if output else INFO, max_queue=log_queue)
+        self.set_buffers(rcvbuf, sndbuf)
+
+    def set_buffers(self, rcvbuf=0, sndbuf=0):
+        '''
+        Description: Sets the kernel receive and send buffer sizes of the UDP socket.
+        A size of 0 means the buffer is sized to hold a full window of packets. Buffers are never
+        made smaller than the kernel default. SO_RCVBUFFORCE/SO_SNDBUFFORCE are tried first so
+        root can go past net.core.rmem_max/wmem_max. It also enables SO_RXQ_OVFL when it is available.
+        Parameters:
+            rcvbuf (int): receive buffer size in bytes
+            sndbuf (int): send buffer size in bytes
+        Returns: None
+        '''
+        window_bytes = self.window_size * (self.size + 12 + SKB_OVERHEAD)
+        for name, size, opt, force in (
+                ('rcvbuf', rcvbuf, socket.SO_RCVBUF, getattr(socket, 'SO_RCVBUFFORCE', None)),
+                ('sndbuf', sndbuf, socket.SO_SNDBUF, getattr(socket, 'SO_SNDBUFFORCE', None))):
+            current = self.sock.getsockopt(socket.SOL_SOCKET, opt)
+            if size == 0:
+                # Linux doubles the requested value and reports the doubled value back
+                size = window_bytes if window_bytes * 2 > current else 0
+            if size:
+                forced = False
+                if force is not None:
+                    try:
+                        self.sock.setsockopt(socket.SOL_SOCKET, force, size)
+                        forced = True
+                    except OSError:
+                        pass  # not root
+                if not forced:
+                    self.sock.setsockopt(socket.SOL_SOCKET, opt, size)
+            self.stats[name] = self.sock.getsockopt(socket.SOL_SOCKET, opt)
+            if size and self.stats[name] < size:
+                self.log.info('Socket %s capped at %d bytes (requested %d)', name, self.stats[name], size)
+
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+            self.rxq_ovfl = True
+            self.anc_size = socket.CMSG_SPACE(4)
+        except (OSError, AttributeError):
+            self.rxq_ovfl = False
+
+    def recvfrom(self):
+        '''
+        Description: Reads one datagram from the UDP socket. If SO_RXQ_OVFL is enabled, the kernel
+        drop counter sent with the datagram is saved in the statistics.
+        Parameters: None
+        Returns (tuple): the datagram and the source address
+        '''
+        if not self.rxq_ovfl:
+            return self.sock.recvfrom(self.size + 12)
+        data, ancdata, flags, addr = self.sock.recvmsg(self.size + 12, self.anc_size)
+        for level, type_, value in ancdata:
+            if level == socket.SOL_SOCKET and type_ == SO_RXQ_OVFL and len(value) >= 4:
+                self.stats['rxq_ovfl_drops'] = struct.unpack('=I', value[:4])[0]
+        return data, addr
+
+    def sample_drops(self):
+        '''
+        Description: Samples the kernel drop counter of the socket from /proc/net/udp.
+        The socket is found by the inode of its file descriptor. The socket must still be open.
+        Parameters: None
+        Returns (int): number of datagrams dropped by the kernel, None if it is not available
+        '''
+        try:
+            inode = str(os.fstat(self.sock.fileno()).st_ino)
+            with open('/proc/net/udp') as f:
+                next(f)  # skip header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 12 and fields[9] == inode:
+                        self.stats['proc_drops'] = int(fields[-1])
+                        break
+        except (OSError, ValueError, StopIteration):
+            pass
+        return self.stats['proc_drops']
+
+    def host_drops(self):
+        '''
+        Description: Returns the number of datagrams dropped by the kernel of this host
+        (receive buffer overflow), as opposed to packets lost on the network path.
+        Parameters: None
+        Returns (int): number of dropped datagrams
+        '''
+        return max(self.stats['rxq_ovfl_drops'], self.stats['proc_drops'] or 0)
 
     def send(self, payload, ack_num=0, syn_flag=0, ack_flag=0, fin_flag=0, reset_flag=0, res=True):
         '''
@@ -169,20 +275,19 @@ class DRTPSocket:
             if skip != 1:
                 self.sock.sendto(packet.pack(), self.addr)
             else:
-                if self.output:
-                    if payload:
-                        print('Lost packet with seq_num',
-                              packet.header.seq_num)
-                    else:
-                        print('Lost ack for previous packet')
+                if payload:
+                    self.log.debug('Lost packet with seq_num %d',
+                                   packet.header.seq_num)
+                else:
+                    self.log.debug('Lost ack for previous packet')
                 self.num_skips += 1
         else:
             self.sock.sendto(packet.pack(), self.addr)
 
-        # Print packet info if output is enabled
+        # Log packet info if output is enabled (formatted lazily by the logger thread)
         if self.output and skip != 1 and res:
-            print('ack_num {} seq_num {}, flags: ACK {}, SYN {}, FIN {}, RST {}, Data sent: {}'.format(
-                ack_num, self.seq_num, ack_flag, syn_flag, fin_flag, reset_flag, len(payload)))
+            self.log.debug('ack_num %d seq_num %d, flags: ACK %d, SYN %d, FIN %d, RST %d, Data sent: %d',
+                           ack_num, self.seq_num, ack_flag, syn_flag, fin_flag, reset_flag, len(payload))
 
         # Add packet to send buffer and update seq_num
         if payload:
@@ -204,7 +309,7 @@ class DRTPSocket:
         # Wait for SYN-ACK
         try:
             self.sock.settimeout(self.timeout)
-            data, addr = self.sock.recvfrom(self.size + 12)
+            data, addr = self.recvfrom()
             packet = DRTPPacket.unpack(data)
             # Check if SYN-ACK is received and update ack_num
             if packet.header.syn_flag and packet.header.ack_flag:
@@ -212,13 +317,15 @@ class DRTPSocket:
             else:
                 raise socket.timeout
         except socket.timeout:
-            print('Connection timed out')
+            self.log.info('Connection timed out')
+            self.log.flush()
             return False
 
         # Send ACK
         self.send(b'', ack_flag=1)
         self.addr = addr
-        print('Connected to', addr)
+        self.log.info('Connected to %s', addr)
+        self.log.flush()
         return True
 
     def listen(self):
@@ -232,7 +339,7 @@ class DRTPSocket:
             while True:
                 try:
                     self.sock.settimeout(self.timeout)
-                    data, addr = self.sock.recvfrom(self.size + 12)
+                    data, addr = self.recvfrom()
                     packet = DRTPPacket.unpack(data)
                     # Check if SYN is received and update ack_num
                     if packet.header.syn_flag:
@@ -250,14 +357,15 @@ class DRTPSocket:
             # Wait for ACK
             try:
                 self.sock.settimeout(self.timeout)
-                data, addr = self.sock.recvfrom(self.size + 12)
+                data, addr = self.recvfrom()
                 packet = DRTPPacket.unpack(data)
                 # Check if ACK is received
                 if packet.header.ack_flag:
-                    print('Connected to', addr)
+                    self.log.info('Connected to %s', addr)
+                    self.log.flush()
                     break
             except socket.timeout:
-                print('Connection timed out')
+                self.log.info('Connection timed out')
                 continue
 
     def close(self):
@@ -272,7 +380,7 @@ class DRTPSocket:
         while True:
             try:
                 self.sock.settimeout(self.timeout)
-                data, addr = self.sock.recvfrom(self.size + 12)
+                data, addr = self.recvfrom()
                 packet = DRTPPacket.unpack(data)
                 # Check if FIN-ACK is received
                 if packet.header.ack_flag and packet.header.fin_flag:
@@ -281,15 +389,15 @@ class DRTPSocket:
                     raise socket.timeout
             except socket.timeout:
                 # Resend FIN
-                if self.output:
-                    print('Resending FIN')
+                self.log.debug('Resending FIN')
                 self.send(b'', fin_flag=1)
                 continue
 
+        self.sample_drops()
         self.sock.close()  # close socket
-        if self.output:
-            print('Connection closed\n')
-            print('Number of packets lost:', self.num_skips)
+        self.log.debug('Connection closed\n')
+        self.log.debug('Number of packets lost: %d', self.num_skips)
+        self.log.close()  # write pending messages before the application prints its statistics
 
         self.num_skips = 0  # reset number of skips for another transfer
 
@@ -307,7 +415,7 @@ class DRTPSocket:
         while seq_num < len(data):
             try:
                 self.sock.settimeout(self.timeout)
-                recv, addr = self.sock.recvfrom(self.size + 12)
+                recv, addr = self.recvfrom()
                 packet = DRTPPacket.unpack(recv)
                 # Check if ACK is received
                 if packet.header.ack_num == seq_num + 1:
@@ -322,16 +430,14 @@ class DRTPSocket:
                     seq_num += self.size
 
             except socket.timeout:
-                if self.output:
-                    print('Resending packet with seq_num {}'.format(
-                        seq_num - self.size + 1))
+                self.log.debug('Resending packet with seq_num %d',
+                               seq_num - self.size + 1)
                 # Resend the packet
                 self.sock.sendto(
                     self.send_buffer[seq_num - self.size + 1].pack(), self.addr)
                 continue
 
-        if self.output:
-            print('All packets sent')
+        self.log.debug('All packets sent')
 
         self.close()
 
@@ -356,7 +462,7 @@ class DRTPSocket:
         while self.send_buffer:
             try:
                 self.sock.settimeout(self.timeout)
-                recv, addr = self.sock.recvfrom(self.size + 12)
+                recv, addr = self.recvfrom()
                 packet = DRTPPacket.unpack(recv)
                 # Check if ACK is received
                 if packet.header.ack_num == seq_num + 1:
@@ -385,12 +491,10 @@ class DRTPSocket:
                 # Resend all packets in the send buffer
                 for seq_num_, packet in self.send_buffer.items():
                     self.sock.sendto(packet.pack(), self.addr)
-                    if self.output:
-                        print('Resending packet with seq_num', seq_num_)
+                    self.log.debug('Resending packet with seq_num %d', seq_num_)
                 continue
 
-        if self.output:
-            print('All packets sent')
+        self.log.debug('All packets sent')
 
         self.close()
 
@@ -421,7 +525,7 @@ class DRTPSocket:
                         raise socket.timeout
 
                     self.sock.settimeout(self.timeout)
-                    recv, addr = self.sock.recvfrom(self.size + 12)
+                    recv, addr = self.recvfrom()
                     packet = DRTPPacket.unpack(recv)
 
                     # Check if ACK is received and set a local seq_num variable
@@ -455,11 +559,9 @@ class DRTPSocket:
                 # Resend first packet in the send buffer
                 self.sock.sendto(
                     self.send_buffer[first].pack(), self.addr)
-                if self.output:
-                    print('Resending packet with seq_num', first)
+                self.log.debug('Resending packet with seq_num %d', first)
 
-        if self.output:
-            print('All packets sent')
+        self.log.debug('All packets sent')
 
         self.close()
 
@@ -472,24 +574,22 @@ class DRTPSocket:
         '''
         while True:
             try:
-                data, addr = self.sock.recvfrom(self.size + 12)
+                data, addr = self.recvfrom()
                 packet = DRTPPacket.unpack(data)
                 # Check if packet is expected and send ACK
                 if packet.header.seq_num >= self.ack_num:
                     # Check if packet is out of order
                     if packet.header.seq_num > self.ack_num:
                         if protocol in ['saw', 'gbn']:
-                            if self.output:
-                                print('Packet received out of order with seq_num',
-                                      packet.header.seq_num)
+                            self.log.debug('Packet received out of order with seq_num %d',
+                                           packet.header.seq_num)
                             continue
                         if protocol == 'sr':
                             pass
 
                     # Check if FIN is received and send ACK-FIN
                     if packet.header.fin_flag:
-                        if self.output:
-                            print('All packets received')
+                        self.log.debug('All packets received')
                         self.send(b'', ack_flag=1, fin_flag=1)
                         break
                     else:
@@ -505,10 +605,8 @@ class DRTPSocket:
                     res = False
                     # Check if packet is in the receive buffer, if not, add it
                     if packet.header.seq_num in self.recv_buffer:
-                        if self.output:
-                            print('Duplicate packet received with seq_num',
-                                  packet.header.seq_num)
-                        pass
+                        self.log.debug('Duplicate packet received with seq_num %d',
+                                       packet.header.seq_num)
                     else:
                         self.recv_buffer[packet.header.seq_num] = packet.payload
                         res = True  # print output
@@ -520,16 +618,14 @@ class DRTPSocket:
             except socket.timeout:
                 continue
 
+        self.sample_drops()
         self.sock.close()
 
-        if self.output:
-            print('Connection closed\n')
-            print('Number of ack lost:', self.num_skips)
+        self.log.debug('Connection closed\n')
+        self.log.debug('Number of ack lost: %d', self.num_skips)
+        self.log.close()  # write pending messages before the application prints its statistics
 
         self.num_skips = 0  # Reset number of skips for another transfer
 
-        # Return received data in order
-        data = b''
-        for seq_num in sorted(self.recv_buffer.keys()):
-            data += self.recv_buffer[seq_num]
-        return data
+        # Return received data in order (joined once, not copied for every packet)
+        return b''.join(self.recv_buffer[seq_num] for seq_num in sorted(self.recv_buffer.keys()))
@@ -0,0 +1,150 @@
+import queue
+import sys
+import threading
+
+# Log levels (same values as the standard logging module)
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+
+class DRTPLogger:
+    '''
+    Description: This class implements a levelled, asynchronous logger for the DRTP socket.
+    Messages are stored as a format string and its arguments and are only formatted by a
+    background thread, so logging a packet costs a level check and a queue put.
+    If the queue is full the message is dropped and counted instead of blocking the sender.
+    Methods:
+        debug(): logs a message with level DEBUG
+        info(): logs a message with level INFO
+        warning(): logs a message with level WARNING
+        error(): logs a message with level ERROR
+        enabled(): checks if a level is enabled
+        set_level(): changes the level of the logger
+        flush(): waits until all queued messages are written
+        close(): flushes the logger and stops the background thread
+    '''
+
+    def __init__(self, level=INFO, stream=None, max_queue=10000):
+        self.level = level
+        self.stream = stream  # None: sys.stdout when the message is written
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0  # number of messages dropped because the queue was full
+        self.write_error = None  # last error of the background thread (e.g. OSError when writing), None if no error
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _start(self):
+        '''
+        Description: Starts the background writer thread the first time a message is logged.
+        Parameters: None
+        Returns: None
+        '''
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        '''
+        Description: Background thread. Formats and writes queued messages in batches.
+        Parameters: None
+        Returns: None
+        '''
+        while True:
+            batch = [self.queue.get()]
+            # Take everything that is already queued so one write covers many messages
+            try:
+                while len(batch) < 1000:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stop = any(item is None for item in batch)
+            try:
+                lines = [fmt % args if args else fmt for fmt, args in (item for item in batch if item is not None)]
+                if lines:
+                    stream = self.stream or sys.stdout
+                    stream.write('\n'.join(lines) + '\n')
+                    stream.flush()
+            except Exception as e:
+                # The batch is lost, but the thread keeps running so flush() and close() do not wait forever
+                self.write_error = e
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                break
+
+    def log(self, level, fmt, *args):
+        '''
+        Description: Queues a message if its level is enabled.
+        Parameters:
+            level (int): the level of the message
+            fmt (str): %-style format string
+            args: arguments for the format string (formatted in the background thread)
+        Returns: None
+        '''
+        if level < self.level:
+            return
+        if self.thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait((fmt, args))
+        except queue.Full:
+            self.dropped += 1
+
+    def debug(self, fmt, *args):
+        if self.level <= DEBUG:
+            self.log(DEBUG, fmt, *args)
+
+    def info(self, fmt, *args):
+        self.log(INFO, fmt, *args)
+
+    def warning(self, fmt, *args):
+        self.log(WARNING, fmt, *args)
+
+    def error(self, fmt, *args):
+        self.log(ERROR, fmt, *args)
+
+    def enabled(self, level):
+        '''
+        Description: Checks if messages with the given level are logged.
+        Parameters:
+            level (int): the level to check
+        Returns (bool): True if the level is enabled
+        '''
+        return level >= self.level
+
+    def set_level(self, level):
+        self.level = level
+
+    def flush(self):
+        '''
+        Description: Waits until every queued message has been written.
+        Parameters: None
+        Returns: None
+        '''
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        '''
+        Description: Writes the remaining messages, reports dropped messages and write errors and stops the
+        background thread.
+        Parameters: None
+        Returns: None
+        '''
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.dropped:
+            stream = self.stream or sys.stdout
+            stream.write('Log messages dropped: {}\n'.format(self.dropped))
+            stream.flush()
+            self.dropped = 0
+        if self.write_error is not None:
+            sys.stderr.write('Log messages lost: {}\n'.format(self.write_error))
+            self.write_error = None
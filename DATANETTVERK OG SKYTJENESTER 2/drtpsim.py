@@ -0,0 +1,505 @@
+import argparse
+import collections
+import heapq
+import random
+import re
+import socket
+import sys
+import threading
+import time
+
+import drtp
+from drtp import DRTPSocket
+from config import *
+
+# Default link used by the command line (the r1 - r2 link of the portfolio topology)
+DEFAULT_BW = 40  # Mbit/s
+DEFAULT_DELAY = 10  # ms
+DEFAULT_QUEUE = 67  # packets
+DEFAULT_SIZE = '10MB'
+
+UDP_IP_OVERHEAD = 28  # IP + UDP header bytes counted on the link
+
+
+class SimulationAbort(BaseException):
+    '''
+    Description: Raised inside an endpoint thread to stop it when the simulation ends.
+    It derives from BaseException so that the "except socket.timeout" blocks in drtp.py do not catch it.
+    '''
+
+
+class VirtualTime:
+    '''
+    Description: Replacement for the time module inside drtp.py. It returns the virtual clock of the simulator.
+    Methods:
+        time(): returns the virtual time in seconds
+        monotonic(): same as time()
+        sleep(): not supported, endpoints must block on the socket
+    '''
+
+    def __init__(self, sim):
+        self.sim = sim
+
+    def time(self):
+        return self.sim.now
+
+    def monotonic(self):
+        return self.sim.now
+
+    def perf_counter(self):
+        return self.sim.now
+
+    def sleep(self, seconds):
+        raise RuntimeError('time.sleep() is not supported in the simulator')
+
+
+class SimLink:
+    '''
+    Description: One direction of a simulated link with a bandwidth, a propagation delay,
+    a drop-tail queue (in packets) and random loss.
+    Methods:
+        transmit(): returns the arrival time of a packet, or None if it is dropped
+    '''
+
+    def __init__(self, bandwidth, delay, queue, loss, rng):
+        self.bandwidth = bandwidth  # bits per second
+        self.delay = delay  # seconds
+        self.queue = queue  # max packets waiting or being sent
+        self.loss = loss  # probability of random loss
+        self.rng = rng
+        self.busy_until = 0.0  # time when the last queued packet has been sent
+        self.departures = collections.deque()  # departure times of the queued packets
+        self.sent = 0
+        self.queue_drops = 0
+        self.loss_drops = 0
+
+    def transmit(self, now, nbytes):
+        '''
+        Description: Puts a packet on the link.
+        Parameters:
+            now (float): virtual time when the packet is sent
+            nbytes (int): size of the packet including headers
+        Returns (float): arrival time at the other end, None if the packet is dropped
+        '''
+        # Remove packets that have left the queue
+        while self.departures and self.departures[0] <= now:
+            self.departures.popleft()
+
+        if len(self.departures) >= self.queue:
+            self.queue_drops += 1
+            return None
+
+        departure = max(now, self.busy_until) + nbytes * 8 / self.bandwidth
+        self.busy_until = departure
+        self.departures.append(departure)
+        self.sent += 1
+
+        if self.loss and self.rng.random() < self.loss:
+            self.loss_drops += 1
+            return None
+        return departure + self.delay
+
+
+class SimSocket:
+    '''
+    Description: Fake UDP socket used by DRTPSocket in the simulator. Packets go through a SimLink
+    and blocking calls hand control back to the simulator, which moves the virtual clock.
+    Methods:
+        bind(): sets the address of the socket
+        settimeout(): sets the timeout of recvfrom
+        sendto(): sends a datagram through the outgoing link
+        recvfrom(): waits for a datagram or a timeout on the virtual clock
+        close(): closes the socket
+    '''
+
+    def __init__(self, sim, name, addr, link):
+        self.sim = sim
+        self.name = name
+        self.addr = addr
+        self.link = link  # outgoing link
+        self.timeout = None
+        self.inbox = collections.deque()
+        self.waiting = False
+        self.deadline = None
+        self.finished = False
+        self.closed = False
+        self.options = {}
+        sim.sockets[addr] = self
+
+    def bind(self, addr):
+        del self.sim.sockets[self.addr]
+        self.addr = addr
+        self.sim.sockets[addr] = self
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def getsockopt(self, level, opt):
+        return self.options.get((level, opt), 212992)
+
+    def setsockopt(self, level, opt, value):
+        if opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            self.options[(level, opt)] = value * 2
+        else:
+            raise OSError('option not supported by the simulator')
+
+    def fileno(self):
+        return -1
+
+    def sendto(self, data, addr):
+        self.sim.send(self, data, addr)
+        return len(data)
+
+    def recvfrom(self, bufsize):
+        return self.sim.wait(self, bufsize)
+
+    def close(self):
+        self.closed = True
+
+
+class Simulator:
+    '''
+    Description: Runs the real DRTPSocket code of a sender and a receiver on a virtual clock.
+    Each endpoint runs in its own thread, but only one thread runs at a time. When an endpoint
+    blocks on recvfrom(), control goes back to the simulator, which jumps to the next packet
+    arrival or socket timeout. A run is therefore deterministic for a given seed.
+    Methods:
+        add_endpoint(): creates a DRTPSocket connected to the simulator
+        run(): runs the endpoints until they finish
+    '''
+
+    def __init__(self, bandwidth, delay, queue, loss=0.0, reverse_loss=None, seed=1, max_time=3600.0):
+        self.now = 0.0
+        self.max_time = max_time
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.forward = SimLink(bandwidth, delay, queue, loss, self.rng)
+        self.reverse = SimLink(bandwidth, delay, queue,
+                               loss if reverse_loss is None else reverse_loss, self.rng)
+        self.events = []  # heap of (arrival time, counter, destination address, data, source address)
+        self.counter = 0
+        self.sockets = {}  # key: address, value: SimSocket
+        self.endpoints = []  # list of (SimSocket, function, args)
+        self.cv = threading.Condition()
+        self.turn = None  # name of the endpoint that is allowed to run (None: the simulator)
+        self.aborted = False
+        self.reason = None
+        self.num_events = 0
+
+    def add_endpoint(self, name, addr, link):
+        '''
+        Description: Creates a DRTPSocket whose UDP socket is replaced by a SimSocket.
+        Parameters:
+            name (str): name of the endpoint
+            addr (tuple): address of the endpoint
+            link (SimLink): outgoing link of the endpoint
+        Returns (DRTPSocket): the socket
+        '''
+        sock = DRTPSocket()
+        sock.sock.close()
+        sock.sock = SimSocket(self, name, addr, link)
+        return sock
+
+    def send(self, sock, data, addr):
+        '''
+        Description: Schedules the arrival of a datagram at the destination address.
+        Parameters:
+            sock (SimSocket): the sending socket
+            data (bytes): the datagram
+            addr (tuple): the destination address
+        Returns: None
+        '''
+        arrival = sock.link.transmit(self.now, len(data) + UDP_IP_OVERHEAD)
+        if arrival is not None:
+            self.counter += 1
+            heapq.heappush(self.events, (arrival, self.counter, addr, data, sock.addr))
+
+    def wait(self, sock, bufsize):
+        '''
+        Description: Called by an endpoint thread in recvfrom(). Returns a datagram if one has arrived,
+        otherwise gives control to the simulator until a datagram arrives or the timeout expires.
+        Parameters:
+            sock (SimSocket): the receiving socket
+            bufsize (int): max size of the datagram
+        Returns (tuple): the datagram and the source address
+        '''
+        if self.aborted:
+            raise SimulationAbort
+        if not sock.inbox:
+            with self.cv:
+                sock.waiting = True
+                sock.deadline = None if sock.timeout is None else self.now + sock.timeout
+                self.turn = None
+                self.cv.notify_all()
+                while self.turn != sock.name:
+                    self.cv.wait()
+                sock.waiting = False
+            if self.aborted:
+                raise SimulationAbort
+            if not sock.inbox:
+                raise socket.timeout('timed out')
+        data, addr = sock.inbox.popleft()
+        return data[:bufsize], addr
+
+    def _switch(self, sock):
+        '''
+        Description: Lets an endpoint run until it blocks again or finishes.
+        Parameters:
+            sock (SimSocket): the endpoint to run
+        Returns: None
+        '''
+        with self.cv:
+            self.turn = sock.name
+            self.cv.notify_all()
+            while self.turn is not None:
+                self.cv.wait()
+
+    def _thread(self, sock, func, args, results):
+        with self.cv:
+            while self.turn != sock.name:
+                self.cv.wait()
+        try:
+            results[sock.name] = func(*args)
+        except SimulationAbort:
+            results[sock.name] = None
+        except BaseException as e:
+            results[sock.name] = e
+        finally:
+            with self.cv:
+                sock.finished = True
+                self.turn = None
+                self.cv.notify_all()
+
+    def _abort(self, reason):
+        self.aborted = True
+        self.reason = reason
+        for sock, func, args in self.endpoints:
+            if not sock.finished:
+                self._switch(sock)
+
+    def run(self, endpoints):
+        '''
+        Description: Runs the endpoints until all of them have finished.
+        drtp.time and drtp.random are replaced while the simulation runs.
+        Parameters:
+            endpoints (list): list of (DRTPSocket, function, args); the endpoints are started in this order
+        Returns (dict): key: endpoint name, value: return value of its function (or the exception)
+        '''
+        self.endpoints = [(s.sock, func, args) for s, func, args in endpoints]
+        results = {}
+        saved = drtp.time, drtp.random
+        drtp.time, drtp.random = VirtualTime(self), random.Random(self.seed + 1)
+        try:
+            threads = []
+            for sock, func, args in self.endpoints:
+                t = threading.Thread(target=self._thread, args=(sock, func, args, results), daemon=True)
+                threads.append(t)
+                t.start()
+                self._switch(sock)
+
+            while True:
+                active = [sock for sock, func, args in self.endpoints if not sock.finished]
+                if not active:
+                    break
+
+                next_packet = self.events[0][0] if self.events else float('inf')
+                waiter = min((s for s in active if s.waiting and s.deadline is not None),
+                             key=lambda s: s.deadline, default=None)
+                next_timeout = waiter.deadline if waiter else float('inf')
+
+                if next_packet == float('inf') and next_timeout == float('inf'):
+                    self._abort('deadlock: every endpoint waits without a timeout')
+                    break
+                if min(next_packet, next_timeout) > self.max_time:
+                    self.now = self.max_time
+                    self._abort('virtual time limit reached')
+                    break
+
+                self.num_events += 1
+                if next_packet <= next_timeout:
+                    self.now, _, addr, data, src = heapq.heappop(self.events)
+                    sock = self.sockets.get(addr)
+                    if sock is None or sock.closed or sock.finished:
+                        continue  # nobody is listening
+                    sock.inbox.append((data, src))
+                    if sock.waiting:
+                        self._switch(sock)
+                else:
+                    self.now = next_timeout
+                    self._switch(waiter)
+
+            for t in threads:
+                t.join()
+        finally:
+            drtp.time, drtp.random = saved
+        return results
+
+
+def simulate(data, protocol='saw',
+             bandwidth=DEFAULT_BW * 1000000,
+             delay=DEFAULT_DELAY / 1000,
+             queue=DEFAULT_QUEUE,
+             loss=0.0,
+             payload_size=PAYLOAD_SIZE,
+             window=WINDOW,
+             timeout=TIMEOUT,
+             loss_prob=LOSS_PROB,
+             max_skips=0,
+             seed=1,
+             max_time=3600.0):
+    '''
+    Description: Transfers data from a client to a server with DRTP over a simulated link.
+    Parameters:
+        data (bytes): data to be sent
+        protocol (str): protocol to be used (saw: Stop and Wait, gbn: Go Back N, sr: Selective Repeat)
+        bandwidth (float): link bandwidth in bits per second
+        delay (float): one-way delay in seconds
+        queue (int): queue size of the link in packets
+        loss (float): probability of random loss on the link (both directions)
+        payload_size (int): size of the payload
+        window (int): size of the window
+        timeout (float): timeout value
+        loss_prob (float): probability of packet loss simulated by DRTP itself
+        max_skips (int): maximum number of packets DRTP skips itself (-t loss)
+        seed (int): random seed
+        max_time (float): virtual time limit in seconds
+    Returns (dict): statistics of the transfer
+    '''
+    sim = Simulator(bandwidth, delay, queue, loss, seed=seed, max_time=max_time)
+    server = sim.add_endpoint('server', (SERVER, PORT), sim.reverse)
+    client = sim.add_endpoint('client', ('10.0.0.2', 50000), sim.forward)
+    server.config(payload_size, window, timeout, loss_prob, 0, False)
+    client.config(payload_size, window, timeout, loss_prob, max_skips, False)
+    server.bind((SERVER, PORT))
+
+    def receive():
+        server.listen()
+        return server.recv(protocol), sim.now
+
+    def send():
+        if not client.connect((SERVER, PORT)):
+            return False
+        start = sim.now
+        if protocol == 'saw':
+            client.stop_and_wait(data)
+        if protocol == 'gbn':
+            client.go_back_n(data)
+        if protocol == 'sr':
+            client.selective_repeat(data)
+        return start
+
+    wall_start = time.time()
+    results = sim.run([(server, receive, ()), (client, send, ())])
+    wall = time.time() - wall_start
+
+    for result in results.values():
+        if isinstance(result, BaseException):
+            raise result
+
+    # The transfer is done when the receiver has got the FIN (as in application.py)
+    received, end = results.get('server') or (None, sim.now)
+    start = results.get('client') or 0.0
+    elapsed = end - start
+    return {
+        'ok': received == data,
+        'aborted': sim.reason,
+        'bytes': len(received) if received else 0,
+        'virtual_time': elapsed,
+        'throughput': (len(received) * 8 / elapsed / 1000000) if received and elapsed > 0 else 0.0,
+        'wall_time': wall,
+        'events': sim.num_events,
+        'packets_sent': sim.forward.sent,
+        'acks_sent': sim.reverse.sent,
+        'queue_drops': sim.forward.queue_drops + sim.reverse.queue_drops,
+        'loss_drops': sim.forward.loss_drops + sim.reverse.loss_drops,
+    }
+
+
+def parse_size(size):
+    '''
+    Description: Converts a size like 1000B, 10KB, 5MB or 1GB to a number of bytes.
+    Parameters:
+        size (str): the size
+    Returns (int): number of bytes
+    '''
+    units = {'B': 1, 'KB': 1000, 'MB': 1000000, 'GB': 1000000000}
+    match = re.match(r'^(\d+)(B|KB|MB|GB)$', size)
+    if match is None:
+        raise ValueError('invalid size: ' + size)
+    return int(match.group(1)) * units[match.group(2)]
+
+
+def parser():
+    '''
+    Description: This function parses the command line arguments and runs the simulation.
+    Parameters: None
+    Return: None
+    '''
+    parser = argparse.ArgumentParser(
+        description="Runs a DRTP transfer over a simulated link on a virtual clock.")
+
+    parser.add_argument('-r', '--reliability', default=PROTOCOL,
+                        help='Reliability function to be used: saw, gbn, sr')
+    parser.add_argument('-n', '--num_bytes', default=DEFAULT_SIZE,
+                        help='Number of bytes to transfer (B, KB, MB or GB)')
+    parser.add_argument('--bw', default=DEFAULT_BW, type=float,
+                        help='Link bandwidth in Mbit/s')
+    parser.add_argument('--delay', default=DEFAULT_DELAY, type=float,
+                        help='One-way link delay in ms')
+    parser.add_argument('--queue', default=DEFAULT_QUEUE, type=int,
+                        help='Link queue size in packets')
+    parser.add_argument('--loss', default=0.0, type=float,
+                        help='Random loss probability on the link')
+    parser.add_argument('-w', '--window', default=WINDOW, type=int,
+                        help='Window size')
+    parser.add_argument('--timeout', default=TIMEOUT, type=float,
+                        help='Retransmission timeout in seconds')
+    parser.add_argument('-t', '--test', default=None,
+                        help='Test to be run: loss (DRTP skips packets itself)')
+    parser.add_argument('--seed', default=1, type=int,
+                        help='Random seed')
+    parser.add_argument('--max_time', default=3600.0, type=float,
+                        help='Virtual time limit in seconds')
+
+    args = parser.parse_args()
+
+    if args.reliability not in ["saw", "gbn", "sr"]:
+        print("Error: invalid reliability function")
+        sys.exit(1)
+    if args.test not in [None, "loss"]:
+        print("Error: invalid option for test")
+        sys.exit(1)
+    try:
+        size = parse_size(args.num_bytes)
+    except ValueError:
+        print("Error: invalid number of bytes")
+        sys.exit(1)
+    if args.bw <= 0 or args.delay < 0 or args.queue < 1 or not 0 <= args.loss < 1:
+        print("Error: invalid link parameters")
+        sys.exit(1)
+
+    data = random.Random(args.seed).randbytes(size)
+    stats = simulate(data, args.reliability,
+                     bandwidth=args.bw * 1000000,
+                     delay=args.delay / 1000,
+                     queue=args.queue,
+                     loss=args.loss,
+                     window=args.window,
+                     timeout=args.timeout,
+                     max_skips=MAX_LOSS_PACKETS if args.test else 0,
+                     seed=args.seed,
+                     max_time=args.max_time)
+
+    if stats['aborted']:
+        print('Simulation stopped:', stats['aborted'])
+    print('Transfer correct:', stats['ok'])
+    print('Received:', round(stats['bytes'] / 1000000, 2), 'MB')
+    print('Virtual time:', round(stats['virtual_time'], 2), 'seconds')
+    print('Throughput:', round(stats['throughput'], 2), 'Mbps')
+    print('Packets sent:', stats['packets_sent'], 'ACKs sent:', stats['acks_sent'])
+    print('Queue drops:', stats['queue_drops'], 'Random loss:', stats['loss_drops'])
+    print('Wall time:', round(stats['wall_time'], 2), 'seconds\n')
+
+
+if __name__ == "__main__":
+    parser()
@@ -0,0 +1,654 @@
+import argparse
+import array
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # the summaries are computed with plain Python
+
+from netsim import Network, default_measurements, default_topology
+from topology import load_topology
+
+# Global variables
+default_cache = os.path.join(default_measurements, '.cache')
+cache_version = 1  # cached files of another version are parsed again
+
+# Columns of each table and their type: 'd' float, 'q' integer (array.array type codes), 's' string
+schemas = {
+    # one row per ping reply
+    'rtt': [('test_case', 's'), ('label', 's'), ('pair', 's'), ('link', 's'), ('run', 'q'),
+            ('seq', 'q'), ('ttl', 'q'), ('rtt_ms', 'd')],
+    # one row per ping run (the statistics at the end)
+    'ping': [('test_case', 's'), ('label', 's'), ('pair', 's'), ('link', 's'), ('run', 'q'),
+             ('transmitted', 'q'), ('received', 'q')],
+    # one row per interval or summary line of iperf and simpleperf
+    'rate': [('test_case', 's'), ('label', 's'), ('pair', 's'), ('link', 's'), ('run', 'q'),
+             ('tool', 's'), ('side', 's'), ('stream', 's'), ('summary', 'q'), ('start', 'd'), ('end', 'd'),
+             ('bytes', 'q'), ('bits_per_second', 'd'), ('jitter_ms', 'd'), ('lost', 'q'), ('packets', 'q')],
+}
+
+# Line formats
+ping_reply = re.compile(r'icmp_seq=(\d+) ttl=(\d+) time=([\d.]+) ms')
+ping_stats = re.compile(r'(\d+) packets transmitted, (\d+) (?:packets )?received')
+iperf_line = re.compile(r'^\[\s*(\w+)\]\s+([\d.]+)\s*-\s*([\d.]+) sec\s+([\d.]+) (\w?)Bytes\s+([\d.]+) (\w?)bits/sec'
+                        r'(?:\s+([\d.]+) ms\s+(\d+)/\s*(\d+))?')
+simpleperf_line = re.compile(r'^(\d+\.\d+\.\d+\.\d+:\d+|\[SUM\])\t+([\d.]+) - ([\d.]+)\t+([\d.]+) (B|KB|MB)\t+'
+                             r'([\d.]+) Mbps')
+file_name = re.compile(r'^(latency|throughput)_(?:udp_)?(?:(iperf|simpleperf)_)?(?:(L\d+)|(\w+?)-(\w+?))'
+                       r'(?:-(\d+))?$')
+
+iperf_bytes = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}  # iperf counts bytes in powers of 2
+iperf_bits = {'': 1, 'K': 1000, 'M': 1000 ** 2, 'G': 1000 ** 3}
+simpleperf_bytes = {'B': 1, 'KB': 1000, 'MB': 1000000}
+
+
+class Table:
+    '''
+    Description: A table stored by column. Numbers are kept in typed arrays (array.array), which NumPy
+    can use without copying, and strings in lists.
+    Methods:
+        append(): adds a row
+        extend(): adds the rows of another table
+        column(): one column (a NumPy array when NumPy is available)
+        groups(): row numbers of every value of one or more columns
+        to_dict() / from_dict(): plain lists, for the cache
+    '''
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = {name: [] if kind == 's' else array.array(kind) for name, kind in schema}
+
+    def __len__(self):
+        return len(self.columns[self.schema[0][0]])
+
+    def append(self, row):
+        for name, kind in self.schema:
+            value = row.get(name)
+            if value is None:
+                value = '' if kind == 's' else -1 if kind == 'q' else math.nan
+            self.columns[name].append(value)
+
+    def extend(self, other):
+        for name, kind in self.schema:
+            self.columns[name].extend(other.columns[name])
+
+    def column(self, name):
+        values = self.columns[name]
+        if np is None:
+            return values
+        if isinstance(values, array.array):
+            return np.frombuffer(values, dtype=np.float64 if values.typecode == 'd' else np.int64)
+        return np.array(values, dtype=object)
+
+    def groups(self, *names):
+        result = {}
+        for i, key in enumerate(zip(*(self.columns[name] for name in names))):
+            result.setdefault(key, []).append(i)
+        return result
+
+    def to_dict(self):
+        return {name: list(values) for name, values in self.columns.items()}
+
+    @classmethod
+    def from_dict(cls, schema, data):
+        table = cls(schema)
+        for name, kind in schema:
+            table.columns[name] = list(data[name]) if kind == 's' else array.array(kind, data[name])
+        return table
+
+
+def parse_lines(lines):
+    '''
+    Description: Parses the output of ping, iperf and simpleperf (text, --json and --jsonl) line by line.
+    The format is recognised per line, so files with any mix of CRLF and LF line ends are read the same way.
+    Parameters:
+        lines: iterable of lines
+    Returns:
+        generator of (table name, row)
+    '''
+    side = ''  # 'server' or 'client', from the header of simpleperf and iperf
+    document = None  # lines of a JSON document of simpleperf --json
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if document is not None:
+            document.append(line)
+            continue
+        if line.startswith('{'):
+            try:
+                yield from parse_record(json.loads(line))
+            except ValueError:
+                document = [line]  # the start of a --json document
+            continue
+
+        match = ping_reply.search(line)
+        if match:
+            yield 'rtt', {'seq': int(match.group(1)), 'ttl': int(match.group(2)), 'rtt_ms': float(match.group(3))}
+            continue
+        match = ping_stats.search(line)
+        if match:
+            yield 'ping', {'transmitted': int(match.group(1)), 'received': int(match.group(2))}
+            continue
+
+        match = simpleperf_line.match(line)
+        if match:
+            stream, start, end, size, unit, rate = match.groups()
+            yield 'rate', {'tool': 'simpleperf', 'side': side, 'stream': stream, 'start': float(start),
+                           'end': float(end), 'bytes': int(float(size) * simpleperf_bytes[unit]),
+                           'bits_per_second': float(rate) * 1000000}
+            continue
+        match = iperf_line.match(line)
+        if match:
+            stream, start, end, size, size_unit, rate, rate_unit, jitter, lost, packets = match.groups()
+            yield 'rate', {'tool': 'iperf', 'side': side, 'stream': stream, 'start': float(start), 'end': float(end),
+                           'bytes': int(float(size) * iperf_bytes[size_unit.upper()]),
+                           'bits_per_second': float(rate) * iperf_bits[rate_unit.upper()],
+                           'jitter_ms': float(jitter) if jitter else None,
+                           'lost': int(lost) if lost else None, 'packets': int(packets) if packets else None}
+            continue
+
+        if 'server is listening' in line or 'Server listening' in line or line.startswith('Server results'):
+            side = 'server'
+        elif 'client connecting' in line or 'Client connecting' in line:
+            side = 'client'
+
+    if document is not None:
+        try:
+            data = json.loads('\n'.join(document))
+        except ValueError:
+            return
+        for section in ('intervals', 'streams', 'server_streams'):
+            for record in data.get(section, []):
+                yield from parse_record(record, data.get('role', ''))
+
+
+def parse_record(record, role=''):
+    '''
+    Description: Converts one JSON record of simpleperf (interval, stream or server) to a row
+    Parameters:
+        record: the record
+        role: 'server' or 'client', the role of the document the record is from
+    Returns:
+        generator of (table name, row)
+    '''
+    if record.get('type') not in ('interval', 'stream', 'server') or 'bytes' not in record:
+        return
+    yield 'rate', {'tool': 'simpleperf', 'side': 'server' if record['type'] == 'server' else role,
+                   'stream': record.get('stream', ''), 'summary': 0 if record['type'] == 'interval' else 1,
+                   'start': record['start'], 'end': record['end'], 'bytes': record['bytes'],
+                   'bits_per_second': record['bits_per_second'], 'jitter_ms': record.get('jitter_ms'),
+                   'lost': record.get('lost'), 'packets': record.get('packets')}
+
+
+def mark_summaries(rows):
+    '''
+    Description: Marks the summary lines of the text output: per stream and side, the line that starts at 0
+    and lasts the longest is the summary when the stream has interval lines too, or is the only line
+    Parameters:
+        rows: rows of the rate table of one file
+    Returns:
+        None
+    '''
+    streams = {}
+    for row in rows:
+        if 'summary' not in row:
+            streams.setdefault((row['side'], row['stream']), []).append(row)
+    for lines in streams.values():
+        longest = max(lines, key=lambda row: (row['start'] == 0, row['end'] - row['start']))
+        for row in lines:
+            row['summary'] = 1 if row is longest and row['start'] == 0 else 0
+
+
+class Tagger:
+    '''
+    Description: Finds the tags of a measurement file from its path: test case, label, host pair, run and the
+    shaped links on the path between the hosts (from the topology), e.g. test-case-4/latency_h1-h4-2.txt is
+    h1-h4, run 2, over L1+L2.
+    '''
+
+    def __init__(self, topo):
+        self.topo = topo
+        self.network = Network(topo) if topo else None
+        self.links = {link['name']: (link['a'], link['b']) for link in topo['links'] if link.get('name')} \
+            if topo else {}
+        # The pair and link tags depend on the topology, so cached files tagged with another topology are not used
+        self.digest = hashlib.sha1(json.dumps(topo, sort_keys=True).encode()).hexdigest() if topo else None
+
+    def tags(self, path):
+        label = os.path.splitext(os.path.basename(path))[0]
+        tags = {'test_case': os.path.basename(os.path.dirname(os.path.abspath(path))), 'label': label,
+                'pair': '', 'link': '', 'run': None}
+        match = file_name.match(label)
+        if not match:
+            return tags
+        kind, tool, link, a, b, run = match.groups()
+        if link:
+            tags['link'] = link
+            if link in self.links:
+                tags['pair'] = '-'.join(self.links[link])
+        else:
+            tags['pair'] = '{}-{}'.format(a, b)
+            if self.network is not None:
+                try:
+                    ports = self.network.path(a, b)
+                except (ValueError, KeyError):
+                    ports = []
+                tags['link'] = '+'.join(port.name.split()[0] for port in ports)
+        tags['run'] = int(run) if run else None
+        return tags
+
+
+def parse_file(path, tags, intervals_only=False):
+    '''
+    Description: Parses one measurement file into tables
+    Parameters:
+        path: path to the file
+        tags: values of the tag columns of every row
+        intervals_only: keep only the interval lines of the rate table (client logs, whose totals are
+                        already in the measurement file)
+    Returns:
+        dictionary of tables (key: table name)
+    '''
+    tables = {name: Table(schema) for name, schema in schemas.items()}
+    rates = []
+    with open(path, errors='replace') as f:  # universal newlines: CRLF and LF
+        for name, row in parse_lines(f):
+            row.update(tags)
+            if name == 'rate':
+                rates.append(row)
+            elif not intervals_only:
+                tables[name].append(row)
+    mark_summaries(rates)
+    for row in rates:
+        if not (intervals_only and row['summary']):
+            tables['rate'].append(row)
+    return tables
+
+
+class Store:
+    '''
+    Description: The tables of all measurement files. Files that did not change since they were last read
+    (same size and modification time, tagged with the same topology) are loaded from the cache instead of
+    being parsed again.
+    Methods:
+        add(): adds a file (from the cache or parsed)
+        table(): one table over all files
+    '''
+
+    def __init__(self, tagger, cache=None):
+        self.tagger = tagger
+        self.cache = cache
+        self.files = {}  # key: path, value: dictionary of tables
+        self.parsed = 0  # files parsed (not found in the cache)
+
+    def add(self, path, tag_path=None, intervals_only=False):
+        '''
+        Description: Adds a file from the cache, or parses it
+        Parameters:
+            path: path to the file
+            tag_path: path the tags are taken from (None: path), e.g. the measurement file of a client log
+            intervals_only: keep only the interval lines (see parse_file())
+        Returns:
+            None
+        '''
+        tag_path = tag_path or path
+        stat = os.stat(path)
+        key = {'version': cache_version, 'path': os.path.abspath(path), 'size': stat.st_size,
+               'mtime_ns': stat.st_mtime_ns, 'topology': self.tagger.digest, 'tags': os.path.abspath(tag_path),
+               'intervals_only': intervals_only}
+        tables = self.load_cached(key)
+        if tables is None:
+            tables = parse_file(path, self.tagger.tags(tag_path), intervals_only)
+            self.parsed += 1
+            self.save_cached(key, tables)
+        self.files[path] = tables
+
+    def cache_path(self, key):
+        return os.path.join(self.cache, hashlib.sha1(key['path'].encode()).hexdigest() + '.json')
+
+    def load_cached(self, key):
+        if self.cache is None:
+            return None
+        try:
+            with open(self.cache_path(key)) as f:
+                data = json.load(f)
+            if data['key'] != key:
+                return None
+            return {name: Table.from_dict(schemas[name], data['tables'][name]) for name in schemas}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_cached(self, key, tables):
+        if self.cache is None:
+            return
+        try:
+            os.makedirs(self.cache, exist_ok=True)
+            path = self.cache_path(key)
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'key': key, 'tables': {name: table.to_dict() for name, table in tables.items()}}, f)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass  # the cache is only an optimisation
+
+    def table(self, name):
+        result = Table(schemas[name])
+        for tables in self.files.values():
+            result.extend(tables[name])
+        return result
+
+
+def load(directory=default_measurements, topology=default_topology, cache=default_cache):
+    '''
+    Description: Reads every .txt file in the test case directories of a measurements directory, and the
+    interval lines of the client logs that orchestrate.py writes to test-case-N/logs/<label>-<n>.txt (with -i
+    only the clients print interval lines). The log rows get the tags of test-case-N/<label>.txt.
+    Parameters:
+        directory: measurements directory (test-case-N/*.txt)
+        topology: topology description for the links of the host pairs (None: no links)
+        cache: cache directory (None: always parse)
+    Returns:
+        the Store
+    '''
+    topo = load_topology(topology) if topology else None
+    store = Store(Tagger(topo), cache)
+    for case in sorted(os.listdir(directory)):
+        case_dir = os.path.join(directory, case)
+        if not os.path.isdir(case_dir) or case.startswith('.'):
+            continue
+        for name in sorted(os.listdir(case_dir)):
+            if name.endswith('.txt'):
+                store.add(os.path.join(case_dir, name))
+        logs = os.path.join(case_dir, 'logs')
+        if os.path.isdir(logs):
+            for name in sorted(os.listdir(logs)):
+                measurement = os.path.join(case_dir, name[:-len('.txt')].rsplit('-', 1)[0] + '.txt')
+                if name.endswith('.txt') and os.path.isfile(measurement):
+                    store.add(os.path.join(logs, name), measurement, intervals_only=True)
+    return store
+
+
+###################################################
+################### STATISTICS ####################
+###################################################
+
+def percentile(values, q):
+    '''
+    Description: Percentile with linear interpolation between the closest ranks (like numpy.percentile)
+    Parameters:
+        values: the values
+        q: percentile between 0 and 100
+    Returns:
+        the percentile (nan without values)
+    '''
+    if np is not None:
+        return float(np.percentile(values, q)) if len(values) else math.nan
+    values = sorted(values)
+    if not values:
+        return math.nan
+    rank = (len(values) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def stats(values):
+    '''
+    Description: Mean, standard deviation, minimum and maximum of the values
+    Parameters:
+        values: the values
+    Returns:
+        (mean, standard deviation, minimum, maximum), nan without values
+    '''
+    if not len(values):
+        return math.nan, math.nan, math.nan, math.nan
+    if np is not None:
+        a = np.asarray(values, dtype=np.float64)
+        return float(a.mean()), float(a.std()), float(a.min()), float(a.max())
+    mean = sum(values) / len(values)
+    std = math.sqrt(sum((x - mean) ** 2 for x in values) / len(values))
+    return mean, std, min(values), max(values)
+
+
+def take(table, name, rows):
+    '''
+    Description: The values of one column in the given rows
+    Parameters:
+        table: the Table
+        name: name of the column
+        rows: list of row numbers
+    Returns:
+        NumPy array or list
+    '''
+    column = table.column(name)
+    if np is not None:
+        return column[np.asarray(rows, dtype=np.int64)]
+    return [column[i] for i in rows]
+
+
+def latency_summary(store):
+    '''
+    Description: RTT statistics per ping file: mean, percentiles, jitter (mean difference of consecutive RTTs)
+    and loss
+    Parameters:
+        store: the Store
+    Returns:
+        list of dictionaries, one per file
+    '''
+    rtt = store.table('rtt')
+    ping = store.table('ping')
+    counts = {key: rows[-1] for key, rows in ping.groups('test_case', 'label').items()}
+    result = []
+    for key, rows in sorted(rtt.groups('test_case', 'label').items()):
+        values = take(rtt, 'rtt_ms', rows)
+        mean, std, low, high = stats(values)
+        if np is not None:
+            jitter = float(np.abs(np.diff(values)).mean()) if len(values) > 1 else math.nan
+        else:
+            jitter = sum(abs(b - a) for a, b in zip(values, values[1:])) / (len(values) - 1) \
+                if len(values) > 1 else math.nan
+        summary = {'test_case': key[0], 'label': key[1], 'pair': rtt.columns['pair'][rows[0]],
+                   'link': rtt.columns['link'][rows[0]], 'replies': len(values), 'mean_ms': mean, 'std_ms': std,
+                   'min_ms': low, 'p50_ms': percentile(values, 50), 'p90_ms': percentile(values, 90),
+                   'p99_ms': percentile(values, 99), 'max_ms': high, 'jitter_ms': jitter, 'loss': math.nan}
+        if key in counts:
+            i = counts[key]
+            transmitted = ping.columns['transmitted'][i]
+            summary['loss'] = 100 * (transmitted - ping.columns['received'][i]) / transmitted if transmitted else 0
+        result.append(summary)
+    return result
+
+
+def rate_rows(rate, rows):
+    '''
+    Description: Chooses the rows of one file of the rate table to use: the summary lines of the server side when
+    both sides are in the file, and the interval lines of the same side if it has any. Streams shorter than a
+    tenth of the longest one (e.g. iperf reporting a second, empty connection) are left out.
+    Parameters:
+        rate: the rate Table
+        rows: row numbers of one file
+    Returns:
+        (side, row numbers of the summaries, row numbers of the intervals)
+    '''
+    summaries = {}  # key: side
+    intervals = {}
+    for i in rows:
+        if rate.columns['stream'][i] != '[SUM]':
+            (summaries if rate.columns['summary'][i] else intervals).setdefault(rate.columns['side'][i], []).append(i)
+    side = 'server' if 'server' in summaries else next(iter(summaries), '')
+    summaries = summaries.get(side, [])
+    # the interval lines can be on the other side (e.g. the client's --jsonl and the server's totals)
+    intervals = intervals.get(side) or intervals.get('server') or next(iter(intervals.values()), [])
+    longest = max((rate.columns['end'][i] - rate.columns['start'][i] for i in summaries), default=0)
+    summaries = [i for i in summaries if rate.columns['end'][i] - rate.columns['start'][i] >= longest / 10]
+    return side, summaries, intervals
+
+
+def throughput_summary(store):
+    '''
+    Description: Throughput per iperf/simpleperf file: total rate of the streams (from the summary lines chosen
+    by rate_rows()), statistics of the interval rates, and jitter and loss of UDP
+    Parameters:
+        store: the Store
+    Returns:
+        list of dictionaries, one per file
+    '''
+    rate = store.table('rate')
+    result = []
+    for key, rows in sorted(rate.groups('test_case', 'label').items()):
+        side, summaries, intervals = rate_rows(rate, rows)
+        stream_rates = take(rate, 'bits_per_second', summaries)
+        interval_rates = take(rate, 'bits_per_second', intervals)
+        mean, std, low, high = stats([x / 1000000 for x in interval_rates])
+        jitter = [x for x in take(rate, 'jitter_ms', summaries) if not math.isnan(x)]
+        lost = [x for x in take(rate, 'lost', summaries) if x >= 0]
+        packets = [x for x in take(rate, 'packets', summaries) if x >= 0]
+        result.append({
+            'test_case': key[0], 'label': key[1], 'pair': rate.columns['pair'][rows[0]] if rows else '',
+            'link': rate.columns['link'][rows[0]] if rows else '', 'tool': rate.columns['tool'][rows[0]] if rows else '',
+            'side': side, 'streams': len(summaries), 'mbps': float(sum(stream_rates)) / 1000000,
+            'stream_mbps': [float(x) / 1000000 for x in stream_rates], 'intervals': len(intervals),
+            'interval_mean_mbps': mean, 'interval_std_mbps': std, 'interval_min_mbps': low, 'interval_max_mbps': high,
+            'jitter_ms': sum(jitter) / len(jitter) if jitter else math.nan,
+            'loss': 100 * sum(lost) / sum(packets) if packets and sum(packets) else math.nan})
+    return result
+
+
+def export(store, directory):
+    '''
+    Description: Writes every table to a file: Parquet when pyarrow is installed, CSV otherwise
+    Parameters:
+        store: the Store
+        directory: output directory
+    Returns:
+        list of the written files
+    '''
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        pyarrow = None
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for name in schemas:
+        table = store.table(name)
+        if pyarrow is not None:
+            path = os.path.join(directory, name + '.parquet')
+            pyarrow.parquet.write_table(pyarrow.table(table.to_dict()), path)
+        else:
+            path = os.path.join(directory, name + '.csv')
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow([column for column, kind in table.schema])
+                writer.writerows(zip(*(table.columns[column] for column, kind in table.schema)))
+        written.append(path)
+    return written
+
+
+def to_json(data):
+    '''
+    Description: Converts results to JSON text; missing values (nan) become null, as JSON has no nan
+    Parameters:
+        data: dictionaries, lists and numbers
+    Returns:
+        JSON text
+    '''
+    def clean(value):
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        if isinstance(value, dict):
+            return {key: clean(x) for key, x in value.items()}
+        if isinstance(value, list):
+            return [clean(x) for x in value]
+        return value
+    return json.dumps(clean(data), indent=2)
+
+
+def fmt(value, digits=2):
+    return '-' if value is None or (isinstance(value, float) and math.isnan(value)) else f"{value:.{digits}f}"
+
+
+def print_summaries(latency, throughput):
+    '''
+    Description: Prints the latency and throughput summaries as tables
+    Parameters:
+        latency: from latency_summary()
+        throughput: from throughput_summary()
+    Returns:
+        None
+    '''
+    print("Latency (ms)")
+    print(f"{'File':<32}{'Pair':<8}{'Link':<10}{'Pings':>6}{'Loss%':>7}{'Mean':>9}{'p50':>9}{'p90':>9}"
+          f"{'p99':>9}{'Max':>9}{'Jitter':>9}")
+    for s in latency:
+        name = s['test_case'] + '/' + s['label']
+        print(f"{name:<32}{s['pair']:<8}{s['link']:<10}{s['replies']:>6}{fmt(s['loss'], 0):>7}{fmt(s['mean_ms']):>9}"
+              f"{fmt(s['p50_ms']):>9}{fmt(s['p90_ms']):>9}{fmt(s['p99_ms']):>9}{fmt(s['max_ms']):>9}"
+              f"{fmt(s['jitter_ms']):>9}")
+    print()
+    print("Throughput (Mbps)")
+    print(f"{'File':<40}{'Pair':<8}{'Link':<10}{'Tool':<12}{'Streams':>8}{'Total':>9}{'Intervals':>10}"
+          f"{'Mean':>9}{'Min':>9}{'Max':>9}{'Jitter':>8}{'Loss%':>7}")
+    for s in throughput:
+        name = s['test_case'] + '/' + s['label']
+        print(f"{name:<40}{s['pair']:<8}{s['link']:<10}{s['tool']:<12}{s['streams']:>8}{fmt(s['mbps']):>9}"
+              f"{s['intervals']:>10}{fmt(s['interval_mean_mbps']):>9}{fmt(s['interval_min_mbps']):>9}"
+              f"{fmt(s['interval_max_mbps']):>9}{fmt(s['jitter_ms'], 3):>8}{fmt(s['loss'], 1):>7}")
+
+
+def main():
+    '''
+    Description: This function parses the command line arguments, reads the measurements and prints the summaries.
+    Parameters:
+        None
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(
+        description="Reads ping, iperf and simpleperf measurements into tables and prints their statistics")
+    parser.add_argument('-m', '--measurements', default=default_measurements,
+                        help='Measurements directory (test-case-N/*.txt)')
+    parser.add_argument('-T', '--topology', default=default_topology,
+                        help='Topology description (JSON) for the links between host pairs')
+    parser.add_argument('--cache', default=None,
+                        help='Cache directory (default: .cache in the measurements directory)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Parse every file again and do not write the cache')
+    parser.add_argument('--export', default=None,
+                        help='Write the tables to this directory (Parquet with pyarrow, CSV otherwise)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the summaries as JSON')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.measurements):
+        print("Error: measurements directory does not exist")
+        sys.exit(1)
+    cache = None if args.no_cache else args.cache or os.path.join(args.measurements, '.cache')
+
+    try:
+        store = load(args.measurements, args.topology, cache)
+    except (OSError, ValueError) as e:
+        print("Error:", e)
+        sys.exit(1)
+
+    latency = latency_summary(store)
+    throughput = throughput_summary(store)
+    if args.json:
+        print(to_json({'latency': latency, 'throughput': throughput}))
+    else:
+        print_summaries(latency, throughput)
+        print("\n{} files, {} parsed, {} from the cache".format(len(store.files), store.parsed,
+                                                               len(store.files) - store.parsed))
+
+    if args.export:
+        for path in export(store, args.export):
+            print("Wrote", path, file=sys.stderr if args.json else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,810 @@
+import argparse
+import collections
+import heapq
+import os
+import random
+import re
+import sys
+
+from topology import load_topology
+
+# Global variables
+default_topology = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'portfolio-topology.json')
+default_measurements = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'measurements')
+default_time = 25  # duration of a simpleperf test
+default_udp_time = 10  # duration of an iperf -u test
+default_udp_rate = 10  # iperf -u -b 10M
+default_pings = 25  # ping -c 25
+default_mss = 1448  # TCP payload per packet
+tcp_overhead = 52  # IP + TCP header with timestamps
+udp_overhead = 28  # IP + UDP header
+ping_size = 84  # ping default size (56 bytes of data)
+
+
+def parse_delay(delay):
+    '''
+    Description: Converts a Mininet delay string ('10ms', '1s', '500us') to seconds.
+    Parameters:
+        delay: delay as a string or a number of milliseconds
+    Returns:
+        delay in seconds
+    '''
+    if isinstance(delay, (int, float)):
+        return delay / 1000
+    match = re.match(r'^\s*([\d.]+)\s*(us|ms|s)?\s*$', delay)
+    if match is None:
+        raise ValueError('invalid delay: {}'.format(delay))
+    value = float(match.group(1))
+    unit = match.group(2) or 'us'  # tc netem uses microseconds when no unit is given
+    return value * {'us': 1e-6, 'ms': 1e-3, 's': 1}[unit]
+
+
+###################################################
+################# NETWORK MODEL ###################
+###################################################
+
+class Port:
+    '''
+    Description: One direction of a shaped link: a drop-tail queue in front of a transmitter
+    with a bandwidth and a propagation delay (like tc htb + netem in a TCLink).
+    Because the queue is FIFO, the arrival time of a packet is known as soon as it is queued.
+    Methods:
+        send(): queues a packet and returns its arrival time at the other end (None if dropped)
+    '''
+
+    def __init__(self, name, bw, delay, queue):
+        self.name = name
+        self.bw = bw  # bits per second
+        self.delay = delay  # seconds
+        self.queue = queue  # packets
+        self.busy_until = 0.0
+        self.departures = collections.deque()
+        self.sent = 0
+        self.drops = 0
+
+    def send(self, now, size):
+        while self.departures and self.departures[0] <= now:
+            self.departures.popleft()
+        if len(self.departures) >= self.queue:
+            self.drops += 1
+            return None
+        departure = max(now, self.busy_until) + size * 8 / self.bw
+        self.busy_until = departure
+        self.departures.append(departure)
+        self.sent += 1
+        return departure + self.delay
+
+
+class Network:
+    '''
+    Description: Discrete-event model of a topology. Only shaped links (with bw) are modelled;
+    links without bw are unshaped in Mininet and are treated as instantaneous.
+    Methods:
+        schedule(): schedules a function call at a virtual time
+        path(): returns the shaped ports on the route from one node to another
+        deliver(): sends a packet along a path and calls a function when it arrives
+        run(): processes events until the given time
+    '''
+
+    def __init__(self, topo, overrides=None):
+        self.now = 0.0
+        self.events = []
+        self.counter = 0
+        self.adjacent = collections.defaultdict(list)  # node: list of (neighbour, link)
+        self.ports = {}  # key: (from node, to node), value: Port
+        overrides = overrides or {}
+        for link in topo['links']:
+            params = dict(link)
+            params.update(overrides.get(link.get('name'), {}))
+            a, b = link['a'], link['b']
+            self.adjacent[a].append(b)
+            self.adjacent[b].append(a)
+            if params.get('bw'):
+                bw = float(params['bw']) * 1000000
+                delay = parse_delay(params.get('delay', 0))
+                queue = int(params.get('queue', 1000))
+                name = link.get('name', '{}-{}'.format(a, b))
+                self.ports[(a, b)] = Port(name + ' ' + a + '->' + b, bw, delay, queue)
+                self.ports[(b, a)] = Port(name + ' ' + b + '->' + a, bw, delay, queue)
+        self.routes = {}
+
+    def schedule(self, time, func, *args):
+        self.counter += 1
+        heapq.heappush(self.events, (time, self.counter, func, args))
+
+    def path(self, src, dst):
+        '''
+        Description: Finds the route between two nodes (shortest path, as the static routes do)
+        and returns the shaped ports on it.
+        Parameters:
+            src: source node
+            dst: destination node
+        Returns:
+            list of Port objects
+        '''
+        if (src, dst) in self.routes:
+            return self.routes[(src, dst)]
+        previous = {src: None}
+        todo = collections.deque([src])
+        while todo:
+            node = todo.popleft()
+            for neighbour in self.adjacent[node]:
+                if neighbour not in previous:
+                    previous[neighbour] = node
+                    todo.append(neighbour)
+        if dst not in previous:
+            raise ValueError('no route from {} to {}'.format(src, dst))
+        nodes = [dst]
+        while nodes[-1] != src:
+            nodes.append(previous[nodes[-1]])
+        nodes.reverse()
+        ports = [self.ports[hop] for hop in zip(nodes, nodes[1:]) if hop in self.ports]
+        self.routes[(src, dst)] = ports
+        return ports
+
+    def deliver(self, path, hop, size, func, arg):
+        '''
+        Description: Sends a packet over path[hop:] and calls func(arg) when it reaches the end.
+        Dropped packets are forgotten, like in a real network.
+        Parameters:
+            path: list of ports
+            hop: index of the next port
+            size: packet size in bytes
+            func: function to call at the destination
+            arg: argument for func
+        Returns:
+            None
+        '''
+        if hop == len(path):
+            if hop == 0:
+                # No shaped link on the path: arrive through the event queue, not by recursion from the sender
+                self.schedule(self.now, func, arg)
+            else:
+                func(arg)
+            return
+        arrival = path[hop].send(self.now, size)
+        if arrival is not None:
+            self.schedule(arrival, self.deliver, path, hop + 1, size, func, arg)
+
+    def run(self, until):
+        while self.events and self.events[0][0] <= until:
+            self.now, _, func, args = heapq.heappop(self.events)
+            func(*args)
+        self.now = until
+
+
+###################################################
+##################### FLOWS #######################
+###################################################
+
+class Timer:
+    '''
+    Description: Retransmission timer. Restarting or stopping it makes pending timeouts stale.
+    '''
+
+    def __init__(self, net, func):
+        self.net = net
+        self.func = func
+        self.generation = 0
+        self.running = False
+
+    def start(self, timeout):
+        self.generation += 1
+        self.running = True
+        self.net.schedule(self.net.now + timeout, self._fire, self.generation)
+
+    def stop(self):
+        self.generation += 1
+        self.running = False
+
+    def _fire(self, generation):
+        if generation == self.generation:
+            self.running = False
+            self.func()
+
+
+class TcpFlow:
+    '''
+    Description: Bulk TCP-like flow that sends for a duration, like a simpleperf client.
+    Reno congestion control (slow start, congestion avoidance) with SACK-based loss recovery
+    as in Linux: after three duplicate acks the holes below the highest SACKed packet are
+    resent while the window is halved, and an RTO (with backoff) falls back to slow start.
+    '''
+
+    kind = 'tcp'
+
+    def __init__(self, net, src, dst, label, start, duration, mss=default_mss):
+        self.net, self.src, self.dst, self.label = net, src, dst, label
+        self.start_time, self.end_time = start, start + duration
+        self.mss = mss
+        self.fwd, self.rev = net.path(src, dst), net.path(dst, src)
+        self.una = self.nxt = 0
+        self.cwnd, self.ssthresh = 10.0, float('inf')
+        self.dupacks, self.recover = 0, -1
+        self.in_recovery = False  # fast recovery
+        self.sacked = set()  # packets above una that the receiver has reported
+        self.highest_sacked = -1
+        self.hole = 0  # next packet to check for retransmission during recovery
+        self.credit = 0.0  # packets that may be sent during recovery
+        self.resend_until = 0  # packets below this seq are retransmissions (after a timeout)
+        self.srtt = self.rttvar = None
+        self.rto = 1.0
+        self.sent_at = {}  # key: seq, value: send time (only packets sent once, Karn's rule)
+        self.timer = Timer(net, self.on_timeout)
+        self.expected = 0
+        self.out_of_order = set()
+        self.received = 0
+        self.retransmits = 0
+        self.rtts = []
+        net.schedule(start, self.send_more)
+
+    def send_packet(self, seq, retransmit=False):
+        if retransmit:
+            self.retransmits += 1
+            self.sent_at.pop(seq, None)
+        else:
+            self.sent_at[seq] = self.net.now
+        self.net.deliver(self.fwd, 0, self.mss + tcp_overhead, self.on_data, seq)
+        if not self.timer.running:
+            self.timer.start(self.rto)
+
+    def send_more(self):
+        while self.nxt < self.una + int(self.cwnd) and self.net.now < self.end_time:
+            self.send_packet(self.nxt, self.nxt < self.resend_until)
+            self.nxt += 1
+
+    def on_data(self, seq):
+        if seq == self.expected:
+            self.expected += 1
+            self.received += self.mss
+            while self.expected in self.out_of_order:
+                self.out_of_order.remove(self.expected)
+                self.expected += 1
+                self.received += self.mss
+        elif seq > self.expected:
+            self.out_of_order.add(seq)
+        # The ack carries the cumulative ack and the packet that triggered it (SACK / timestamp echo)
+        self.net.deliver(self.rev, 0, tcp_overhead, self.on_ack, (self.expected, seq))
+
+    def on_ack(self, ack_info):
+        ack, seq = ack_info
+        sent = self.sent_at.get(seq)
+        if sent is not None:
+            self.update_rtt(self.net.now - sent)
+        if seq >= ack:
+            self.sacked.add(seq)
+            self.highest_sacked = max(self.highest_sacked, seq)
+
+        if ack > self.una:
+            for acked in range(self.una, ack):
+                self.sent_at.pop(acked, None)
+                self.sacked.discard(acked)
+            newly_acked = ack - self.una
+            self.una = ack
+            self.dupacks = 0
+            self.timer.stop()
+            if self.una < self.nxt:
+                self.timer.start(self.rto)
+            if self.in_recovery and self.una > self.recover:
+                self.in_recovery = False  # all packets lost before recovery started are resent
+                self.cwnd = self.ssthresh
+            elif self.in_recovery:
+                self.recovery_send()
+                return
+            else:
+                for _ in range(newly_acked):
+                    self.cwnd += 1 if self.cwnd < self.ssthresh else 1 / self.cwnd
+            self.send_more()
+        elif ack == self.una and self.nxt > self.una:
+            self.dupacks += 1
+            if self.in_recovery:
+                self.recovery_send()
+            elif self.dupacks == 3 and self.una > self.recover:
+                self.ssthresh = max((self.nxt - self.una) / 2, 2)
+                self.cwnd = self.ssthresh
+                self.recover = self.nxt - 1
+                self.in_recovery = True
+                self.credit = 0.0
+                self.send_packet(self.una, True)
+                self.hole = self.una + 1
+
+    def recovery_send(self):
+        '''
+        Description: Sends one packet for every second ack during recovery (the window is halved):
+        the next hole below the highest SACKed packet, or new data if there are no holes.
+        '''
+        self.credit += 0.5
+        while self.credit >= 1:
+            self.credit -= 1
+            self.hole = max(self.hole, self.una)
+            while self.hole < self.highest_sacked and self.hole in self.sacked:
+                self.hole += 1
+            if self.hole < self.highest_sacked:
+                self.send_packet(self.hole, True)
+                self.hole += 1
+            elif self.net.now < self.end_time:
+                self.send_packet(self.nxt, self.nxt < self.resend_until)
+                self.nxt += 1
+
+    def update_rtt(self, rtt):
+        self.rtts.append(rtt)
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = max(0.2, self.srtt + 4 * self.rttvar)  # Linux minimum RTO is 200 ms
+
+    def on_timeout(self):
+        if self.una >= self.nxt:
+            return
+        self.ssthresh = max((self.nxt - self.una) / 2, 2)
+        self.cwnd = 1.0
+        self.in_recovery = False
+        self.sacked.clear()
+        self.highest_sacked = -1
+        self.recover = self.nxt - 1  # no fast retransmit for the data sent before the timeout
+        self.resend_until = self.nxt  # everything up to nxt is resent as a retransmission
+        self.nxt = self.una
+        self.dupacks = 0
+        self.rto = min(self.rto * 2, 60)
+        self.sent_at.clear()
+        self.send_more()
+        if self.nxt == self.una:  # duration is over, still resend the first lost packet
+            self.send_packet(self.una, True)
+            self.nxt = self.una + 1
+
+    def result(self):
+        duration = self.end_time - self.start_time
+        return {
+            'throughput': self.received * 8 / duration / 1000000,
+            'rtt': 1000 * sum(self.rtts) / len(self.rtts) if self.rtts else None,
+            'retransmits': self.retransmits,
+        }
+
+
+class DrtpFlow:
+    '''
+    Description: DRTP flow with a fixed window and a fixed timeout, like drtp.py.
+    saw is a window of one packet; gbn resends the whole window on a timeout and the receiver
+    drops packets that are out of order; sr acks every packet and resends only the first one.
+    '''
+
+    kind = 'drtp'
+
+    def __init__(self, net, src, dst, label, start, duration, protocol='gbn', window=5,
+                 timeout=0.5, payload_size=1460):
+        self.net, self.src, self.dst, self.label = net, src, dst, label
+        self.start_time, self.end_time = start, start + duration
+        self.protocol = protocol
+        self.window = 1 if protocol == 'saw' else window
+        self.timeout = timeout
+        self.size = payload_size
+        self.fwd, self.rev = net.path(src, dst), net.path(dst, src)
+        self.base = self.nxt = 0
+        self.acked = set()
+        self.timer = Timer(net, self.on_timeout)
+        self.expected = 0
+        self.buffered = set()
+        self.received = 0
+        self.retransmits = 0
+        self.sent_at = {}
+        self.rtts = []
+        net.schedule(start, self.send_more)
+
+    def send_packet(self, seq):
+        if seq in self.sent_at:
+            self.retransmits += 1
+            self.sent_at[seq] = None
+        else:
+            self.sent_at[seq] = self.net.now
+        self.net.deliver(self.fwd, 0, self.size + 12 + udp_overhead, self.on_data, seq)
+        if not self.timer.running:
+            self.timer.start(self.timeout)
+
+    def send_more(self):
+        while self.nxt < self.base + self.window and self.net.now < self.end_time:
+            self.send_packet(self.nxt)
+            self.nxt += 1
+
+    def on_data(self, seq):
+        if self.protocol == 'sr':
+            if seq >= self.expected and seq not in self.buffered:
+                self.buffered.add(seq)
+                self.received += self.size
+                while self.expected in self.buffered:
+                    self.buffered.remove(self.expected)
+                    self.expected += 1
+            self.net.deliver(self.rev, 0, 12 + udp_overhead, self.on_ack, seq)
+        else:
+            if seq != self.expected:
+                return  # out of order or duplicate: no ack
+            self.expected += 1
+            self.received += self.size
+            self.net.deliver(self.rev, 0, 12 + udp_overhead, self.on_ack, seq)
+
+    def on_ack(self, seq):
+        sent = self.sent_at.get(seq)
+        if sent is not None:
+            self.rtts.append(self.net.now - sent)
+        if self.protocol == 'sr':
+            self.acked.add(seq)
+        else:
+            self.acked.update(range(self.base, seq + 1))
+        if self.base not in self.acked:
+            return
+        while self.base in self.acked:
+            self.acked.remove(self.base)
+            self.base += 1
+        self.timer.stop()
+        if self.base < self.nxt:
+            self.timer.start(self.timeout)
+        self.send_more()
+
+    def on_timeout(self):
+        if self.base >= self.nxt:
+            return
+        if self.protocol == 'sr':
+            self.send_packet(self.base)
+        else:
+            for seq in range(self.base, self.nxt):
+                self.send_packet(seq)
+
+    def result(self):
+        duration = self.end_time - self.start_time
+        return {
+            'throughput': self.received * 8 / duration / 1000000,
+            'rtt': 1000 * sum(self.rtts) / len(self.rtts) if self.rtts else None,
+            'retransmits': self.retransmits,
+        }
+
+
+class UdpFlow:
+    '''
+    Description: Constant bitrate UDP flow, like iperf -u. The receiver computes loss
+    and the RFC 3550 interarrival jitter.
+    '''
+
+    kind = 'udp'
+
+    def __init__(self, net, src, dst, label, start, duration, rate, size=1470):
+        self.net, self.src, self.dst, self.label = net, src, dst, label
+        self.start_time, self.duration = start, duration
+        self.size = size
+        self.gap = size * 8 / rate
+        self.fwd = net.path(src, dst)
+        self.sent = self.received = 0
+        self.jitter = 0.0
+        self.last_transit = None
+        net.schedule(start, self.send_packet)
+
+    def send_packet(self):
+        if self.net.now >= self.start_time + self.duration:
+            return
+        self.net.deliver(self.fwd, 0, self.size + udp_overhead, self.on_data, self.net.now)
+        self.sent += 1
+        self.net.schedule(self.start_time + self.sent * self.gap, self.send_packet)
+
+    def on_data(self, sent_at):
+        self.received += 1
+        transit = self.net.now - sent_at
+        if self.last_transit is not None:
+            self.jitter += (abs(transit - self.last_transit) - self.jitter) / 16
+        self.last_transit = transit
+
+    def result(self):
+        return {
+            'throughput': self.received * self.size * 8 / self.duration / 1000000,
+            'jitter': self.jitter * 1000,
+            'loss': 100 * (self.sent - self.received) / self.sent if self.sent else 0.0,
+        }
+
+
+class PingFlow:
+    '''
+    Description: ICMP echo once per second, like ping -c.
+    '''
+
+    kind = 'ping'
+
+    def __init__(self, net, src, dst, label, start, count=default_pings):
+        self.net, self.src, self.dst, self.label = net, src, dst, label
+        self.fwd, self.rev = net.path(src, dst), net.path(dst, src)
+        self.rtts = []
+        self.sent = 0
+        for i in range(count):
+            net.schedule(start + i, self.send_packet)
+
+    def send_packet(self):
+        self.sent += 1
+        self.net.deliver(self.fwd, 0, ping_size, self.on_request, self.net.now)
+
+    def on_request(self, sent_at):
+        self.net.deliver(self.rev, 0, ping_size, self.on_reply, sent_at)
+
+    def on_reply(self, sent_at):
+        self.rtts.append(self.net.now - sent_at)
+
+    def result(self):
+        rtts = sorted(self.rtts)
+        return {
+            'rtt': 1000 * sum(rtts) / len(rtts) if rtts else None,
+            'rtt_min': 1000 * rtts[0] if rtts else None,
+            'rtt_max': 1000 * rtts[-1] if rtts else None,
+            'loss': 100 * (self.sent - len(rtts)) / self.sent if self.sent else 0.0,
+        }
+
+
+###################################################
+################### TEST CASES ####################
+###################################################
+
+def tcp(src, dst, label):
+    return {'kind': 'tcp', 'src': src, 'dst': dst, 'label': label}
+
+
+def udp(src, dst, label):
+    return {'kind': 'udp', 'src': src, 'dst': dst, 'label': label}
+
+
+def ping(src, dst, label):
+    return {'kind': 'ping', 'src': src, 'dst': dst, 'label': label}
+
+
+# Each test case is a list of scenarios; the flows of a scenario run at the same time.
+# The labels are the names of the files in measurements/test-case-N.
+TEST_CASES = {
+    'test-case-1': [
+        [udp('h1', 'h4', 'throughput_udp_iperf_h1-h4')],
+        [udp('h1', 'h9', 'throughput_udp_iperf_h1-h9')],
+        [udp('h7', 'h9', 'throughput_udp_iperf_h7-h9')],
+    ],
+    'test-case-2': [
+        [ping('r1', 'r2', 'latency_L1')], [tcp('r1', 'r2', 'throughput_L1')],
+        [ping('r2', 'r3', 'latency_L2')], [tcp('r2', 'r3', 'throughput_L2')],
+        [ping('r3', 'r4', 'latency_L3')], [tcp('r3', 'r4', 'throughput_L3')],
+    ],
+    'test-case-3': [
+        [ping('h1', 'h4', 'latency_h1-h4')], [tcp('h1', 'h4', 'throughput_h1-h4')],
+        [ping('h1', 'h9', 'latency_h1-h9')], [tcp('h1', 'h9', 'throughput_h1-h9')],
+        [ping('h7', 'h9', 'latency_h7-h9')], [tcp('h7', 'h9', 'throughput_h7-h9')],
+    ],
+    'test-case-4': [
+        [tcp('h1', 'h4', 'throughput_h1-h4-1'), tcp('h2', 'h5', 'throughput_h2-h5-1'),
+         ping('h1', 'h4', 'latency_h1-h4-1'), ping('h2', 'h5', 'latency_h2-h5-1')],
+        [tcp('h1', 'h4', 'throughput_h1-h4-2'), tcp('h2', 'h5', 'throughput_h2-h5-2'),
+         tcp('h3', 'h6', 'throughput_h3-h6-2'), ping('h1', 'h4', 'latency_h1-h4-2'),
+         ping('h2', 'h5', 'latency_h2-h5-2'), ping('h3', 'h6', 'latency_h3-h6-2')],
+        [tcp('h1', 'h4', 'throughput_h1-h4-3'), tcp('h7', 'h9', 'throughput_h7-h9-3'),
+         ping('h1', 'h4', 'latency_h1-h4-3'), ping('h7', 'h9', 'latency_h7-h9-3')],
+        [tcp('h1', 'h4', 'throughput_h1-h4-4'), tcp('h8', 'h9', 'throughput_h8-h9-4'),
+         ping('h1', 'h4', 'latency_h1-h4-4'), ping('h8', 'h9', 'latency_h8-h9-4')],
+    ],
+    'test-case-5': [
+        [tcp('h1', 'h4', 'throughput_h1-h4'), tcp('h1', 'h4', 'throughput_h1-h4'),
+         tcp('h2', 'h5', 'throughput_h2-h5'), tcp('h3', 'h6', 'throughput_h3-h6')],
+    ],
+}
+
+
+def jains(rates):
+    '''
+    Description: Jain's fairness index of a list of rates.
+    Parameters:
+        rates: list of rates
+    Returns:
+        JFI between 1/n and 1
+    '''
+    squares = sum(rate ** 2 for rate in rates)
+    if not squares:
+        return 1.0
+    return sum(rates) ** 2 / (len(rates) * squares)
+
+
+def run_scenario(topo, flows, protocol='tcp', overrides=None, seed=1, time_=default_time,
+                 window=5, timeout=0.5):
+    '''
+    Description: Simulates one scenario (flows that run at the same time).
+    Parameters:
+        topo: topology dictionary
+        flows: list of flow descriptions
+        protocol: protocol used for the bulk flows: tcp, saw, gbn or sr
+        overrides: link parameters to change, key: link name, value: dictionary
+        seed: random seed for the start times
+        time_: duration of the bulk flows in seconds
+        window: DRTP window
+        timeout: DRTP timeout
+    Returns:
+        list of (flow description, result dictionary)
+    '''
+    net = Network(topo, overrides)
+    rng = random.Random(seed)
+    objects = []
+    for flow in flows:
+        if flow['kind'] == 'tcp' and not net.path(flow['src'], flow['dst']):
+            # A window-based flow without a bottleneck would send forever at the same moment
+            raise ValueError('no shaped link between {} and {} for {}'.format(flow['src'], flow['dst'], flow['label']))
+        start = rng.uniform(0, 0.05)  # flows never start at exactly the same moment
+        if flow['kind'] == 'tcp' and protocol == 'tcp':
+            obj = TcpFlow(net, flow['src'], flow['dst'], flow['label'], start, time_)
+        elif flow['kind'] == 'tcp':
+            obj = DrtpFlow(net, flow['src'], flow['dst'], flow['label'], start, time_,
+                           protocol, window, timeout)
+        elif flow['kind'] == 'udp':
+            obj = UdpFlow(net, flow['src'], flow['dst'], flow['label'], start, default_udp_time,
+                          default_udp_rate * 1000000)
+        else:
+            obj = PingFlow(net, flow['src'], flow['dst'], flow['label'], start)
+        objects.append(obj)
+    net.run(time_ + 5)
+    results = [(flow, obj.result()) for flow, obj in zip(flows, objects)]
+
+    bulk = [result['throughput'] for flow, result in results if flow['kind'] == 'tcp']
+    if len(bulk) > 1:
+        fairness = jains(bulk)
+        for flow, result in results:
+            if flow['kind'] == 'tcp':
+                result['jfi'] = fairness
+    return results
+
+
+###################################################
+################## MEASUREMENTS ###################
+###################################################
+
+def measured(directory, test_case, label):
+    '''
+    Description: Reads the measured value for a flow from the measurements directory.
+    Parameters:
+        directory: measurements directory
+        test_case: name of the test case
+        label: name of the file without .txt
+    Returns:
+        list of rates in Mbps (simpleperf, iperf) or the average RTT in ms (ping), None if missing
+    '''
+    path = os.path.join(directory, test_case, label + '.txt')
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        text = f.read()
+    match = re.search(r'rtt min/avg/max/mdev = [\d.]+/([\d.]+)/', text)
+    if match:
+        return float(match.group(1))
+    match = re.search(r'([\d.]+) Mbits/sec', text)
+    if match:
+        return [float(match.group(1))]
+    rates = [float(rate) for rate in re.findall(r'\t([\d.]+) Mbps', text)]
+    return rates or None
+
+
+def report(test_case, scenarios, directory):
+    '''
+    Description: Prints predicted and measured values of every flow of a test case.
+    Parameters:
+        test_case: name of the test case
+        scenarios: list of scenario results from run_scenario()
+        directory: measurements directory
+    Returns:
+        None
+    '''
+    print("-" * 86)
+    print(test_case)
+    print("-" * 86)
+    print(f"{'Flow':<32} {'Predicted':<24} {'Measured':<16} {'Error':<8} JFI")
+    for results in scenarios:
+        used = collections.Counter()
+        for flow, result in results:
+            value = measured(directory, test_case, flow['label'])
+            if flow['kind'] == 'ping':
+                prediction, unit = result['rtt'], 'ms'
+                actual = value if isinstance(value, float) else None
+            else:
+                prediction, unit = result['throughput'], 'Mbps'
+                # parallel streams with the same label are matched to the measured streams in order
+                index = used[flow['label']]
+                used[flow['label']] += 1
+                actual = value[index] if isinstance(value, list) and index < len(value) else None
+
+            predicted = '-' if prediction is None else '{:.2f} {}'.format(prediction, unit)
+            if flow['kind'] == 'udp':
+                predicted += ' {:.0f}% loss'.format(result['loss'])
+            if actual is None:
+                measured_value, error = '-', ''
+            else:
+                measured_value = '{:.2f} {}'.format(actual, unit)
+                error = '' if prediction is None or not actual else '{:+.0f}%'.format(
+                    100 * (prediction - actual) / actual)
+            jfi = '{:.3f}'.format(result['jfi']) if 'jfi' in result else ''
+            name = '{} ({})'.format(flow['label'], flow['kind'])
+            print(f"{name:<32} {predicted:<24} {measured_value:<16} {error:<8} {jfi}")
+    print()
+
+
+###################################################
+################ PARSE ARGUMENTS ##################
+###################################################
+
+def parse_override(text, names=None):
+    '''
+    Description: Parses a link override like L1:bw=30,delay=20ms,queue=50.
+    Parameters:
+        text: the override
+        names: names of the links in the topology (None: any name)
+    Returns:
+        (link name, dictionary of parameters)
+    '''
+    name, _, params = text.partition(':')
+    if names is not None and name not in names:
+        raise ValueError('unknown link {} in {} (links: {})'.format(name, text, ', '.join(sorted(names))))
+    values = {}
+    for param in params.split(','):
+        key, _, value = param.partition('=')
+        if key not in ('bw', 'delay', 'queue') or not value:
+            raise ValueError(text)
+        values[key] = value if key == 'delay' else float(value)
+        if key == 'bw' and values[key] <= 0:
+            raise ValueError('bw must be above 0 in {}'.format(text))
+        if key == 'queue' and values[key] < 1:
+            raise ValueError('queue must be at least 1 in {}'.format(text))
+    return name, values
+
+
+def main():
+    '''
+    Description: This function parses the command line arguments and runs the test cases.
+    Parameters:
+        None
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(
+        description="Discrete-event simulation of the portfolio topology and test cases")
+    parser.add_argument('-T', '--topology', default=default_topology,
+                        help='Topology description (JSON)')
+    parser.add_argument('-m', '--measurements', default=default_measurements,
+                        help='Measurements directory to compare with')
+    parser.add_argument('-c', '--case', action='append', default=None,
+                        help='Test case to run (default: all), can be repeated')
+    parser.add_argument('-r', '--protocol', default='tcp',
+                        help='Protocol for the bulk flows: tcp, saw, gbn or sr')
+    parser.add_argument('-l', '--link', action='append', default=[],
+                        help='Change a link, e.g. L1:bw=30,delay=20ms,queue=50')
+    parser.add_argument('-t', '--time', default=default_time, type=int,
+                        help='Duration of the bulk flows in seconds')
+    parser.add_argument('-w', '--window', default=5, type=int,
+                        help='DRTP window size')
+    parser.add_argument('--seed', default=1, type=int,
+                        help='Random seed')
+
+    args = parser.parse_args()
+
+    if args.protocol not in ['tcp', 'saw', 'gbn', 'sr']:
+        print("Error: invalid protocol")
+        sys.exit(1)
+
+    cases = args.case or sorted(TEST_CASES)
+    for case in cases:
+        if case not in TEST_CASES:
+            print("Error: unknown test case {}".format(case))
+            sys.exit(1)
+
+    try:
+        topo = load_topology(args.topology)
+        names = {link['name'] for link in topo['links'] if 'name' in link}
+        overrides = dict(parse_override(link, names) for link in args.link)
+    except (OSError, ValueError) as e:
+        print("Error:", e)
+        sys.exit(1)
+
+    for case in cases:
+        try:
+            scenarios = [run_scenario(topo, flows, args.protocol, overrides, args.seed, args.time, args.window)
+                         for flows in TEST_CASES[case]]
+        except ValueError as e:
+            print("Error:", e)
+            sys.exit(1)
+        report(case, scenarios, args.measurements)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,575 @@
+'''
+
+DATA 2410: runs the test cases of the portfolio (or any test plan) on the nodes of a topology and
+writes the results in the measurements layout (test-case-N/<label>.txt), like the files that were
+made by hand in measurements/.
+
+A test plan is a JSON file; every test case is a list of groups, and the flows of a group run at
+the same time (like netsim.TEST_CASES, which is the default plan):
+
+    {
+        "time": 25, "udp_time": 10, "udp_rate": 10, "pings": 25,
+        "test_cases": {
+            "test-case-4": [
+                [{"kind": "tcp", "src": "h1", "dst": "h4", "label": "throughput_h1-h4-1"},
+                 {"kind": "ping", "src": "h1", "dst": "h4", "label": "latency_h1-h4-1"}]
+            ]
+        }
+    }
+
+Groups that do not use the same shaped link (from the topology) do not disturb each other and run
+in parallel, so a full suite takes about as long as the busiest link needs.
+
+    $ python3 orchestrate.py -d
+    $ sudo python3 orchestrate.py -e mininet -o runs/after
+    $ python3 orchestrate.py -e local -c test-case-2 -t 5 --pings 5
+
+'''
+
+import argparse
+import json
+import math
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from netsim import Network, TEST_CASES, default_topology, default_time, default_udp_time, default_udp_rate, \
+    default_pings
+from topology import load_topology, build_plan, run_mininet
+
+# Global variables
+default_port = 8088  # first server port, every server gets its own
+default_delay = 1.0  # seconds between starting the servers and the clients, and before stopping the servers
+default_grace = 30  # seconds a client may run longer than planned before it is killed
+simpleperf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simpleperf.py')
+kinds = ('tcp', 'udp', 'ping')
+
+
+###################################################
+#################### EXECUTORS ####################
+###################################################
+
+class LocalExecutor:
+    '''
+    Description: Runs every node as a process on this machine, with all addresses on the loopback
+    interface. Nothing is shaped, so it is a stand-in to try a plan without Mininet or root.
+    Methods:
+        address(): the address to use for a node
+        popen(): starts a command on a node
+    '''
+    name = 'local'
+
+    def address(self, node, ip):
+        return '127.0.0.1'
+
+    def popen(self, node, args, output):
+        return subprocess.Popen(args, stdout=output, stderr=subprocess.STDOUT)
+
+
+class NetnsExecutor(LocalExecutor):
+    '''
+    Description: Runs the commands of a node in the network namespace with its name (ip netns exec),
+    e.g. namespaces made by a script that builds the topology with veth pairs and tc.
+    '''
+    name = 'netns'
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+
+    def address(self, node, ip):
+        return ip
+
+    def popen(self, node, args, output):
+        return subprocess.Popen(['ip', 'netns', 'exec', self.prefix + node] + args, stdout=output,
+                                stderr=subprocess.STDOUT)
+
+
+class MininetExecutor(LocalExecutor):
+    '''
+    Description: Runs the commands on the nodes of a started Mininet network. node.popen() is used instead
+    of node.cmd(), as cmd() waits for the command and only one command can run on a node at a time.
+    '''
+    name = 'mininet'
+
+    def __init__(self, net):
+        self.net = net
+
+    def address(self, node, ip):
+        return ip
+
+    def popen(self, node, args, output):
+        return self.net[node].popen(args, stdout=output, stderr=subprocess.STDOUT)
+
+
+###################################################
+###################### PLAN #######################
+###################################################
+
+def default_plan():
+    '''
+    Description: The test cases of the portfolio (netsim.TEST_CASES) as a test plan
+    Parameters:
+        None
+    Returns:
+        the plan as a dictionary
+    '''
+    return {'time': default_time, 'udp_time': default_udp_time, 'udp_rate': default_udp_rate,
+            'pings': default_pings, 'test_cases': TEST_CASES}
+
+
+def load_plan(path):
+    '''
+    Description: Loads a test plan (JSON) and checks its flows
+    Parameters:
+        path: path to the plan
+    Returns:
+        the plan as a dictionary
+    '''
+    with open(path) as f:
+        plan = json.load(f)
+    defaults = default_plan()
+    for key in ('time', 'udp_time', 'udp_rate', 'pings'):
+        plan.setdefault(key, defaults[key])
+    if not isinstance(plan.get('test_cases'), dict):
+        raise ValueError('the plan has no test_cases')
+    for case, groups in plan['test_cases'].items():
+        for group in groups:
+            for flow in group:
+                if flow.get('kind') not in kinds or not flow.get('src') or not flow.get('dst') \
+                        or not flow.get('label'):
+                    raise ValueError('{}: a flow needs kind ({}), src, dst and label'.format(case, ', '.join(kinds)))
+    return plan
+
+
+def node_address(topo, src, dst):
+    '''
+    Description: The address of dst on the interface that faces src (the last hop of the shortest path),
+    e.g. 10.0.1.2 for r1 to r2 over L1, like the addresses used in the measurements
+    Parameters:
+        topo: topology dictionary
+        src: source node
+        dst: destination node
+    Returns:
+        the IP address as a string
+    '''
+    adjacent = {}
+    for link in topo['links']:
+        adjacent.setdefault(link['a'], []).append((link['b'], link))
+        adjacent.setdefault(link['b'], []).append((link['a'], link))
+    previous = {src: None}
+    todo = [src]
+    while todo:
+        node = todo.pop(0)
+        for neighbour, link in adjacent.get(node, []):
+            if neighbour not in previous:
+                previous[neighbour] = (node, link)
+                todo.append(neighbour)
+    if dst not in previous:
+        raise ValueError('no route from {} to {}'.format(src, dst))
+    if previous[dst] is not None:
+        link = previous[dst][1]
+        ip = link.get('ip_a') if link['a'] == dst else link.get('ip_b')
+        if ip:
+            return ip.split('/')[0]
+    for link in topo['links']:  # the last hop has no address (e.g. a switch port): any address of dst
+        for end in ('a', 'b'):
+            if link[end] == dst and link.get('ip_' + end):
+                return link['ip_' + end].split('/')[0]
+    raise ValueError('{} has no address'.format(dst))
+
+
+class Group:
+    '''
+    Description: Flows that run at the same time, with the resources they use (the shaped links on their
+    paths, or the nodes if there are none) and the planned duration
+    '''
+
+    def __init__(self, test_case, index, flows, network, plan):
+        self.test_case = test_case
+        self.index = index
+        self.flows = flows
+        self.resources = set()
+        self.duration = 0
+        for flow in flows:
+            links = set(port.name.split()[0] for port in network.path(flow['src'], flow['dst']))
+            self.resources |= links or {flow['src'], flow['dst']}
+            self.duration = max(self.duration, flow_duration(flow, plan))
+        self.failed = []  # errors of the flows
+
+    def __str__(self):
+        return '{} #{}'.format(self.test_case, self.index + 1)
+
+
+def flow_duration(flow, plan):
+    if flow['kind'] == 'ping':
+        return flow.get('pings', plan['pings'])  # one ping per second
+    if flow['kind'] == 'udp':
+        return flow.get('time', plan['udp_time'])
+    return flow.get('time', plan['time'])
+
+
+def make_groups(plan, topo, test_cases=None):
+    '''
+    Description: Makes the groups of the selected test cases, in plan order
+    Parameters:
+        plan: test plan
+        topo: topology dictionary
+        test_cases: names of the test cases to run (None: all)
+    Returns:
+        list of Group
+    '''
+    network = Network(topo)
+    groups = []
+    for case, flows_list in plan['test_cases'].items():
+        if test_cases and case not in test_cases:
+            continue
+        for index, flows in enumerate(flows_list):
+            groups.append(Group(case, index, flows, network, plan))
+    return groups
+
+
+def schedule(groups, jobs, run):
+    '''
+    Description: Runs the groups, in parallel when they do not share a resource. A group starts as soon as
+    its resources are free; a later group may not take a resource that an earlier waiting group needs, so
+    the groups of a link run in plan order and none of them waits forever.
+    Parameters:
+        groups: list of Group, in plan order
+        jobs: maximum number of groups at the same time
+        run: function called with a group (in a thread)
+    Returns:
+        None
+    '''
+    lock = threading.Condition()
+    busy = set()
+    running = []
+    pending = list(groups)
+
+    def worker(group):
+        try:
+            run(group)
+        finally:
+            with lock:
+                busy.difference_update(group.resources)
+                running.remove(group)
+                lock.notify()
+
+    with lock:
+        while pending:
+            blocked = set()
+            for group in list(pending):
+                if len(running) < jobs and not group.resources & (busy | blocked):
+                    pending.remove(group)
+                    busy.update(group.resources)
+                    running.append(group)
+                    threading.Thread(target=worker, args=(group,), daemon=True).start()
+                else:
+                    blocked |= group.resources
+            if pending:
+                lock.wait()
+        while running:
+            lock.wait()
+
+
+def estimate(groups, jobs, delay):
+    '''
+    Description: Works out when every group would start with schedule(), from the planned durations
+    Parameters:
+        groups: list of Group
+        jobs: maximum number of groups at the same time
+        delay: start and stop delay of the servers
+    Returns:
+        (list of (start, group), total time)
+    '''
+    now = 0.0
+    ends = []  # (end, group)
+    starts = []
+    pending = list(groups)
+    while pending:
+        blocked = set()
+        busy = set().union(*(group.resources for end, group in ends))
+        for group in list(pending):
+            if len(ends) < jobs and not group.resources & (busy | blocked):
+                pending.remove(group)
+                busy |= group.resources
+                ends.append((now + group.duration + 2 * delay, group))
+                starts.append((now, group))
+            else:
+                blocked |= group.resources
+        if pending:
+            ends.sort(key=lambda x: x[0])
+            now = ends.pop(0)[0]
+    return starts, max([end for end, group in ends] + [now])
+
+
+###################################################
+###################### RUN ########################
+###################################################
+
+class Runner:
+    '''
+    Description: Runs the flows of a group with an executor: starts one server per label and destination,
+    waits until they listen, starts all clients together, waits for them, stops the servers and keeps
+    the output in the measurements layout. simpleperf and iperf results are the output of the server
+    and ping results the output of ping, like the files in measurements/.
+    '''
+
+    def __init__(self, executor, topo, plan, output, port=default_port, delay=default_delay,
+                 interval=None):
+        self.executor = executor
+        self.topo = topo
+        self.plan = plan
+        self.output = output
+        self.delay = delay
+        self.interval = interval
+        self.port = port
+        self.port_lock = threading.Lock()
+        self.print_lock = threading.Lock()
+
+    def log(self, text):
+        with self.print_lock:
+            print(time.strftime('%H:%M:%S'), text, flush=True)
+
+    def next_port(self):
+        with self.port_lock:
+            self.port += 1
+            return self.port - 1
+
+    def commands(self, flow, address, port):
+        '''
+        Description: The server and client command of a flow
+        Parameters:
+            flow: the flow
+            address: address of the destination
+            port: port of the server
+        Returns:
+            (server command or None, client command)
+        '''
+        if flow['kind'] == 'ping':
+            return None, ['ping', '-c', str(flow.get('pings', self.plan['pings'])), address]
+        if flow['kind'] == 'udp':
+            return (['iperf', '-s', '-u', '-p', str(port)],
+                    ['iperf', '-c', address, '-u', '-p', str(port), '-b', '{}M'.format(self.plan['udp_rate']),
+                     '-t', str(flow_duration(flow, self.plan))])
+        python = [sys.executable, '-u', simpleperf_path]
+        client = python + ['-c', '-I', address, '-p', str(port), '-t', str(flow_duration(flow, self.plan))]
+        if self.interval:
+            client += ['-i', str(self.interval)]
+        return python + ['-s', '-b', address, '-p', str(port)], client
+
+    def run(self, group):
+        directory = os.path.join(self.output, group.test_case)
+        logs = os.path.join(directory, 'logs')
+        os.makedirs(logs, exist_ok=True)
+        self.log("start {} ({})".format(group, ', '.join(flow['label'] for flow in group.flows)))
+        files = []
+        servers = {}  # key: (label, dst), value: (process, port)
+        clients = []  # (flow, process)
+        try:
+            for flow in group.flows:
+                if flow['kind'] == 'ping' or (flow['label'], flow['dst']) in servers:
+                    continue
+                address = self.executor.address(flow['dst'], node_address(self.topo, flow['src'], flow['dst']))
+                port = self.next_port()
+                server, _ = self.commands(flow, address, port)
+                f = open(os.path.join(directory, flow['label'] + '.txt'), 'w')
+                files.append(f)
+                servers[(flow['label'], flow['dst'])] = (self.executor.popen(flow['dst'], server, f), port)
+            if servers:
+                time.sleep(self.delay)  # until the servers listen
+
+            # all clients are started together, right after each other
+            for i, flow in enumerate(group.flows):
+                address = self.executor.address(flow['dst'], node_address(self.topo, flow['src'], flow['dst']))
+                port = servers[(flow['label'], flow['dst'])][1] if flow['kind'] != 'ping' else None
+                _, client = self.commands(flow, address, port)
+                if flow['kind'] == 'ping':
+                    path = os.path.join(directory, flow['label'] + '.txt')
+                else:
+                    path = os.path.join(logs, '{}-{}.txt'.format(flow['label'], i + 1))
+                f = open(path, 'w')
+                files.append(f)
+                clients.append((flow, self.executor.popen(flow['src'], client, f)))
+
+            deadline = time.monotonic() + group.duration + default_grace
+            for flow, process in clients:
+                try:
+                    code = process.wait(max(0.0, deadline - time.monotonic()))
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                    code = 'timeout'
+                if code != 0:
+                    group.failed.append('{} ({} {} -> {}): exit {}'.format(flow['label'], flow['kind'], flow['src'],
+                                                                          flow['dst'], code))
+            if servers:
+                time.sleep(self.delay)  # until the servers have printed the results
+        except (OSError, ValueError) as e:
+            group.failed.append(str(e))
+        finally:
+            for process, port in servers.values():
+                stop(process)
+            for flow, process in clients:
+                if process.poll() is None:
+                    stop(process)
+            for f in files:
+                f.close()
+        self.log("{} {}".format('FAILED' if group.failed else 'done', group))
+
+
+def stop(process, timeout=5):
+    '''
+    Description: Stops a process like Ctrl-C does, so it prints its results, and kills it if it does not stop
+    Parameters:
+        process: the process
+        timeout: seconds to wait before it is killed
+    Returns:
+        None
+    '''
+    if process.poll() is not None:
+        return
+    try:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_suite(executor, topo, plan, groups, output, jobs, port, delay, interval):
+    '''
+    Description: Runs the groups with an executor and writes the results to the output directory
+    Parameters:
+        executor: LocalExecutor, NetnsExecutor or MininetExecutor
+        topo: topology dictionary
+        plan: test plan
+        groups: list of Group
+        output: output directory (the measurements layout)
+        jobs: maximum number of groups at the same time
+        port: first server port
+        delay: start and stop delay of the servers
+        interval: simpleperf interval (None: only the summary)
+    Returns:
+        list of errors
+    '''
+    runner = Runner(executor, topo, plan, output, port, delay, interval)
+    start = time.monotonic()
+    schedule(groups, jobs, runner.run)
+    errors = ['{}: {}'.format(group, error) for group in groups for error in group.failed]
+    print("\n{} groups in {:.0f} s with the {} executor, results in {}".format(
+        len(groups), time.monotonic() - start, executor.name, output))
+    return errors
+
+
+###################################################
+################ PARSE ARGUMENTS ##################
+###################################################
+
+def main():
+    '''
+    Description: This function parses the command line arguments and runs the test plan.
+    Parameters:
+        None
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(
+        description="Runs the test cases on the nodes of a topology and writes the results in the measurements layout")
+    parser.add_argument('-P', '--plan', default=None,
+                        help='Test plan (JSON), default: the portfolio test cases')
+    parser.add_argument('-T', '--topology', default=default_topology,
+                        help='Topology description (JSON or YAML)')
+    parser.add_argument('-c', '--test-case', action='append', default=None,
+                        help='Run only this test case (can be repeated)')
+    parser.add_argument('-e', '--executor', choices=['local', 'netns', 'mininet'], default='local',
+                        help='Where the commands run: local processes (stand-in), network namespaces or Mininet')
+    parser.add_argument('--netns-prefix', default='',
+                        help='Prefix of the network namespace names (netns executor)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Output directory (default: runs/<date>-<time>)')
+    parser.add_argument('-j', '--jobs', default=None,
+                        help='Maximum number of groups at the same time (default: no limit)')
+    parser.add_argument('-t', '--time', default=None,
+                        help='Duration of the simpleperf and iperf flows in seconds (overrides the plan)')
+    parser.add_argument('--pings', default=None,
+                        help='Number of pings (overrides the plan)')
+    parser.add_argument('-i', '--interval', default=None,
+                        help='simpleperf interval in whole seconds (the clients print interval lines to logs/, '
+                             'which ingest.py and regress.py read)')
+    parser.add_argument('-p', '--port', default=default_port,
+                        help='First server port')
+    parser.add_argument('--delay', default=default_delay,
+                        help='Seconds between starting the servers and the clients')
+    parser.add_argument('-d', '--dry-run', action='store_true',
+                        help='Print the schedule instead of running it')
+    args = parser.parse_args()
+
+    try:
+        plan = load_plan(args.plan) if args.plan else default_plan()
+        topo = load_topology(args.topology)
+    except (OSError, ValueError, KeyError) as e:
+        print("Error:", e)
+        sys.exit(1)
+
+    try:
+        jobs = int(args.jobs) if args.jobs is not None else math.inf
+        port = int(args.port)
+        delay = float(args.delay)
+        interval = int(args.interval) if args.interval is not None else None  # simpleperf takes whole seconds
+        if args.time is not None:
+            plan['time'] = plan['udp_time'] = int(args.time)
+        if args.pings is not None:
+            plan['pings'] = int(args.pings)
+    except ValueError:
+        print("Error: jobs, port, time, pings and interval must be integers, delay a number")
+        sys.exit(1)
+    if jobs < 1 or not 0 < port < 65536 or delay < 0 or plan['time'] < 1 or plan['pings'] < 1 \
+            or (interval is not None and interval <= 0):
+        print("Error: jobs, time and pings must be at least 1, port between 1 and 65535, delay 0 or more "
+              "and interval more than 0")
+        sys.exit(1)
+
+    unknown = [case for case in args.test_case or [] if case not in plan['test_cases']]
+    if unknown:
+        print("Error: unknown test case: {}".format(', '.join(unknown)))
+        sys.exit(1)
+    try:
+        groups = make_groups(plan, topo, args.test_case)
+    except (ValueError, KeyError) as e:
+        print("Error:", e)
+        sys.exit(1)
+
+    starts, total = estimate(groups, jobs, delay)
+    if args.dry_run:
+        print("{:>8}  {:<18}{:>8}  {:<14}Flows".format('Start', 'Group', 'Time', 'Links'))
+        for start, group in starts:
+            print("{:>7.0f}s  {:<18}{:>7.0f}s  {:<14}{}".format(
+                start, str(group), group.duration, '+'.join(sorted(group.resources)),
+                ', '.join('{} {}->{}'.format(flow['kind'], flow['src'], flow['dst']) for flow in group.flows)))
+        sequential = sum(group.duration + 2 * delay for group in groups)
+        print("\n{} groups: about {:.0f} s in parallel, {:.0f} s one after another".format(
+            len(groups), total, sequential))
+        return
+
+    output = args.output or os.path.join('runs', time.strftime('%Y%m%d-%H%M%S'))
+    print("{} groups, about {:.0f} s".format(len(groups), total))
+    if args.executor == 'mininet':
+        if os.geteuid() != 0:
+            print("Error: Mininet needs root")
+            sys.exit(1)
+        errors = run_mininet(build_plan(topo), cli=False, func=lambda net: run_suite(
+            MininetExecutor(net), topo, plan, groups, output, jobs, port, delay, interval))
+    else:
+        executor = NetnsExecutor(args.netns_prefix) if args.executor == 'netns' else LocalExecutor()
+        errors = run_suite(executor, topo, plan, groups, output, jobs, port, delay, interval)
+
+    for error in errors:
+        print("Error:", error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
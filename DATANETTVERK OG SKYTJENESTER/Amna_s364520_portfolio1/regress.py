@@ -0,0 +1,296 @@
+import argparse
+import math
+import os
+import random
+import sys
+
+from ingest import load, rate_rows, take, to_json, np
+from netsim import default_topology
+
+# Global variables
+default_alpha = 0.05  # significance level (after the Holm correction)
+default_min_change = 5.0  # smallest change of the median (%) that counts as a regression
+default_resamples = 2000  # bootstrap resamples
+default_seed = 1
+default_confidence = 95  # confidence level of the bootstrap interval (%)
+
+# Metrics and whether a higher value is better
+metrics = {'rtt_ms': False, 'mbps': True}
+
+
+def samples(directories, topology, cache):
+    '''
+    Description: Collects the samples of every metric from one or more measurement directories (repeated runs).
+    Latency files give one RTT per ping reply. Throughput files give the interval rates when they have interval
+    lines, and one total rate per run otherwise.
+    Parameters:
+        directories: measurement directories
+        topology: topology description (None: no links)
+        cache: use the cache of each directory
+    Returns:
+        dictionary (key: (test case, label, metric), value: list of values)
+    '''
+    result = {}
+    for directory in directories:
+        store = load(directory, topology, os.path.join(directory, '.cache') if cache else None)
+        rtt = store.table('rtt')
+        for (case, label), rows in rtt.groups('test_case', 'label').items():
+            result.setdefault((case, label, 'rtt_ms'), []).extend(float(x) for x in take(rtt, 'rtt_ms', rows))
+        rate = store.table('rate')
+        for (case, label), rows in rate.groups('test_case', 'label').items():
+            side, summaries, intervals = rate_rows(rate, rows)
+            values = result.setdefault((case, label, 'mbps'), [])
+            if intervals:
+                values.extend(float(x) / 1000000 for x in take(rate, 'bits_per_second', intervals))
+            elif summaries:
+                values.append(float(sum(take(rate, 'bits_per_second', summaries))) / 1000000)
+    return result
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    return (values[(n - 1) // 2] + values[n // 2]) / 2
+
+
+def mann_whitney(a, b):
+    '''
+    Description: Two-sided Mann-Whitney U test with the normal approximation, corrected for ties
+    Parameters:
+        a: samples of the baseline
+        b: samples of the candidate
+    Returns:
+        (U of b, p-value)
+    '''
+    values = sorted([(x, 0) for x in a] + [(x, 1) for x in b])
+    n = len(values)
+    ranks_b = 0.0
+    ties = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1  # average rank of the tied values
+        ranks_b += rank * sum(1 for k in range(i, j + 1) if values[k][1])
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    n1, n2 = len(a), len(b)
+    u = ranks_b - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)  # with continuity correction
+    return u, min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+def bootstrap(a, b, resamples, seed, confidence=default_confidence):
+    '''
+    Description: Bootstrap confidence interval of the relative change of the median from a to b (in %).
+    With NumPy all resamples are drawn and their medians computed at once.
+    Parameters:
+        a: samples of the baseline
+        b: samples of the candidate
+        resamples: number of resamples
+        seed: seed of the random numbers
+        confidence: confidence level in %
+    Returns:
+        (low, high) in %
+    '''
+    tail = (100 - confidence) / 2
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        x = np.asarray(a, dtype=np.float64)
+        y = np.asarray(b, dtype=np.float64)
+        base = np.median(x[rng.integers(0, x.size, (resamples, x.size))], axis=1)
+        cand = np.median(y[rng.integers(0, y.size, (resamples, y.size))], axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = 100 * (cand - base) / np.abs(base)
+        change = change[np.isfinite(change)]
+        if not change.size:
+            return math.nan, math.nan
+        return float(np.percentile(change, tail)), float(np.percentile(change, 100 - tail))
+    rng = random.Random(seed)
+    change = []
+    for _ in range(resamples):
+        base = median(rng.choices(a, k=len(a)))
+        cand = median(rng.choices(b, k=len(b)))
+        if base:
+            change.append(100 * (cand - base) / abs(base))
+    if not change:
+        return math.nan, math.nan
+    change.sort()
+    low = change[int(len(change) * tail / 100)]
+    high = change[min(len(change) - 1, int(len(change) * (100 - tail) / 100))]
+    return low, high
+
+
+def holm(p_values):
+    '''
+    Description: Holm-Bonferroni correction of p-values for testing many metrics at once
+    Parameters:
+        p_values: list of p-values
+    Returns:
+        list of corrected p-values (same order)
+    '''
+    order = sorted(range(len(p_values)), key=lambda i: p_values[i])
+    corrected = [1.0] * len(p_values)
+    running = 0.0
+    for rank, i in enumerate(order):
+        running = max(running, min(1.0, (len(p_values) - rank) * p_values[i]))
+        corrected[i] = running
+    return corrected
+
+
+def compare(baseline, candidate, alpha=default_alpha, min_change=default_min_change,
+            resamples=default_resamples, seed=default_seed):
+    '''
+    Description: Compares every metric found in both the baseline and the candidate runs. A metric regressed
+    when the change is significant (Holm-corrected Mann-Whitney p below alpha), the bootstrap interval does not
+    include 0, and the median got worse by at least min_change %. Metrics with fewer than 2 samples on a side
+    are reported but not tested.
+    Parameters:
+        baseline: samples of the baseline (from samples())
+        candidate: samples of the candidate
+        alpha: significance level
+        min_change: smallest change in % that counts
+        resamples: bootstrap resamples
+        seed: seed of the bootstrap
+    Returns:
+        list of dictionaries, ranked: regressions first (worst first), then improvements, then the rest
+    '''
+    results = []
+    for key in sorted(set(baseline) & set(candidate)):
+        a, b = baseline[key], candidate[key]
+        if not a or not b:
+            continue
+        case, label, metric = key
+        base, cand = median(a), median(b)
+        result = {'test_case': case, 'label': label, 'metric': metric, 'n_baseline': len(a), 'n_candidate': len(b),
+                  'baseline': base, 'candidate': cand,
+                  'change': 100 * (cand - base) / abs(base) if base else math.nan,
+                  'ci_low': math.nan, 'ci_high': math.nan, 'cliffs_delta': math.nan, 'p': math.nan,
+                  'verdict': 'too few samples'}
+        if len(a) >= 2 and len(b) >= 2:
+            u, result['p'] = mann_whitney(a, b)
+            result['cliffs_delta'] = 2 * u / (len(a) * len(b)) - 1  # > 0: the candidate is larger
+            result['ci_low'], result['ci_high'] = bootstrap(a, b, resamples, seed)
+        results.append(result)
+
+    tested = [r for r in results if not math.isnan(r['p'])]
+    for r, p in zip(tested, holm([r['p'] for r in tested])):
+        r['p_holm'] = p
+        worse = -r['change'] if metrics[r['metric']] else r['change']  # > 0: worse
+        significant = p < alpha and not (r['ci_low'] <= 0 <= r['ci_high'])
+        if significant and worse >= min_change:
+            r['verdict'] = 'REGRESSION'
+        elif significant and worse <= -min_change:
+            r['verdict'] = 'improvement'
+        else:
+            r['verdict'] = 'no change'
+    for r in results:
+        r.setdefault('p_holm', math.nan)
+
+    def rank(r):
+        worse = -r['change'] if metrics[r['metric']] else r['change']
+        order = {'REGRESSION': 0, 'improvement': 1, 'no change': 2}.get(r['verdict'], 3)
+        return order, -abs(worse) if not math.isnan(worse) else 0, r['test_case'], r['label']
+
+    results.sort(key=rank)
+    return results
+
+
+def fmt(value, digits=2):
+    return '-' if value is None or math.isnan(value) else f"{value:.{digits}f}"
+
+
+def print_report(results):
+    '''
+    Description: Prints the ranked comparison as a table
+    Parameters:
+        results: from compare()
+    Returns:
+        None
+    '''
+    print(f"{'#':>3} {'Metric':<44}{'N':>9}{'Baseline':>10}{'Candidate':>10}{'Change%':>9}{'CI95%':>18}"
+          f"{'Cliff d':>9}{'p':>9}  Verdict")
+    for i, r in enumerate(results, 1):
+        name = '{}/{} {}'.format(r['test_case'], r['label'], r['metric'])
+        n = '{}/{}'.format(r['n_baseline'], r['n_candidate'])
+        ci = '{} .. {}'.format(fmt(r['ci_low'], 1), fmt(r['ci_high'], 1)) if not math.isnan(r['ci_low']) else '-'
+        print(f"{i:>3} {name:<44}{n:>9}{fmt(r['baseline']):>10}{fmt(r['candidate']):>10}{fmt(r['change'], 1):>9}"
+              f"{ci:>18}{fmt(r['cliffs_delta']):>9}{fmt(r['p_holm'], 4):>9}  {r['verdict']}")
+
+
+def main():
+    '''
+    Description: This function parses the command line arguments, compares the baseline and candidate
+    measurements and exits with 2 if a metric regressed.
+    Parameters:
+        None
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(
+        description="Compares two sets of measurement runs and reports significant regressions")
+    parser.add_argument('-b', '--baseline', nargs='+', required=True,
+                        help='Measurements directories of the baseline runs (test-case-N/*.txt)')
+    parser.add_argument('-c', '--candidate', nargs='+', required=True,
+                        help='Measurements directories of the candidate runs')
+    parser.add_argument('-T', '--topology', default=default_topology,
+                        help='Topology description (JSON) for the links between host pairs')
+    parser.add_argument('-a', '--alpha', default=default_alpha,
+                        help='Significance level after the Holm correction')
+    parser.add_argument('--min-change', default=default_min_change,
+                        help='Smallest change of the median in percent that counts as a regression')
+    parser.add_argument('-B', '--resamples', default=default_resamples,
+                        help='Number of bootstrap resamples')
+    parser.add_argument('--seed', default=default_seed,
+                        help='Seed of the bootstrap')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Parse every file again and do not write the cache')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the report as JSON')
+    args = parser.parse_args()
+
+    try:
+        alpha = float(args.alpha)
+        min_change = float(args.min_change)
+        resamples = int(args.resamples)
+        seed = int(args.seed)
+    except ValueError:
+        print("Error: alpha and minimum change must be numbers, resamples and seed integers")
+        sys.exit(1)
+    if not 0 < alpha < 1 or min_change < 0 or resamples < 1:
+        print("Error: alpha must be between 0 and 1, minimum change 0 or more and resamples at least 1")
+        sys.exit(1)
+    for directory in args.baseline + args.candidate:
+        if not os.path.isdir(directory):
+            print("Error: {} is not a directory".format(directory))
+            sys.exit(1)
+
+    try:
+        baseline = samples(args.baseline, args.topology, not args.no_cache)
+        candidate = samples(args.candidate, args.topology, not args.no_cache)
+    except (OSError, ValueError) as e:
+        print("Error:", e)
+        sys.exit(1)
+
+    results = compare(baseline, candidate, alpha, min_change, resamples, seed)
+    if not results:
+        print("Error: the baseline and the candidate have no metrics in common")
+        sys.exit(1)
+    regressions = sum(1 for r in results if r['verdict'] == 'REGRESSION')
+    if args.json:
+        print(to_json({'regressions': regressions, 'results': results}))
+    else:
+        print_report(results)
+        print("\n{} metrics, {} regressions, {} improvements".format(
+            len(results), regressions, sum(1 for r in results if r['verdict'] == 'improvement')))
+    sys.exit(2 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
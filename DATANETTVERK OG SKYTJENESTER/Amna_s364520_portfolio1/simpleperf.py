@@ -4,6 +4,13 @@ import socket
 import sys
 import time
 import re
+import os
+import json
+import math
+import multiprocessing
+import multiprocessing.connection
+import selectors
+import struct
 import threading
 
 # Global variables
@@ -14,6 +21,9 @@ default_format = 'MB'
 default_interval = 1
 default_parallel = 1
 default_num_bytes = '0B'
+default_length = 131072  # bytes per send/recv call (128 KiB)
+default_udp_length = 1470  # bytes per UDP datagram
+default_bitrate = '1M'  # target bitrate of a UDP stream
 
 
 def format_bytes(num_bytes, format):
@@ -33,300 +43,2342 @@ def format_bytes(num_bytes, format):
         return num_bytes
 
 
+def parse_bytes(num_bytes):
+    '''
+    Description: This function is used to convert a size given as B, KB or MB (or a plain number of bytes) to bytes
+    Parameters:
+        num_bytes: size as a string, e.g. 1000B, 128KB or 1MB
+    Returns:
+        num_bytes: size in bytes
+    '''
+    if num_bytes.isdigit():
+        return int(num_bytes)
+    if num_bytes[-2:] == "KB":
+        return int(num_bytes[:-2]) * 1000
+    elif num_bytes[-2:] == "MB":
+        return int(num_bytes[:-2]) * 1000000
+    return int(num_bytes[:-1])
+
+
 def tabs(data, format):
     '''
-    Description: This function is used to add tabs to the output and align the results
+    Description: This function is used to add tabs to the output and align the results
+    Parameters:
+        data: data to be printed
+        format: format of the summary of the results
+    Returns:
+        tabs: tabs to be added to the output
+    '''
+    if len(f"{data:.0f}" + format) < 7:
+        return "\t\t"
+    else:
+        return "\t"
+
+# struct tcp_info of Linux (include/uapi/linux/tcp.h) up to tcpi_delivery_rate
+tcp_info_struct = struct.Struct('=8B24I4Q6IQ')
+# position of the fields that are reported in the unpacked tuple
+tcp_info_index = {'rtt': 23, 'rttvar': 24, 'snd_cwnd': 26, 'total_retrans': 31,
+                  'pacing_rate': 32, 'delivery_rate': 42}
+
+
+def tcp_info(sock):
+    '''
+    Description: This function reads TCP_INFO of a socket (Linux only)
+    Parameters:
+        sock: a connected TCP socket
+    Returns:
+        dictionary with cwnd (segments), srtt and rttvar (ms), retransmits, pacing rate and delivery rate (bytes/s),
+        or None if TCP_INFO is not available
+    '''
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+    try:
+        raw = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, tcp_info_struct.size)
+    except OSError:
+        return None
+    # Older kernels return a shorter struct, the missing fields are 0
+    values = tcp_info_struct.unpack(raw.ljust(tcp_info_struct.size, b'\0'))
+    info = {name: values[i] for name, i in tcp_info_index.items()}
+    return {'cwnd': info['snd_cwnd'], 'srtt_ms': info['rtt'] / 1000, 'rttvar_ms': info['rttvar'] / 1000,
+            'retransmits': info['total_retrans'], 'pacing_rate': info['pacing_rate'],
+            'delivery_rate': info['delivery_rate']}
+
+
+def format_tcp_info(info, last_retransmits=0):
+    '''
+    Description: This function formats a TCP_INFO sample for an interval line
+    Parameters:
+        info: the sample from tcp_info()
+        last_retransmits: retransmits at the start of the interval
+    Returns:
+        the formatted sample
+    '''
+    if info is None:
+        return ""
+    return (f"\tcwnd {info['cwnd']}  srtt {info['srtt_ms']:.2f} ms  rttvar {info['rttvar_ms']:.2f} ms  "
+            f"retrans {info['retransmits'] - last_retransmits}  pacing {info['pacing_rate'] * 8 / 1000000:.2f} Mbps  "
+            f"delivery {info['delivery_rate'] * 8 / 1000000:.2f} Mbps")
+
+class Report:
+    '''
+    Description: Output of simpleperf. In text mode the tab-aligned lines are printed as before.
+    With --json the records are collected and printed as one JSON document at the end (per test on the server),
+    with --jsonl every record is printed as one JSON line when it happens.
+    Every record has a type (interval, stream, server, latency, fairness), a timestamp and the test ID.
+    '''
+    # Key of the records of each type in the JSON document
+    sections = {'interval': 'intervals', 'stream': 'streams', 'server': 'server_streams', 'latency': 'latency',
+                'options': 'options', 'sweep': 'sweep', 'fairness': 'fairness'}
+
+    def __init__(self, mode='text'):
+        self.mode = mode  # 'text', 'json', 'jsonl' or 'quiet' (records are only collected, used by --sweep)
+        self.records = []  # records of --json that are not printed yet
+        self.lock = threading.Lock()
+
+    def text(self, *args, **kwargs):
+        '''
+        Description: Prints a line of the text output (nothing with --json or --jsonl)
+        '''
+        if self.mode == 'text':
+            print(*args, **kwargs)
+
+    def record(self, type, **fields):
+        '''
+        Description: Adds a record to the JSON output
+        Parameters:
+            type: type of the record
+            fields: values of the record
+        Returns:
+            None
+        '''
+        if self.mode == 'text':
+            return
+        record = {'type': type, 'timestamp': round(time.time(), 6)}
+        record.update(fields)
+        with self.lock:
+            if self.mode == 'jsonl':
+                # One write per record, so the lines of --procs workers do not interleave
+                sys.stdout.write(json.dumps(record) + "\n")
+                sys.stdout.flush()
+            else:
+                self.records.append(record)
+
+    def dump(self, only=None, **header):
+        '''
+        Description: Prints the JSON document of --json with the collected records (of one test if only is given)
+        Parameters:
+            only: test ID, print only the records of this test
+            header: values at the top of the document
+        Returns:
+            None
+        '''
+        if self.mode != 'json':
+            return
+        with self.lock:
+            records = [r for r in self.records if only is None or r.get('test_id') == only]
+            self.records = [r for r in self.records if only is not None and r.get('test_id') != only]
+        document = dict(header)
+        for section in self.sections.values():
+            document[section] = []
+        for r in records:
+            document.setdefault(self.sections.get(r['type'], r['type']), []).append(r)
+        print(json.dumps(document, indent=2), flush=True)
+
+
+def rate_record(start, end, num_bytes):
+    '''
+    Description: This function returns the common fields of an interval or summary record
+    Parameters:
+        start: start of the interval in seconds since the start of the stream
+        end: end of the interval
+        num_bytes: bytes in the interval
+    Returns:
+        dictionary with start, end, bytes and bits_per_second
+    '''
+    elapsed = end - start
+    return {'start': round(start, 6), 'end': round(end, 6), 'bytes': num_bytes,
+            'bits_per_second': num_bytes * 8 / elapsed if elapsed > 0 else 0}
+
+
+report = Report()  # set up by mode() from --json and --jsonl
+
+###################################################
+##################  FAIRNESS ######################
+###################################################
+
+default_jfi_threshold = 0.9  # --jfi warns when the fairness index of an interval is lower
+
+
+def jain_index(rates):
+    '''
+    Description: This function calculates Jain's fairness index (sum x)^2 / (n * sum x^2) of the rates,
+    1 when every stream gets the same rate and 1/n when one stream gets everything
+    Parameters:
+        rates: list of rates
+    Returns:
+        the fairness index (1 when there is no traffic at all)
+    '''
+    squares = sum(x * x for x in rates)
+    if not rates or squares == 0:
+        return 1.0
+    return sum(rates) ** 2 / (len(rates) * squares)
+
+
+def report_fairness(label, start, end, rates, threshold, test_id=None, direction='up'):
+    '''
+    Description: This function prints the total rate and Jain's fairness index of the streams in one interval,
+    and a warning with the slowest and the fastest stream when the index is below the threshold
+    Parameters:
+        label: what the streams are (a test or all tests)
+        start: start of the interval in seconds
+        end: end of the interval in seconds
+        rates: dictionary with the rate of each stream in bits per second (key: stream ID)
+        threshold: fairness index below which a warning is printed
+        test_id: test ID of the JSON record
+        direction: direction of the streams
+    Returns:
+        the fairness index
+    '''
+    jfi = jain_index(list(rates.values()))
+    total = sum(rates.values())
+    report.text(f"[JFI]\t{label}\t{start:.1f} - {end:.1f}\t{len(rates)} streams\t{total / 1000000:.2f} Mbps\tJFI {jfi:.3f}")
+    alert = jfi < threshold
+    if alert:
+        slowest = min(rates, key=rates.get)
+        fastest = max(rates, key=rates.get)
+        report.text(f"Warning: JFI {jfi:.3f} is below {threshold:.2f} ({label}): slowest {slowest} "
+                    f"{rates[slowest] / 1000000:.2f} Mbps, fastest {fastest} {rates[fastest] / 1000000:.2f} Mbps")
+    report.record('fairness', test_id=test_id, scope=label, direction=direction, start=round(start, 6),
+                  end=round(end, 6), bits_per_second=total, jfi=jfi, threshold=threshold, alert=alert, rates=rates)
+    return jfi
+
+
+def server_fairness(tests, start, now, threshold):
+    '''
+    Description: This function reports the fairness of the streams that ran in the last interval: per test and
+    direction, and across the tests of all clients (per stream and per test)
+    Parameters:
+        tests: dictionary of running tests
+        start: start of the interval
+        now: end of the interval
+        threshold: fairness index below which a warning is printed
+    Returns:
+        None
+    '''
+    streams = {'up': {}, 'down': {}}  # rates of the streams of all tests
+    totals = {'up': {}, 'down': {}}  # total rate of each test
+    first = now  # start of the oldest running test
+    for test in tests.values():
+        if test.start_time is None:
+            continue
+        first = min(first, test.start_time)
+        rates = {'up': {}, 'down': {}}
+        for s in test.streams:
+            if s.direction not in rates or s.start_time is None or s.end_time is not None:
+                continue
+            since = max(start, s.start_time)
+            rates[s.direction]["{}:{}".format(*s.addr)] = \
+                (s.total_bytes - s.fairness_bytes) * 8 / (now - since) if now > since else 0
+            s.fairness_bytes = s.total_bytes
+        for d in rates:
+            if len(rates[d]) > 1:
+                report_fairness("Test {}".format(test.test_id[:8]), max(start, test.start_time) - test.start_time,
+                                now - test.start_time, rates[d], threshold, test.test_id, d)
+            if rates[d]:
+                streams[d].update(rates[d])
+                totals[d]["{} ({})".format(test.control.addr[0], test.test_id[:8])] = sum(rates[d].values())
+
+    for d in totals:
+        if len(totals[d]) > 1:
+            report_fairness("All streams", max(start, first) - first, now - first, streams[d], threshold, None, d)
+            report_fairness("All tests", max(start, first) - first, now - first, totals[d], threshold, None, d)
+
+
+def counter_fairness(counters, last, streams, start, end, threshold, alive=None, test_id=None):
+    '''
+    Description: This function reports the fairness of the streams of a client in one interval from the
+    bytes counted per stream
+    Parameters:
+        counters: bytes transferred so far per stream
+        last: counters at the start of the interval, updated to the current counters
+        streams: list of (slot, index, direction) of all streams
+        start: start of the interval in seconds since the start of the test
+        end: end of the interval
+        threshold: fairness index below which a warning is printed
+        alive: per slot, False when the stream is done (done streams are left out), None: all streams run
+        test_id: ID of the test, for the JSON output
+    Returns:
+        None
+    '''
+    rates = {'up': {}, 'down': {}}
+    for slot, i, d in streams:
+        current = counters[slot]
+        if alive is None or alive[slot]:
+            rates[d]["stream {}".format(i)] = (current - last[slot]) * 8 / (end - start) if end > start else 0
+        last[slot] = current
+    for d in rates:
+        if len(rates[d]) > 1:
+            report_fairness("Test " + ("sent" if d == 'up' else "received"), start, end, rates[d], threshold,
+                            test_id, d)
+
+
+###################################################
+##################  SERVER SIDE ###################
+###################################################
+
+
+control_header = struct.Struct('!I')  # length of the JSON message that follows
+max_message = 65536  # largest control message that is accepted
+deadline_grace = 10  # seconds a stream may run past the negotiated duration before the server stops it
+# Heading of the byte column of a stream in the results, per direction ('rr' counts transactions, not bytes)
+direction_labels = {'up': "Received", 'down': "Sent\t", 'rr': "Requests"}
+
+
+def stream_summary(stream_id, seconds, num_bytes, format, transactions=None):
+    '''
+    Description: This function formats the summary line of one stream in the results.
+    A request/response stream shows the number of transactions and transactions per second instead of bytes.
+    Parameters:
+        stream_id: ip:port of the stream
+        seconds: duration of the stream
+        num_bytes: bytes of the stream
+        format: format of the summary of the results
+        transactions: number of completed requests ('rr' streams), None for bulk streams
+    Returns:
+        the line
+    '''
+    if transactions is not None:
+        per_second = transactions / seconds if seconds > 0 else 0
+        return f"{stream_id}\t0.0 - {seconds:.1f}\t{transactions}\t\t{per_second:.1f} trans/s"
+    rate = (num_bytes * 8) / seconds / 1000000 if seconds > 0 else 0
+    received = format_bytes(num_bytes, format)
+    return f"{stream_id}\t0.0 - {seconds:.1f}\t{received:.0f} {format}{tabs(received, format)}{rate:.2f} Mbps"
+
+
+def encode_message(message):
+    '''
+    Description: This function encodes a control message as a 4-byte length followed by JSON
+    Parameters:
+        message: dictionary with the message
+    Returns:
+        the encoded message
+    '''
+    payload = json.dumps(message).encode()
+    return control_header.pack(len(payload)) + payload
+
+
+def decode_messages(inbuf, limit=None):
+    '''
+    Description: This function takes the complete control messages out of a receive buffer
+    Parameters:
+        inbuf: bytearray with the received bytes, the decoded messages are removed from it
+        limit: decode at most this many messages
+    Returns:
+        list of messages (dictionaries)
+    '''
+    messages = []
+    while len(inbuf) >= control_header.size and (limit is None or len(messages) < limit):
+        (size,) = control_header.unpack_from(inbuf)
+        if size > max_message:
+            raise ValueError("control message too large")
+        if len(inbuf) < control_header.size + size:
+            break
+        messages.append(json.loads(inbuf[control_header.size:control_header.size + size]))
+        del inbuf[:control_header.size + size]
+    return messages
+
+
+def check_params(message):
+    '''
+    Description: This function checks the params message of a client before its test is registered
+    Parameters:
+        message: the params message
+    Returns:
+        the error message, or None if the parameters are valid
+    '''
+    streams = message.get('streams')
+    if not isinstance(message.get('test_id'), str):
+        return "invalid test ID"
+    if not isinstance(streams, int) or isinstance(streams, bool) or streams < 1:
+        return "number of streams must be a positive integer"
+    if message.get('direction', 'up') not in ('up', 'down', 'bidir'):
+        return "unknown direction"
+    for key in ('time', 'bytes'):
+        value = message.get(key) or 0
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            return "invalid {}".format(key)
+    for key in ('req_size', 'resp_size'):
+        value = message.get(key)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+            return "invalid {}".format(key)
+    tuning = message.get('tuning') or {}
+    if not isinstance(tuning, dict):
+        return "invalid tuning"
+    for key, value in tuning.items():
+        if key in ('sndbuf', 'rcvbuf', 'mss'):
+            # setsockopt takes a C int
+            valid = value is None or isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2 ** 31
+        elif key == 'nodelay':
+            valid = value is None or isinstance(value, bool)
+        elif key == 'congestion':
+            valid = value is None or isinstance(value, str) and len(value.encode()) < 16  # TCP_CA_NAME_MAX
+        else:
+            valid = False
+        if not valid:
+            return "invalid tuning option {}".format(key)
+    return None
+
+
+def send_message(sock, message):
+    '''
+    Description: This function sends one control message
+    Parameters:
+        sock: the socket
+        message: dictionary with the message
+    Returns:
+        None
+    '''
+    sock.sendall(encode_message(message))
+
+
+def recv_message(sock):
+    '''
+    Description: This function receives one control message (blocking)
+    Parameters:
+        sock: the socket
+    Returns:
+        the message, or None if the connection was closed
+    '''
+    inbuf = bytearray()
+    while True:
+        messages = decode_messages(inbuf, 1)
+        if messages:
+            return messages[0]
+        need = control_header.size - len(inbuf) if len(inbuf) < control_header.size else \
+            control_header.size + control_header.unpack_from(inbuf)[0] - len(inbuf)
+        data = sock.recv(need)
+        if not data:
+            return None
+        inbuf += data
+
+
+class Stream:
+    '''
+    Description: State of one TCP connection at the server side. A connection becomes the control
+    connection of a test or one of its data streams, depending on its first message.
+    '''
+
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.inbuf = bytearray()  # received bytes that are not decoded yet
+        self.role = None  # 'control' or 'stream'
+        self.test = None
+        self.index = 0
+        self.direction = 'up'  # 'up': the client sends, 'down': the server sends, 'rr': request/response
+        self.pending = 0  # bytes of a request that is not complete yet ('rr')
+        self.outbuf = bytearray()  # responses that are not sent yet ('rr')
+        self.total_bytes = 0
+        self.transactions = 0  # completed requests ('rr')
+        self.start_time = None
+        self.end_time = None
+        self.interval_start = None  # start of the current interval (--json, --jsonl)
+        self.interval_bytes = 0  # total_bytes at the start of the current interval
+        self.fairness_bytes = 0  # total_bytes at the start of the current interval of --jfi
+
+
+class Test:
+    '''
+    Description: One test of a client: its parameters, its control connection and its data streams.
+    '''
+
+    def __init__(self, test_id, params, control):
+        self.test_id = test_id
+        self.params = params
+        self.control = control
+        self.streams = []
+        self.ended = 0
+        self.start_time = None
+
+
+def server(server, port, format, length=default_length, interval=default_interval, fairness=None):
+    '''
+    Description: This function creates a server socket and serves any number of clients and streams on one thread.
+    The sockets are non-blocking and multiplexed with selectors (epoll on Linux). A client opens a control
+    connection with the parameters of the test and then its data streams. The server starts every stream at
+    the same moment, and sends the results back on the control connection when the streams are done.
+    Parameters:
+        server: The IP address of the server's interface where the client should connect
+        port: The port number on which the server should listen
+        format: The format of the summary of results - it should be either in B, KB or MB
+        length: size of the receive buffer in bytes
+        interval: interval of the interval records of --json and --jsonl and of the fairness index
+        fairness: report Jain's fairness index of the running streams every interval and warn below this value
+                  (None: not reported)
+    Returns:
+        None
+    '''
+    server_socket = socket.socket(
+        socket.AF_INET, socket.SOCK_STREAM)  # create a TCP socket
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        # bind the socket to the server and port
+        server_socket.bind((server, port))
+    except socket.error as e:
+        print("Socket binding error: ", str(e))
+        sys.exit()
+
+    server_socket.listen(socket.SOMAXCONN)  # listen for incoming connections
+    server_socket.setblocking(False)
+
+    report.text("-" * 45)
+    report.text("A simpleperf server is listening on port {}".format(port))
+    report.text("-" * 45 + "\n")
+
+    sel = selectors.DefaultSelector()
+    sel.register(server_socket, selectors.EVENT_READ)
+
+    # One receive buffer and one send buffer are shared by every stream, since only one stream is served at a time
+    buffer = bytearray(length)
+    data = memoryview(b"0" * length)
+    tests = {}  # key: test ID, value: Test
+    fairness_start = time.time()
+
+    try:
+        while True:
+            for key, mask in sel.select(timeout=min(1, interval)):
+                if key.fileobj is server_socket:
+                    accept_streams(server_socket, sel)
+                elif key.data.role == 'stream' and key.data.direction == 'rr':
+                    handle_rr(key.data, mask, sel, buffer, tests, format)
+                elif key.data.role == 'stream' and mask & selectors.EVENT_WRITE:
+                    send_stream(key.data, sel, data, tests, format)
+                elif key.data.role == 'stream':
+                    handle_server(key.data, sel, buffer, tests, format)
+                else:
+                    handle_control(key.data, sel, tests, server, port, format)
+
+            # Stop the streams of tests that run past their deadline
+            now = time.time()
+            if fairness is not None and now - fairness_start >= interval:
+                server_fairness(tests, fairness_start, now, fairness)
+                fairness_start = now
+            for test in list(tests.values()):
+                if report.mode != 'text' and test.start_time is not None:
+                    report_intervals(test, now, interval)
+                duration = test.params.get('time', 0)
+                if test.params.get('bytes'):
+                    continue  # a -n test runs until all bytes are transferred
+                if test.start_time is not None and duration and now > test.start_time + duration + deadline_grace:
+                    for stream in test.streams:
+                        if stream.end_time is None:
+                            end_stream(stream, sel, tests, format)
+
+    except KeyboardInterrupt:
+        report.text("\nServer shutting down...")
+        sel.close()
+        server_socket.close()
+
+    sys.exit()
+
+
+def accept_streams(server_socket, sel):
+    '''
+    Description: Accepts every pending connection and registers it with the selector.
+    Parameters:
+        server_socket: the listening socket
+        sel: the selector
+    Returns:
+        None
+    '''
+    while True:
+        try:
+            conn, addr = server_socket.accept()  # accept incoming connection
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        sel.register(conn, selectors.EVENT_READ, Stream(conn, addr))
+
+
+def close_connection(c, sel):
+    '''
+    Description: Unregisters and closes a connection.
+    Parameters:
+        c: the Stream of the connection
+        sel: the selector
+    Returns:
+        None
+    '''
+    try:
+        sel.unregister(c.conn)
+    except (KeyError, ValueError):
+        pass
+    c.conn.close()
+
+
+def handle_control(c, sel, tests, server, port, format):
+    '''
+    Description: This function reads control messages from a connection that has not sent payload.
+    The first message decides what the connection is: "params" opens a test, "stream" adds a data stream to one.
+    Parameters:
+        c: the Stream of the connection
+        sel: the selector
+        tests: dictionary of running tests
+        server: IP address of the server
+        port: port number of the server
+        format: The format of the summary of results - it should be either in B, KB or MB
+    Returns:
+        None
+    '''
+    try:
+        data = c.conn.recv(max_message)
+    except (BlockingIOError, InterruptedError):
+        return
+    except ConnectionError:
+        data = b""
+
+    if not data:
+        # The client is gone, drop its test
+        if c.role == 'control' and tests.get(c.test.test_id) is c.test:
+            del tests[c.test.test_id]
+            for stream in c.test.streams:
+                close_connection(stream, sel)
+        close_connection(c, sel)
+        return
+
+    c.inbuf += data
+    try:
+        # A data stream sends a single message, everything after it is payload
+        messages = decode_messages(c.inbuf, 1 if c.role is None else None)
+    except ValueError:
+        close_connection(c, sel)
+        return
+
+    for message in messages:
+        if not isinstance(message, dict):
+            close_connection(c, sel)
+            return
+
+        if c.role is None and message.get('type') == 'params':
+            error = check_params(message)
+            if error is None and message['test_id'] in tests:
+                error = "test ID in use"
+            if error is not None:
+                try:
+                    c.conn.sendall(encode_message({'type': 'error', 'message': error}))
+                except OSError:
+                    pass
+                close_connection(c, sel)
+                return
+            c.role = 'control'
+            c.test = Test(message['test_id'], message, c)
+            tests[c.test.test_id] = c.test
+            try:
+                c.conn.sendall(encode_message({'type': 'ready'}))
+            except OSError:
+                del tests[c.test.test_id]
+                close_connection(c, sel)
+                return
+
+        elif c.role is None and message.get('type') == 'stream':
+            test = tests.get(message.get('test_id')) if isinstance(message.get('test_id'), str) else None
+            if test is None or len(test.streams) >= test.params['streams']:
+                close_connection(c, sel)
+                return
+            c.direction = message.get('direction') if message.get('direction') in ('down', 'rr') else 'up'
+            index = message.get('index', len(test.streams))
+            if c.direction == 'rr' and not (test.params.get('req_size') and test.params.get('resp_size')) or \
+                    not isinstance(index, int) or isinstance(index, bool) or index < 0:
+                close_connection(c, sel)
+                return
+            c.role = 'stream'
+            c.test = test
+            c.index = index
+            if c.direction == 'rr':
+                c.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            tune_socket(c.conn, test.params.get('tuning') or {}, strict=False)
+            test.streams.append(c)
+            report.text("A simpleperf client with {}:{} is connected with {}:{}".format(
+                c.addr[0], c.addr[1], server, port))
+
+            # Start every stream at the same moment when the last one is connected
+            if len(test.streams) == test.params['streams']:
+                test.start_time = time.time()
+                for stream in test.streams:
+                    stream.start_time = test.start_time
+                    if stream.direction == 'down':
+                        sel.modify(stream.conn, selectors.EVENT_WRITE, stream)
+                try:
+                    test.control.conn.sendall(encode_message({'type': 'start'}))
+                except OSError:
+                    # The client is gone before the test started, drop its test
+                    del tests[test.test_id]
+                    for stream in test.streams:
+                        close_connection(stream, sel)
+                    close_connection(test.control, sel)
+                    return
+
+            # Payload that came in the same read as the hello
+            c.total_bytes += len(c.inbuf)
+            c.inbuf.clear()
+            return
+
+
+def handle_server(stream, sel, buffer, tests, format):
+    '''
+    Description: This function reads the payload that is ready on one data stream.
+    The stream ends when the client shuts down its side of the connection.
+    Parameters:
+        stream: the Stream that is ready to be read
+        sel: the selector
+        buffer: the shared receive buffer
+        tests: dictionary of running tests
+        format: The format of the summary of results - it should be either in B, KB or MB
+    Returns:
+        None
+    '''
+    try:
+        n = stream.conn.recv_into(buffer)
+    except (BlockingIOError, InterruptedError):
+        return
+    except ConnectionError:
+        n = 0
+
+    if n > 0:
+        stream.total_bytes += n
+    else:
+        end_stream(stream, sel, tests, format)
+
+
+def send_stream(stream, sel, data, tests, format):
+    '''
+    Description: This function sends payload on a data stream of a reverse test when the socket is writable.
+    The stream ends at the deadline of the test or when the negotiated number of bytes is sent.
+    Parameters:
+        stream: the Stream that is ready to be written
+        sel: the selector
+        data: the shared send buffer
+        tests: dictionary of running tests
+        format: The format of the summary of results - it should be either in B, KB or MB
+    Returns:
+        None
+    '''
+    params = stream.test.params
+    num_bytes = params.get('bytes', 0)
+    if num_bytes:
+        done = stream.total_bytes >= num_bytes
+    else:
+        done = time.time() >= stream.start_time + params.get('time', default_time)
+
+    if not done:
+        try:
+            if num_bytes:
+                stream.total_bytes += stream.conn.send(data[:num_bytes - stream.total_bytes])
+            else:
+                stream.total_bytes += stream.conn.send(data)
+            return
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            pass  # the client is gone
+
+    try:
+        stream.conn.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    end_stream(stream, sel, tests, format)
+
+
+def report_intervals(test, now, interval):
+    '''
+    Description: This function adds an interval record for every running stream of a test whose interval is over
+    Parameters:
+        test: the running Test
+        now: the current time
+        interval: length of an interval in seconds
+    Returns:
+        None
+    '''
+    for s in test.streams:
+        if s.end_time is not None:
+            continue
+        if s.interval_start is None:
+            s.interval_start = s.start_time
+        if now - s.interval_start >= interval:
+            report.record('interval', test_id=test.test_id, stream="{}:{}".format(*s.addr), direction=s.direction,
+                          **rate_record(s.interval_start - s.start_time, now - s.start_time,
+                                        s.total_bytes - s.interval_bytes))
+            s.interval_start = now
+            s.interval_bytes = s.total_bytes
+
+
+def end_stream(stream, sel, tests, format):
+    '''
+    Description: This function ends a data stream. When all streams of the test are done it calculates
+    the time elapsed, total bytes received and the rate at which traffic could be read in megabits per
+    second (Mbps) of each stream, prints them and sends them to the client.
+    Parameters:
+        stream: the Stream that is done
+        sel: the selector
+        tests: dictionary of running tests
+        format: The format of the summary of results - it should be either in B, KB or MB
+    Returns:
+        None
+    '''
+    stream.end_time = time.time()
+    close_connection(stream, sel)
+
+    test = stream.test
+    test.ended += 1
+    if test.ended < test.params['streams'] or tests.get(test.test_id) is not test:
+        return
+    del tests[test.test_id]
+
+    results = []
+    report.text("\nTest {} from {}: {} stream(s)".format(test.test_id, test.control.addr[0], len(test.streams)))
+    direction = None
+    for s in sorted(test.streams, key=lambda s: (list(direction_labels).index(s.direction), s.index)):
+        if s.direction != direction:
+            if direction is not None:
+                report.text()
+            direction = s.direction
+            report.text("ID\t\tInterval\t{}\tRate\n".format(direction_labels[direction]))
+        # Calculate the time elapsed in seconds
+        time_elapsed = s.end_time - (s.start_time or s.end_time)
+        transactions = s.transactions if s.direction == 'rr' else None
+
+        (ip_client, port_client) = s.addr
+        report.text(stream_summary(f"{ip_client}:{port_client}", time_elapsed, s.total_bytes, format, transactions))
+        result = {'id': f"{ip_client}:{port_client}", 'index': s.index, 'direction': s.direction,
+                  'bytes': s.total_bytes, 'seconds': time_elapsed}
+        extra = {}
+        if transactions is not None:
+            result['transactions'] = transactions
+            extra = {'transactions': transactions,
+                     'transactions_per_second': transactions / time_elapsed if time_elapsed > 0 else 0}
+        results.append(result)
+        report.record('stream', test_id=test.test_id, stream=f"{ip_client}:{port_client}", direction=s.direction,
+                      **rate_record(0, time_elapsed, s.total_bytes), **extra)
+    report.text()
+    report.dump(test.test_id, role='server', test_id=test.test_id, client=test.control.addr[0], params=test.params)
+
+    try:
+        test.control.conn.sendall(encode_message({'type': 'results', 'streams': results}))
+    except OSError:
+        close_connection(test.control, sel)
+
+
+###################################################
+##################  CLIENT SIDE ###################
+###################################################
+
+def client(server, port, time_, format, interval, parallel, num_bytes, length=default_length, file=None, direction='up',
+           procs=1, tcpinfo=False, latency=False, req_size=1, resp_size=1, tuning=None, fairness=None):
+    '''
+    Description: This function opens the control connection, negotiates the test with the server and
+    creates the parallel data connections. All streams start when the server says so, and the results
+    of the server are printed after the results of the client.
+    Parameters:
+        server: IP address of the server
+        port: port number of the server
+        time_: the total duration in seconds for which data should be generated, also sent to the server (if it is set with -t flag at the client side) and must be > 0. If do not use -t flag, client runs for 25 seconds
+        format: format of the summary of the results – it should be either in B, KB or MB, default=MB
+        interval: prints statistics per z second
+        parallel: creates parallel connections to connect to the server and send data – it must be at least 1 – default: 1
+        num_bytes: transfer number of bytes specified by -n flag, it should be either in B, KB or MB. If -n flag is not specified, client will send data for 25 seconds
+        length: number of bytes written by each send call
+        file: send this file with sendfile (zero-copy) instead of generated data
+        direction: 'up' (the client sends), 'down' (the server sends, -R) or 'bidir' (both at once, parallel streams each way)
+        procs: number of worker processes the streams are spread over (1: all streams are threads of this process)
+        tcpinfo: print TCP_INFO of every stream in every interval
+        latency: run request/response transactions on one more connection, next to the bulk streams (if any)
+        req_size: size of a request in bytes
+        resp_size: size of a response in bytes
+        tuning: socket options of the data streams (see tune_socket), also applied by the server
+        fairness: report Jain's fairness index of the streams every interval and warn below this value
+                  (None: not reported)
+    Returns:
+        None
+    '''
+    tuning = tuning or {}
+    test_id = os.urandom(8).hex()
+    params = {'type': 'params', 'test_id': test_id, 'streams': parallel, 'time': time_,
+              'bytes': parse_bytes(num_bytes), 'length': length, 'direction': direction}
+    directions = ['up', 'down'] if direction == 'bidir' else [direction]
+    params['streams'] = parallel * len(directions) + (1 if latency else 0)
+    params['req_size'] = req_size
+    params['resp_size'] = resp_size
+    params['tuning'] = tuning
+
+    # Negotiate the test on the control connection
+    try:
+        control = socket.create_connection((server, port), timeout=5)
+        send_message(control, params)
+        reply = recv_message(control)
+    except socket.error as e:
+        print("Error connecting to server: ", e)
+        sys.exit(1)
+
+    if reply is None or reply.get('type') != 'ready':
+        print("Error: server refused the test: {}".format(reply.get('message') if reply else "connection closed"))
+        sys.exit(1)
+
+    # Print the main header
+    report.text("-" * 64)
+    report.text("A simpleperf client connecting to server {}, port {}".format(
+        server, port))
+    report.text("-" * 64 + "\n")
+
+    # Every stream of the test: (slot in the shared counters, index, direction)
+    streams = [(slot, i, d) for slot, (d, i) in enumerate((d, i) for d in directions for i in range(parallel))]
+    procs = min(procs, len(streams))
+
+    start = threading.Event()  # set when the server starts the test
+    if procs > 1:
+        workers, counters = start_workers(server, port, test_id, streams, time_, format, interval, parallel,
+                                          num_bytes, length, file, procs, tcpinfo, tuning)
+    else:
+        sent = []  # summary of the streams where the client sends
+        received = []  # summary of the streams where the server sends
+        counters = [0] * len(streams) if fairness is not None else None  # the threads write their own slot
+        threads = open_streams(server, port, test_id, streams, time_, format, interval, parallel, num_bytes,
+                               length, file, start, sent, received, counters, tcpinfo=tcpinfo, tuning=tuning)
+
+    # The latency stream runs in this process, next to the bulk streams
+    if latency:
+        histogram = LatencyHistogram()
+        stop = threading.Event()  # set when the bulk streams are done
+        try:
+            rr_socket = socket.create_connection((server, port), timeout=5)
+            send_message(rr_socket, {'type': 'stream', 'test_id': test_id, 'index': 0, 'direction': 'rr'})
+        except socket.error as e:
+            print("Error connecting to server: ", e)
+            sys.exit(1)
+        rr_socket.settimeout(None)
+        rr_thread = threading.Thread(target=handle_client_rr, args=(
+            rr_socket, time_, req_size, resp_size, histogram, start, stop), daemon=True)
+        rr_thread.start()
+
+    # Wait until the server has every stream and starts the test
+    control.settimeout(None)
+    message = recv_message(control)
+    if message is None or message.get('type') != 'start':
+        print("Error: server did not start the test")
+        sys.exit(1)
+
+    if parallel == 1 or procs > 1 or tcpinfo:
+        report.text("\nID\t\tInterval\tTransfer\tBandwidth\n")
+
+    start.set()
+    if procs > 1:
+        sent, received = monitor_workers(workers, counters, streams, format, interval, direction, test_id, fairness)
+    elif fairness is not None:
+        monitor_threads(threads, counters, streams, interval, fairness, test_id)
+    else:
+        # Wait for all threads to finish
+        for t in threads:
+            t.join()
+
+    if latency:
+        if streams:
+            stop.set()  # measure latency only as long as there is load
+        rr_thread.join()
+
+    # Print the summary of each connection, per direction
+    for label, summary in (("Sent", sent), ("Received", received)):
+        if not summary:
+            continue
+        if direction == 'bidir':
+            report.text(label)
+        if parallel > 1:
+            report.text("\nID\t\tInterval\tTransfer\tBandwidth\n")
+
+        for result in summary:
+            report.text(result)
+        report.text()
+
+    if latency:
+        print_latency(histogram, req_size, resp_size, test_id)
+
+    # Print the results measured by the server
+    results = recv_message(control)
+    control.close()
+    if results is None or results.get('type') != 'results':
+        print("Error: no results from the server")
+        sys.exit(1)
+
+    report.text("Server results")
+    direction = None
+    for result in results['streams']:
+        if result.get('direction', 'up') != direction:
+            direction = result.get('direction', 'up')
+            report.text("\nID\t\tInterval\t{}\tRate\n".format(direction_labels.get(direction, "Received")))
+        transactions = result.get('transactions') if direction == 'rr' else None
+        report.text(stream_summary(result['id'], result['seconds'], result['bytes'], format, transactions))
+        extra = {}
+        if transactions is not None:
+            extra = {'transactions': transactions,
+                     'transactions_per_second': transactions / result['seconds'] if result['seconds'] > 0 else 0}
+        report.record('server', test_id=test_id, stream=result['id'], direction=direction,
+                      **rate_record(0, result['seconds'], result['bytes']), **extra)
+    report.text()
+    report.dump(role='client', test_id=test_id, server=server, port=port, params=params)
+
+
+def open_streams(server, port, test_id, streams, time_, format, interval, parallel, num_bytes, length, file,
+                 start, sent, received, counters=None, tcpinfo=False, tuning=None):
+    '''
+    Description: This function connects the data streams of a test and creates a thread for each of them.
+    Parameters:
+        server: IP address of the server
+        port: port number of the server
+        test_id: ID of the test, sent on every stream
+        streams: list of (slot, index, direction) of the streams to open
+        time_: the total duration in seconds
+        format: format of the summary of the results
+        interval: prints statistics per z second
+        parallel: number of parallel connections in each direction
+        num_bytes: number of bytes to send per stream (-n)
+        length: number of bytes per send/recv call
+        file: send this file with sendfile instead of generated data
+        start: event that is set when the server starts the test
+        sent: list of summary results of the streams where the client sends
+        received: list of summary results of the streams where the server sends
+        counters: shared array of bytes transferred per stream (with --procs)
+        tcpinfo: print TCP_INFO of every stream in every interval
+        tuning: socket options of the streams (see tune_socket)
+    Returns:
+        list of threads
+    '''
+    threads = []
+    for slot, i, d in streams:
+        # Create a new socket for each connection for different ports
+        client_socket = socket.socket(
+            socket.AF_INET, socket.SOCK_STREAM)  # create a TCP socket
+        client_socket.settimeout(5)  # set a timeout of 5 seconds
+        tune_socket(client_socket, tuning or {})
+
+        try:
+            client_socket.connect((server, port))  # connect to the server
+            send_message(client_socket, {'type': 'stream', 'test_id': test_id, 'index': i, 'direction': d})
+
+        except socket.error as e:
+            print("Error connecting to server: ", e)
+            client_socket.close()
+            sys.exit(1)
+
+        client_socket.settimeout(None)
+
+        # Report the options that are in effect once per test
+        if slot == 0 and tuning and any(tuning.values()):
+            options = socket_options(client_socket)
+            report.text("Socket options: sndbuf {sndbuf} B, rcvbuf {rcvbuf} B, nodelay {nodelay}, "
+                        "congestion {congestion}, mss {mss} B".format(**options))
+            report.record('options', test_id=test_id, **options)
+
+        # Create a thread for each connection
+        if d == 'up':
+            t = threading.Thread(target=handle_client, args=(
+                client_socket, server, port, time_, format, interval, parallel, num_bytes, sent, length, file, start,
+                counters, slot, tcpinfo, test_id), daemon=True)
+        else:
+            t = threading.Thread(target=handle_client_receive, args=(
+                client_socket, server, port, format, interval, parallel, received, length, start,
+                counters, slot, tcpinfo, test_id), daemon=True)
+        threads.append(t)
+        t.start()
+    return threads
+
+
+def client_worker(cpu, conn, server, port, test_id, streams, time_, format, interval, parallel, num_bytes,
+                  length, file, counters, tcpinfo=False, tuning=None):
+    '''
+    Description: Worker process of --procs. It pins itself to one CPU, opens its share of the streams,
+    tells the parent it is ready, and runs the streams when the parent says the test has started.
+    The bytes of every stream are kept in the shared counters, the summaries are sent back on the pipe.
+    Parameters:
+        cpu: CPU to run on (None: no pinning)
+        conn: pipe to the parent
+        counters: shared array of bytes transferred per stream
+        (the other parameters are the same as in open_streams)
+    Returns:
+        None
+    '''
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+
+    sent = []
+    received = []
+    start = threading.Event()
+    threads = open_streams(server, port, test_id, streams, time_, format, interval, parallel, num_bytes,
+                           length, file, start, sent, received, counters, tcpinfo, tuning)
+    conn.send('ready')
+
+    # Wait for the start of the test
+    conn.recv()
+    start.set()
+    for t in threads:
+        t.join()
+    conn.send((sent, received, report.records))
+    conn.close()
+
+
+def start_workers(server, port, test_id, streams, time_, format, interval, parallel, num_bytes, length, file, procs,
+                  tcpinfo=False, tuning=None):
+    '''
+    Description: This function starts the worker processes of --procs, spreads the streams over them
+    round robin and waits until every worker has connected its streams.
+    Parameters:
+        streams: list of (slot, index, direction) of all streams
+        procs: number of worker processes
+        (the other parameters are the same as in open_streams)
+    Returns:
+        (list of (process, pipe), shared counters)
+    '''
+    counters = multiprocessing.Array('q', len(streams), lock=False)  # each slot is written by one stream only
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+
+    workers = []
+    for w in range(procs):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        cpu = cpus[w % len(cpus)] if cpus else None
+        p = multiprocessing.Process(target=client_worker, args=(
+            cpu, child_conn, server, port, test_id, streams[w::procs], time_, format, interval, parallel,
+            num_bytes, length, file, counters, tcpinfo, tuning), daemon=True)
+        p.start()
+        child_conn.close()
+        workers.append((p, parent_conn))
+
+    for p, conn in workers:
+        try:
+            if not conn.poll(30) or conn.recv() != 'ready':
+                raise EOFError
+        except EOFError:
+            print("Error: a worker process could not connect its streams")
+            sys.exit(1)
+
+    return workers, counters
+
+
+def monitor_workers(workers, counters, streams, format, interval, direction, test_id=None, fairness=None):
+    '''
+    Description: This function starts the streams of the worker processes and prints the total of all
+    streams every interval from the shared counters, until every worker is done.
+    Parameters:
+        workers: list of (process, pipe) from start_workers
+        counters: shared array of bytes transferred per stream
+        streams: list of (slot, index, direction) of all streams
+        format: format of the summary of the results
+        interval: prints statistics per z second
+        direction: 'up', 'down' or 'bidir'
+        test_id: ID of the test, for the JSON output
+        fairness: report Jain's fairness index of the streams every interval and warn below this value
+    Returns:
+        (summaries of the streams where the client sends, summaries of the streams where the server sends)
+    '''
+    for p, conn in workers:
+        conn.send('start')
+
+    sent = []
+    received = []
+    slots = {d: [slot for slot, i, sd in streams if sd == d] for d in ('up', 'down')}
+    last = {'up': 0, 'down': 0}
+    last_slots = [0] * len(streams)
+    start_time = interval_start_time = time.time()
+
+    pending = [conn for p, conn in workers]
+    while pending:
+        timeout = max(0, interval_start_time + interval - time.time())
+        for conn in multiprocessing.connection.wait(pending, timeout):
+            try:
+                s, r, records = conn.recv()
+                sent += s
+                received += r
+                report.records += records
+            except EOFError:
+                print("Error: a worker process stopped")
+            pending.remove(conn)
+
+        current_time = time.time()
+        if current_time - interval_start_time >= interval:
+            # Merge the counters of every stream into one line per direction
+            for d, label in (('up', 'sent'), ('down', 'received')):
+                if not slots[d]:
+                    continue
+                total = sum(counters[slot] for slot in slots[d])
+                interval_data = total - last[d]
+                last[d] = total
+                bandwidth = (interval_data * 8) / ((current_time - interval_start_time) * 1000000)
+                total_data = format_bytes(interval_data, format)
+                ntabs = tabs(total_data, format)
+                line = f"[SUM]\t\t{interval_start_time - start_time:.1f} - {current_time - start_time:.1f}\t{total_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps"
+                report.text(line + ("\t" + label if direction == 'bidir' else ""))
+                report.record('interval', test_id=test_id, stream='sum', direction=d,
+                              **rate_record(interval_start_time - start_time, current_time - start_time, interval_data))
+            if fairness is not None:
+                counter_fairness(counters, last_slots, streams, interval_start_time - start_time,
+                                 current_time - start_time, fairness, test_id=test_id)
+            interval_start_time = current_time
+
+    for p, conn in workers:
+        p.join()
+    return sent, received
+
+
+def monitor_threads(threads, counters, streams, interval, fairness, test_id=None):
+    '''
+    Description: This function waits for the stream threads of the client and reports the fairness of the
+    streams every interval from their counters (--jfi)
+    Parameters:
+        threads: threads of the streams, in the order of streams
+        counters: bytes transferred so far per stream
+        streams: list of (slot, index, direction) of all streams
+        interval: prints statistics per z second
+        fairness: fairness index below which a warning is printed
+        test_id: ID of the test, for the JSON output
+    Returns:
+        None
+    '''
+    last = [0] * len(streams)
+    start_time = interval_start_time = time.time()
+    while any(t.is_alive() for t in threads):
+        for t in threads:
+            t.join(max(0, interval_start_time + interval - time.time()))
+        current_time = time.time()
+        if current_time - interval_start_time >= interval:
+            alive = [t.is_alive() for t in threads]
+            counter_fairness(counters, last, streams, interval_start_time - start_time, current_time - start_time,
+                             fairness, alive, test_id)
+            interval_start_time = current_time
+
+
+def handle_client(client_socket, server, port, time_, format, interval, parallel, num_bytes, summary,
+                  length=default_length, file=None, start=None, counters=None, slot=0, tcpinfo=False, test_id=None):
+    '''
+    Description: This function handles the client side of the connection.
+    Parameters:
+        client_socket: client socket to connect to the server
+        server: IP address of the server
+        port: port number of the server
+        time_: the total duration in seconds for which data should be generated, also sent to the server (if it is set with -t flag at the client side) and must be > 0. If do not use -t flag, client runs for 25 seconds
+        format: format of the summary of the results – it should be either in B, KB or MB, default=MB
+        interval: prints statistics per z second
+        parallel: creates parallel connections to connect to the server and send data – it must be at least 1 – default: 1
+        num_bytes: transfer number of bytes specified by -n flag, it should be either in B, KB or MB. If -n flag is not specified, client will send data for 25 seconds
+        summary: list of summary results for each connection
+        length: number of bytes written by each send call
+        file: send this file with sendfile (zero-copy) instead of generated data
+        start: event that is set when the server starts the test
+        counters: shared array where the bytes sent so far are stored (with --procs)
+        slot: index of this stream in counters
+        tcpinfo: print TCP_INFO of this stream in every interval
+        test_id: ID of the test, for the JSON output
+    Returns:
+        None
+    '''
+    # Get the client ip and port
+    (client_ip, client_port) = client_socket.getsockname()
+
+    report.text("Client ip {}:{} connected with server {} port {}".format(
+        client_ip, client_port, server, port))
+
+    # Convert num_bytes to an integer
+    num_bytes = parse_bytes(num_bytes)
+
+    # One buffer is allocated for the whole test and reused for every send call
+    data = memoryview(b"0" * length)
+
+    # Wait until every stream is connected
+    if start is not None:
+        start.wait()
+
+    total_data = 0
+    start_time = time.time()
+    deadline = start_time + time_
+
+    # If -F flag is specified, send the file with sendfile (from the page cache to the socket without copies)
+    if file is not None:
+        with open(file, 'rb') as f:
+            chunk = 8 * length
+            while True:
+                sent = client_socket.sendfile(f, total_data, chunk)
+                if sent == 0:
+                    break
+                total_data += sent
+                if counters is not None:
+                    counters[slot] = total_data
+
+    # If -n flag is specified, send data for the specified number of bytes
+    elif num_bytes != 0:
+        while total_data < num_bytes:
+            total_data += client_socket.send(data[:num_bytes - total_data])
+            if counters is not None:
+                counters[slot] = total_data
+
+    # If -n flag is not specified, send data until the deadline and print the results in the specified interval
+    if num_bytes == 0 and file is None:
+        interval_data = 0
+        interval_start_time = start_time
+        last_retransmits = 0
+
+        while True:
+            current_time = time.time()
+
+            # If the specified interval has elapsed or the specified time has elapsed, print the results
+            if current_time - interval_start_time >= interval or current_time >= deadline:
+
+                if (parallel == 1 or tcpinfo or report.mode != 'text') and interval_data:
+                    # Calculate the bandwidth
+                    bandwidth = (interval_data * 8) / ((current_time - interval_start_time) * 1000000)
+                    # Format the total data to the specified format
+                    total_sent_data = format_bytes(interval_data, format)
+                    # Sample cwnd, RTT and retransmissions of the stream
+                    info = tcp_info(client_socket) if tcpinfo else None
+                    # Print statistics for the current interval
+                    ntabs = tabs(total_sent_data, format)
+                    if parallel == 1 or tcpinfo:
+                        report.text(f"{client_ip}:{client_port}\t{interval_start_time - start_time:.1f} - {current_time - start_time:.1f}\t{total_sent_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps" + format_tcp_info(info, last_retransmits))
+                    report.record('interval', test_id=test_id, stream=f"{client_ip}:{client_port}", direction='up',
+                                  tcp_info=info, **rate_record(interval_start_time - start_time,
+                                                               current_time - start_time, interval_data))
+                    if info is not None:
+                        last_retransmits = info['retransmits']
+
+                # Reset the interval data and start time
+                interval_data = 0
+                interval_start_time = current_time
+
+            if current_time >= deadline:
+                break
+
+            sent = client_socket.send(data)
+            total_data += sent
+            interval_data += sent
+            if counters is not None:
+                counters[slot] = total_data
+
+    # Close the sending side and wait until the server has read everything and closes the stream
+    client_socket.shutdown(socket.SHUT_WR)
+    client_socket.recv(1)
+    client_socket.close()
+
+    # Calculate the total time elapsed
+    end_time = time.time()
+    time_elapsed = end_time - start_time
+
+    # Calculate the bandwidth
+    if time_elapsed == 0:
+        bandwidth = 0
+    else:
+        bandwidth = (total_data * 8) / (time_elapsed * 1000000)
+
+    # Format the total data to the specified format
+    total_sent_data = format_bytes(total_data, format)
+
+    # Print the summary of the results
+    ntabs = tabs(total_sent_data, format)
+    if parallel == 1 and num_bytes == 0 and file is None:
+        report.text("\n" + "-" * (61 + len(f"{bandwidth:.2f}")) + "\n")
+
+    result = f"{client_ip}:{client_port}\t{start_time - start_time:.1f} - {end_time - start_time:.1f}\t{total_sent_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps"
+    summary.append(result)
+    report.record('stream', test_id=test_id, stream=f"{client_ip}:{client_port}", direction='up',
+                  **rate_record(0, time_elapsed, total_data))
+
+
+
+def handle_client_receive(client_socket, server, port, format, interval, parallel, summary,
+                          length=default_length, start=None, counters=None, slot=0, tcpinfo=False, test_id=None):
+    '''
+    Description: This function handles a connection where the server sends and the client receives (-R and --bidir).
+    The stream ends when the server closes it at the deadline or after the number of bytes.
+    Parameters:
+        client_socket: client socket to connect to the server
+        server: IP address of the server
+        port: port number of the server
+        format: format of the summary of the results – it should be either in B, KB or MB, default=MB
+        interval: prints statistics per z second
+        parallel: number of parallel connections in this direction
+        summary: list of summary results for each connection
+        length: size of the receive buffer in bytes
+        start: event that is set when the server starts the test
+        counters: shared array where the bytes received so far are stored (with --procs)
+        slot: index of this stream in counters
+        tcpinfo: print TCP_INFO of this stream in every interval
+        test_id: ID of the test, for the JSON output
+    Returns:
+        None
+    '''
+    # Get the client ip and port
+    (client_ip, client_port) = client_socket.getsockname()
+
+    report.text("Client ip {}:{} connected with server {} port {}".format(
+        client_ip, client_port, server, port))
+
+    # Receive data from the server into one preallocated buffer
+    buffer = bytearray(length)
+
+    # Wait until every stream is connected
+    if start is not None:
+        start.wait()
+
+    total_data = interval_data = 0
+    start_time = interval_start_time = time.time()
+    last_retransmits = 0
+    while True:
+        n = client_socket.recv_into(buffer)
+        current_time = time.time()
+        total_data += n
+        interval_data += n
+        if counters is not None:
+            counters[slot] = total_data
+
+        # If the specified interval has elapsed or the stream is done, print the results
+        if current_time - interval_start_time >= interval or n == 0:
+            if (parallel == 1 or tcpinfo or report.mode != 'text') and interval_data:
+                bandwidth = (interval_data * 8) / ((current_time - interval_start_time) * 1000000)
+                received_data = format_bytes(interval_data, format)
+                info = tcp_info(client_socket) if tcpinfo else None
+                ntabs = tabs(received_data, format)
+                if parallel == 1 or tcpinfo:
+                    report.text(f"{client_ip}:{client_port}\t{interval_start_time - start_time:.1f} - {current_time - start_time:.1f}\t{received_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps" + format_tcp_info(info, last_retransmits))
+                report.record('interval', test_id=test_id, stream=f"{client_ip}:{client_port}", direction='down',
+                              tcp_info=info, **rate_record(interval_start_time - start_time,
+                                                           current_time - start_time, interval_data))
+                if info is not None:
+                    last_retransmits = info['retransmits']
+            interval_data = 0
+            interval_start_time = current_time
+
+        if n == 0:
+            break
+
+    end_time = time.time()
+    client_socket.close()
+
+    # Calculate the bandwidth
+    time_elapsed = end_time - start_time
+    if time_elapsed == 0:
+        bandwidth = 0
+    else:
+        bandwidth = (total_data * 8) / (time_elapsed * 1000000)
+
+    received_data = format_bytes(total_data, format)
+    ntabs = tabs(received_data, format)
+    if parallel == 1:
+        report.text("\n" + "-" * (61 + len(f"{bandwidth:.2f}")) + "\n")
+
+    summary.append(f"{client_ip}:{client_port}\t0.0 - {time_elapsed:.1f}\t{received_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps")
+    report.record('stream', test_id=test_id, stream=f"{client_ip}:{client_port}", direction='down',
+                  **rate_record(0, time_elapsed, total_data))
+
+
+###################################################
+###############  SOCKET TUNING ####################
+###################################################
+
+default_sweep_buffers = '32KB,64KB,128KB,256KB,512KB,1MB,2MB,4MB'
+default_sweep_time = 5  # seconds per configuration in --sweep
+
+
+def tune_socket(sock, tuning, strict=True):
+    '''
+    Description: This function applies the socket options of --sndbuf, --rcvbuf, --nodelay, --congestion and --mss.
+    On the client it is called before connect, so the receive buffer also sets the window scale of the connection.
+    Parameters:
+        sock: the TCP socket
+        tuning: dictionary with sndbuf, rcvbuf (bytes, 0: kernel default), nodelay (bool),
+                congestion (name or None) and mss (bytes, 0: default)
+        strict: exit with an error if an option can not be set (the server ignores options it can not set)
+    Returns:
+        None
+    '''
+    options = [('sndbuf', socket.SOL_SOCKET, socket.SO_SNDBUF, tuning.get('sndbuf')),
+               ('rcvbuf', socket.SOL_SOCKET, socket.SO_RCVBUF, tuning.get('rcvbuf')),
+               ('nodelay', socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 if tuning.get('nodelay') else 0),
+               ('mss', socket.IPPROTO_TCP, socket.TCP_MAXSEG, tuning.get('mss'))]
+    if tuning.get('congestion'):
+        options.append(('congestion', socket.IPPROTO_TCP, getattr(socket, 'TCP_CONGESTION', 13),
+                        tuning['congestion'].encode()))
+
+    for name, level, option, value in options:
+        if not value:
+            continue
+        try:
+            sock.setsockopt(level, option, value)
+        except (OSError, TypeError, ValueError, OverflowError) as e:
+            if strict:
+                print("Error: could not set {}: {}".format(name, e))
+                sys.exit(1)
+
+
+def socket_options(sock):
+    '''
+    Description: This function reads the socket options that are in effect (the kernel doubles the buffer sizes
+    and limits them to net.core.wmem_max/rmem_max)
+    Parameters:
+        sock: a connected TCP socket
+    Returns:
+        dictionary with sndbuf, rcvbuf, nodelay, congestion and mss
+    '''
+    options = {'sndbuf': sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+               'rcvbuf': sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+               'nodelay': bool(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)),
+               'mss': sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG),
+               'congestion': None}
+    try:
+        name = sock.getsockopt(socket.IPPROTO_TCP, getattr(socket, 'TCP_CONGESTION', 13), 16)
+        options['congestion'] = name.split(b'\0', 1)[0].decode()
+    except OSError:
+        pass
+    return options
+
+
+def congestion_algorithms():
+    '''
+    Description: This function returns the congestion control algorithms this user may select (Linux)
+    Parameters:
+        None
+    Returns:
+        list of names
+    '''
+    name = 'available' if os.geteuid() == 0 else 'allowed'
+    try:
+        with open('/proc/sys/net/ipv4/tcp_{}_congestion_control'.format(name)) as f:
+            return f.read().split()
+    except OSError:
+        return []
+
+
+def sweep(server, port, time_, format, interval, parallel, num_bytes, length, direction, procs, tuning,
+          buffers, algorithms):
+    '''
+    Description: This function runs one short test for every combination of buffer size and congestion control
+    algorithm and reports the throughput the server measured for each, and the best configuration.
+    Parameters:
+        server: IP address of the server
+        port: port number of the server
+        time_: duration of each test in seconds
+        format: format of the summary of the results
+        interval: interval of the tests
+        parallel: number of parallel connections
+        num_bytes: bytes per stream of each test (-n)
+        length: number of bytes per send/recv call
+        direction: 'up', 'down' or 'bidir'
+        procs: number of worker processes
+        tuning: the other socket options, used in every test
+        buffers: list of buffer sizes in bytes, used for both SO_SNDBUF and SO_RCVBUF
+        algorithms: list of congestion control algorithms
+    Returns:
+        None
+    '''
+    report.text("-" * 64)
+    report.text("A simpleperf sweep against server {}, port {}: {} configurations of {} s".format(
+        server, port, len(buffers) * len(algorithms), time_))
+    report.text("-" * 64 + "\n")
+    report.text("Buffer\t\tEffective\tCongestion\tThroughput\n")
+
+    mode = report.mode
+    results = []
+    for congestion in algorithms:
+        for size in buffers:
+            # Run the test quietly and keep only its records
+            saved = report.records
+            report.mode = 'quiet'
+            report.records = []
+            client(server, port, time_, format, interval, parallel, num_bytes, length, None, direction, procs,
+                   tuning=dict(tuning, sndbuf=size, rcvbuf=size, congestion=congestion))
+            records = report.records
+            report.mode = mode
+            report.records = saved
+
+            bits_per_second = sum(r['bits_per_second'] for r in records if r['type'] == 'server')
+            effective = next((r for r in records if r['type'] == 'options'), {})
+            results.append((bits_per_second, size, congestion))
+            # Buffer sizes are always shown in KB
+            effective_size = format_bytes(effective.get('sndbuf', 0), 'KB')
+            requested_size = format_bytes(size, 'KB')
+            report.text(f"{requested_size:.0f} KB{tabs(requested_size, 'KB')}{effective_size:.0f} KB"
+                        f"{tabs(effective_size, 'KB')}{congestion}\t\t{bits_per_second / 1000000:.2f} Mbps")
+            report.record('sweep', buffer=size, effective_sndbuf=effective.get('sndbuf'),
+                          effective_rcvbuf=effective.get('rcvbuf'), congestion=congestion,
+                          bits_per_second=bits_per_second)
+
+    bits_per_second, size, congestion = max(results)
+    report.text("\nBest: --sndbuf {0} --rcvbuf {0} --congestion {1}: {2:.2f} Mbps\n".format(
+        size, congestion, bits_per_second / 1000000))
+    report.dump(role='sweep', server=server, port=port,
+                best={'buffer': size, 'congestion': congestion, 'bits_per_second': bits_per_second})
+
+
+###################################################
+################  LATENCY MODE ####################
+###################################################
+
+class LatencyHistogram:
+    '''
+    Description: Log-bucketed histogram of latencies in nanoseconds. Values below 128 ns have their own
+    bucket, above that every power of two is split in 64 buckets, so a percentile is within 1/64 (1.6%)
+    of the exact value while the histogram stays small for any number of samples.
+    '''
+    sub_buckets = 64
+
+    def __init__(self):
+        self.counts = {}  # key: bucket, value: number of samples
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, ns):
+        ns = max(int(ns), 0)
+        exp = ns.bit_length() - 1
+        if exp < 7:
+            bucket = ns
+        else:
+            bucket = (exp - 6) * self.sub_buckets + (ns >> (exp - 6))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        self.min = ns if self.min is None else min(self.min, ns)
+        self.max = max(self.max, ns)
+
+    def value(self, bucket):
+        '''
+        Description: Returns the middle of a bucket in nanoseconds
+        '''
+        if bucket < 2 * self.sub_buckets:
+            return bucket
+        exp = bucket // self.sub_buckets + 5
+        mantissa = bucket % self.sub_buckets + self.sub_buckets
+        return ((2 * mantissa + 1) << (exp - 6)) / 2
+
+    def percentile(self, p):
+        '''
+        Description: Returns the p-th percentile (0-100) in nanoseconds
+        '''
+        if self.total == 0:
+            return 0
+        rank = max(1, math.ceil(p / 100 * self.total))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(self.value(bucket), self.min), self.max)
+        return self.max
+
+
+latency_percentiles = (50, 90, 99, 99.9)
+
+
+def handle_rr(stream, mask, sel, buffer, tests, format):
+    '''
+    Description: This function serves a request/response stream at the server side: for every complete
+    request of req_size bytes it queues a response of resp_size bytes and sends as much as the socket takes.
+    Parameters:
+        stream: the Stream that is ready
+        mask: the selector events that are ready
+        sel: the selector
+        buffer: the shared receive buffer
+        tests: dictionary of running tests
+        format: The format of the summary of results - it should be either in B, KB or MB
+    Returns:
+        None
+    '''
+    params = stream.test.params
+    if mask & selectors.EVENT_READ:
+        try:
+            n = stream.conn.recv_into(buffer)
+        except (BlockingIOError, InterruptedError):
+            n = None
+        except ConnectionError:
+            n = 0
+        if n == 0:
+            end_stream(stream, sel, tests, format)
+            return
+        if n:
+            stream.total_bytes += n
+            stream.pending += n
+            while stream.pending >= params['req_size']:
+                stream.pending -= params['req_size']
+                stream.transactions += 1
+                stream.outbuf += b"0" * params['resp_size']
+
+    if stream.outbuf:
+        try:
+            sent = stream.conn.send(stream.outbuf)
+            del stream.outbuf[:sent]
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            end_stream(stream, sel, tests, format)
+            return
+
+    # Wait for the socket to be writable only while a response is not sent completely
+    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if stream.outbuf else 0)
+    if sel.get_key(stream.conn).events != events:
+        sel.modify(stream.conn, events, stream)
+
+
+def handle_client_rr(client_socket, time_, req_size, resp_size, histogram, start, stop):
+    '''
+    Description: This function runs request/response transactions (like netperf TCP_RR) on one connection
+    until the deadline, or until the bulk streams are done, and records every round trip in the histogram.
+    Parameters:
+        client_socket: client socket to connect to the server
+        time_: the total duration in seconds
+        req_size: size of a request in bytes
+        resp_size: size of a response in bytes
+        histogram: LatencyHistogram for the round trip times
+        start: event that is set when the server starts the test
+        stop: event that is set when the bulk streams are done
+    Returns:
+        None
+    '''
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    request = b"0" * req_size
+    view = memoryview(bytearray(resp_size))
+
+    start.wait()
+    histogram.start_time = time.time()
+    deadline = histogram.start_time + time_
+    while time.time() < deadline and not stop.is_set():
+        send_time = time.perf_counter_ns()
+        client_socket.sendall(request)
+        received = 0
+        while received < resp_size:
+            n = client_socket.recv_into(view[received:])
+            if n == 0:
+                break
+            received += n
+        if received < resp_size:
+            break
+        histogram.record(time.perf_counter_ns() - send_time)
+    histogram.end_time = time.time()
+
+    # Close the sending side and wait until the server closes the stream
+    client_socket.shutdown(socket.SHUT_WR)
+    while client_socket.recv(resp_size or 1):
+        pass
+    client_socket.close()
+
+
+def print_latency(histogram, req_size, resp_size, test_id=None):
+    '''
+    Description: This function prints the transactions per second and the latency percentiles of a latency test
+    Parameters:
+        histogram: LatencyHistogram with the round trip times
+        req_size: size of a request in bytes
+        resp_size: size of a response in bytes
+        test_id: ID of the test, for the JSON output
+    Returns:
+        None
+    '''
+    time_elapsed = histogram.end_time - histogram.start_time
+    rate = histogram.total / time_elapsed if time_elapsed > 0 else 0
+    report.text("Latency (request {} B, response {} B): {} transactions, {:.1f} trans/s\n".format(
+        req_size, resp_size, histogram.total, rate))
+    report.text("min\t\t" + "".join("p{:g}\t\t".format(p) for p in latency_percentiles) + "max")
+    values = [histogram.min or 0] + [histogram.percentile(p) for p in latency_percentiles] + [histogram.max]
+    report.text("\t".join("{:.3f} ms".format(v / 1000000) for v in values))
+    report.text()
+    report.record('latency', test_id=test_id, req_size=req_size, resp_size=resp_size,
+                  transactions=histogram.total, transactions_per_second=rate,
+                  **{name + '_ms': v / 1000000 for name, v in
+                     zip(['min'] + ['p{:g}'.format(p) for p in latency_percentiles] + ['max'], values)})
+
+
+###################################################
+###################  UDP MODE #####################
+###################################################
+
+udp_header = struct.Struct('!QQ')  # sequence number, send time in nanoseconds
+udp_fin = 2 ** 64 - 1  # sequence number of the datagrams that end a stream
+
+
+def parse_bitrate(bitrate):
+    '''
+    Description: This function is used to convert a bitrate like 10M, 500K or 1G (bits per second) to a number
     Parameters:
-        data: data to be printed
-        format: format of the summary of the results
+        bitrate: bitrate as a string
     Returns:
-        tabs: tabs to be added to the output
+        bitrate in bits per second
     '''
-    if len(f"{data:.0f}" + format) < 7:
-        return "\t\t"
-    else:
-        return "\t"
+    units = {'K': 1000, 'M': 1000000, 'G': 1000000000}
+    if bitrate[-1] in units:
+        return float(bitrate[:-1]) * units[bitrate[-1]]
+    return float(bitrate)
 
-###################################################
-##################  SERVER SIDE ###################
-###################################################
 
+class UdpStream:
+    '''
+    Description: Statistics of one UDP stream at the server side: received bytes, loss from the
+    sequence numbers, datagrams received out of order and the RFC 3550 interarrival jitter
+    computed from the send timestamps.
+    '''
 
-def server(server, port, format):
+    def __init__(self, addr, now):
+        self.addr = addr
+        self.start_time = now
+        self.last_arrival = now
+        self.total_bytes = 0
+        self.received = 0
+        self.max_seq = -1
+        self.out_of_order = 0
+        self.jitter = 0.0
+        self.last_transit = None
+        # Values of the current interval
+        self.interval_start = now
+        self.interval_bytes = 0
+        self.interval_received = 0
+        self.interval_first_seq = 0
+
+    def update(self, seq, sent_ns, size, now):
+        self.last_arrival = now
+        self.total_bytes += size
+        self.interval_bytes += size
+        self.received += 1
+        self.interval_received += 1
+        if seq > self.max_seq:
+            self.max_seq = seq
+        else:
+            self.out_of_order += 1
+
+        # J(i) = J(i-1) + (|D(i-1,i)| - J(i-1)) / 16, the clock offset between the hosts cancels out
+        transit = now - sent_ns / 1e9
+        if self.last_transit is not None:
+            self.jitter += (abs(transit - self.last_transit) - self.jitter) / 16
+        self.last_transit = transit
+
+    def line(self, start, end, num_bytes, received, expected, format, type='interval'):
+        '''
+        Description: Formats one line of results
+        Parameters:
+            start: start of the interval (seconds since the start of the stream)
+            end: end of the interval
+            num_bytes: bytes received in the interval
+            received: datagrams received in the interval
+            expected: datagrams sent in the interval (from the sequence numbers)
+            format: format of the summary of the results
+            type: type of the JSON record ('interval' or 'stream')
+        Returns:
+            the line
+        '''
+        elapsed = end - start
+        rate = (num_bytes * 8) / elapsed / 1000000 if elapsed > 0 else 0
+        lost = max(expected - received, 0)
+        percent = 100 * lost / expected if expected else 0
+        received_data = format_bytes(num_bytes, format)
+        ntabs = tabs(received_data, format)
+        (ip, port) = self.addr
+        report.record(type, test_id=f"{ip}:{port}", stream=f"{ip}:{port}", direction='up', protocol='udp',
+                      jitter_ms=self.jitter * 1000, lost=lost, packets=expected, out_of_order=self.out_of_order,
+                      **rate_record(start, end, num_bytes))
+        return (f"{ip}:{port}\t{start:.1f} - {end:.1f}\t{received_data:.0f} {format}{ntabs}{rate:.2f} Mbps\t"
+                f"{self.jitter * 1000:.3f} ms\t{lost}/{expected} ({percent:.0f}%)")
+
+    def interval(self, now, format):
+        expected = self.max_seq + 1 - self.interval_first_seq
+        result = self.line(self.interval_start - self.start_time, now - self.start_time,
+                           self.interval_bytes, self.interval_received, expected, format)
+        self.interval_start = now
+        self.interval_bytes = 0
+        self.interval_received = 0
+        self.interval_first_seq = self.max_seq + 1
+        return result
+
+    def summary(self, format):
+        return self.line(0.0, self.last_arrival - self.start_time, self.total_bytes, self.received,
+                         self.max_seq + 1, format, 'stream')
+
+
+def udp_server(server, port, format, interval=default_interval, length=default_udp_length):
     '''
-    Description: This function creates a server socket and listens for incoming connections.
-    It then creates a thread for each client that connects to the server.
+    Description: This function creates a UDP server socket and receives datagrams from any number of
+    simpleperf UDP clients. Every interval it prints the throughput, jitter and loss of each stream.
     Parameters:
         server: The IP address of the server's interface where the client should connect
         port: The port number on which the server should listen
         format: The format of the summary of results - it should be either in B, KB or MB
+        interval: prints statistics per interval seconds
+        length: size of the receive buffer in bytes
     Returns:
         None
     '''
-    server_socket = socket.socket(
-        socket.AF_INET, socket.SOCK_STREAM)  # create a TCP socket
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # create a UDP socket
     try:
-        # bind the socket to the server and port
         server_socket.bind((server, port))
     except socket.error as e:
         print("Socket binding error: ", str(e))
         sys.exit()
 
-    server_socket.listen(5)  # listen for incoming connections
+    report.text("-" * 49)
+    report.text("A simpleperf server is listening on UDP port {}".format(port))
+    report.text("-" * 49 + "\n")
 
-    print("-" * 45)
-    print("A simpleperf server is listening on port {}".format(port))
-    print("-" * 45 + "\n")
+    buffer = bytearray(max(length, 65535))
+    streams = {}  # key: client address, value: UdpStream
+    server_socket.settimeout(interval / 4)
+
+    try:
+        while True:
+            try:
+                n, addr = server_socket.recvfrom_into(buffer)
+            except socket.timeout:
+                n, addr = 0, None
+            now = time.time()
+
+            if n >= udp_header.size:
+                seq, sent_ns = udp_header.unpack_from(buffer)
+                stream = streams.get(addr)
+                if seq == udp_fin:
+                    if stream is not None:
+                        report.text(stream.interval(now, format))
+                        report.text("\nID\t\tInterval\tReceived\tRate\t\tJitter\t\tLost/Total")
+                        report.text(stream.summary(format))
+                        if stream.out_of_order:
+                            report.text("{} datagrams received out-of-order".format(stream.out_of_order))
+                        report.text()
+                        report.dump("{}:{}".format(*addr), role='server', protocol='udp', client="{}:{}".format(*addr))
+                        del streams[addr]
+                    continue
+                if stream is None:
+                    stream = streams[addr] = UdpStream(addr, now)
+                    report.text("A simpleperf client with {}:{} is connected with {}:{}".format(
+                        addr[0], addr[1], server, port))
+                    report.text("\nID\t\tInterval\tReceived\tRate\t\tJitter\t\tLost/Total\n")
+                stream.update(seq, sent_ns, n, now)
+
+            for addr, stream in list(streams.items()):
+                if now - stream.interval_start >= interval:
+                    report.text(stream.interval(now, format))
+                if now - stream.last_arrival > 10:  # client is gone without sending FIN
+                    del streams[addr]
+
+    except KeyboardInterrupt:
+        report.text("\nServer shutting down...")
+        server_socket.close()
 
-    while True:
-        try:
-            parallel = 5  # maximum number of parallel connections is 5
-            threads = []
-            summary = []
-
-            i = 0
-            while i < parallel:
-                conn, addr = server_socket.accept()  # accept incoming connection
-                # receive the number of parallel connections from the client
-                parallel = int(conn.recv(1).decode('utf-8'))
-
-                print("A simpleperf client with {}:{} is connected with {}:{}".format(
-                    addr[0], addr[1], server, port))
-
-                t = threading.Thread(target=handle_server, args=(
-                    conn, addr, format, summary, i))  # create a thread for each client
-                threads.append(t)
-                t.start()
-
-                i += 1
-
-            # Wait for all threads to finish
-            for t in threads:
-                t.join()  #huske å fjerne
-
-            # Print the summary of each connection
-            print("\nID\t\tInterval\tReceived\tRate\n")
-            for i in range(parallel):
-                print(summary[i])
-            print()
-            threads.clear()
-            summary.clear()   
-            
-        except KeyboardInterrupt:
-            print("\nServer shutting down...")
-            server_socket.close()
-            break
-    
     sys.exit()
 
-def handle_server(conn, addr, format, summary, i):
+
+def udp_client(server, port, time_, format, interval, parallel, num_bytes, length, bitrate):
     '''
-    Description: This function handles the server side of the connection.
-    It receives data from the client and calculates the time elapsed, total bytes received,
-    and the rate at which traffic could be read in megabits per second (Mbps).
+    Description: This function creates the UDP streams of a simpleperf client.
     Parameters:
-        conn: The socket object for the connection
-        addr: The address of the client. It is a tuple of (ip
-        format: The format of the summary of results - it should be either in B, KB or MB
-        event: Event object used to synchronize threads
-        summary: list of summary results for each connection
-        i: index of the connection
+        server: IP address of the server
+        port: port number of the server
+        time_: the total duration in seconds
+        format: format of the summary of the results
+        interval: prints statistics per z second
+        parallel: number of parallel streams
+        num_bytes: number of bytes to send per stream (0: send for time_ seconds)
+        length: size of each datagram in bytes
+        bitrate: target bitrate of each stream in bits per second
     Returns:
         None
     '''
+    report.text("-" * 64)
+    report.text("A simpleperf client sending to UDP server {}, port {}".format(server, port))
+    report.text("-" * 64 + "\n")
 
-    # Receive data from client
-    total_bytes = 0
-    start_time = time.time()
+    test_id = os.urandom(8).hex()  # ties the records of the streams together in --json and --jsonl
+    threads = []
+    summary = []
+    for i in range(parallel):
+        client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client_socket.connect((server, port))
+        t = threading.Thread(target=handle_udp_client, args=(
+            client_socket, time_, format, interval, parallel, num_bytes, length, bitrate, summary, test_id))
+        threads.append(t)
+        t.start()
+
+    for t in threads:
+        t.join()
+
+    report.text("\nID\t\tInterval\tTransfer\tBandwidth\tDatagrams\n")
+    for result in summary:
+        report.text(result)
+    report.text()
+    report.dump(role='client', protocol='udp', test_id=test_id, server=server, port=port,
+                params={'streams': parallel, 'time': time_, 'bytes': parse_bytes(num_bytes), 'length': length,
+                        'bitrate': bitrate})
+
+
+def handle_udp_client(client_socket, time_, format, interval, parallel, num_bytes, length, bitrate, summary,
+                      test_id=None):
+    '''
+    Description: This function sends one UDP stream. The datagrams are paced by a token bucket so the
+    stream keeps the target bitrate, and every datagram carries a sequence number and its send time.
+    Parameters:
+        client_socket: connected UDP socket
+        time_: the total duration in seconds
+        format: format of the summary of the results
+        interval: prints statistics per z second
+        parallel: number of parallel streams
+        num_bytes: number of bytes to send (0: send for time_ seconds)
+        length: size of each datagram in bytes
+        bitrate: target bitrate in bits per second
+        summary: list of summary results for each stream
+        test_id: ID of the test in the records
+    Returns:
+        None
+    '''
+    (client_ip, client_port) = client_socket.getsockname()
+    num_bytes = parse_bytes(num_bytes)
+
+    buffer = bytearray(length)  # one datagram buffer for the whole stream
+    rate = bitrate / 8  # bytes per second
+    burst = max(length, rate * 0.005)  # the bucket holds at most 5 ms of data
+    tokens = length
+    seq = 0
+
+    def report_interval(now):
+        if parallel == 1:
+            bandwidth = (interval_data * 8) / ((now - interval_start_time) * 1000000)
+            sent_data = format_bytes(interval_data, format)
+            ntabs = tabs(sent_data, format)
+            report.text(f"{client_ip}:{client_port}\t{interval_start_time - start_time:.1f} - {now - start_time:.1f}\t{sent_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps")
+        report.record('interval', test_id=test_id, stream=f"{client_ip}:{client_port}", direction='up',
+                      protocol='udp', **rate_record(interval_start_time - start_time, now - start_time, interval_data))
+
+    # Intervals are printed with one stream, and recorded for every stream with --json and --jsonl
+    intervals = (parallel == 1 or report.mode != 'text') and not num_bytes
+    total_data = interval_data = 0
+    start_time = last = interval_start_time = time.time()
     while True:
-        data = conn.recv(1000)
-        if data.endswith(b"BYE"):
+        now = time.time()
+        if (num_bytes and total_data >= num_bytes) or (not num_bytes and now - start_time >= time_):
+            if intervals and interval_data:
+                report_interval(now)
             break
-        total_bytes += len(data)
-    end_time = time.time()
 
-    # Receive BYE message from client and send acknowledgement to client
-    conn.sendall("ACK: BYE".encode())
-    conn.close()
+        # Refill the bucket and wait until there are tokens for one datagram
+        tokens = min(burst, tokens + (now - last) * rate)
+        last = now
+        if tokens < length:
+            time.sleep((length - tokens) / rate)
+            continue
+        tokens -= length
 
-    # Calculate the time elapsed in seconds
-    time_elapsed = end_time - start_time
+        udp_header.pack_into(buffer, 0, seq, time.time_ns())
+        try:
+            client_socket.send(buffer)
+        except ConnectionRefusedError:
+            pass  # ICMP port unreachable from an earlier datagram, the server is not there (yet)
+        seq += 1
+        total_data += length
+        interval_data += length
+
+        if intervals and now - interval_start_time >= interval:
+            report_interval(now)
+            interval_data = 0
+            interval_start_time = now
 
-    # Calculate rate in Mbps
-    if time_elapsed == 0:
-        rate = 0
-    else:
-        rate = (total_bytes * 8) / time_elapsed / 1000000
+    end_time = time.time()
 
-    # Format total_bytes in the desired format
-    received = format_bytes(total_bytes, format)
+    # Tell the server that the stream is done (sent a few times in case one is lost)
+    udp_header.pack_into(buffer, 0, udp_fin, time.time_ns())
+    for _ in range(3):
+        try:
+            client_socket.send(buffer[:udp_header.size])
+        except ConnectionRefusedError:
+            pass
+        time.sleep(0.01)
+    client_socket.close()
 
-    # Print results
-    (ip_client, port) = addr
-    ntabs = tabs(received, format)
-    result = f"{ip_client}:{port}\t0.0 - {time_elapsed:.1f}\t{received:.0f} {format}{ntabs}{rate:.2f} Mbps"
-    summary.append(result)
+    time_elapsed = end_time - start_time
+    bandwidth = (total_data * 8) / (time_elapsed * 1000000) if time_elapsed > 0 else 0
+    sent_data = format_bytes(total_data, format)
+    ntabs = tabs(sent_data, format)
+    summary.append(f"{client_ip}:{client_port}\t0.0 - {time_elapsed:.1f}\t{sent_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps\t{seq}")
+    report.record('stream', test_id=test_id, stream=f"{client_ip}:{client_port}", direction='up', protocol='udp',
+                  packets=seq,
+                  **rate_record(0, time_elapsed, total_data))
 
 
 ###################################################
-##################  CLIENT SIDE ###################
+##################  DRTP MODE #####################
 ###################################################
 
-def client(server, port, time_, format, interval, parallel, num_bytes):
+# The DRTP socket of the second portfolio, in the folder next to this one
+drtp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'DATANETTVERK OG SKYTJENESTER 2')
+drtp_protocols = {'drtp-saw': 'saw', 'drtp-gbn': 'gbn', 'drtp-sr': 'sr'}
+default_drtp_length = 1460  # payload bytes per DRTP packet (PAYLOAD_SIZE in config.py of DRTP)
+default_drtp_window = 5  # packets in flight with gbn and sr (WINDOW in config.py of DRTP)
+default_drtp_timeout = 0.5  # retransmission timeout in seconds (TIMEOUT in config.py of DRTP)
+drtp_max_payload = 65507 - 12  # largest payload that fits in a UDP datagram next to the DRTP header
+drtp_max_bytes = 2 ** 32 - 2 ** 17  # sequence numbers are 32 bits, room is left for the last packet and FIN
+
+
+def load_drtp():
     '''
-    Description: This function creates a client socket and the parallel connections to the server.
+    Description: This function imports drtp.py from the DRTP folder
     Parameters:
-        server: IP address of the server
-        port: port number of the server
-        time_: the total duration in seconds for which data should be generated, also sent to the server (if it is set with -t flag at the client side) and must be > 0. If do not use -t flag, client runs for 25 seconds
-        format: format of the summary of the results – it should be either in B, KB or MB, default=MB
-        interval: prints statistics per z second
-        parallel: creates parallel connections to connect to the server and send data – it must be 1 and max value should be 5 – default: 1
-        num_bytes: transfer number of bytes specified by -n flag, it should be either in B, KB or MB. If -n flag is not specified, client will send data for 25 seconds
-    Returns:
         None
+    Returns:
+        the drtp module
     '''
+    if drtp_dir not in sys.path:
+        sys.path.append(drtp_dir)
+    try:
+        import drtp
+    except ImportError as e:
+        print("Error: DRTP is not available ({}), drtp.py is expected in {}".format(e, os.path.normpath(drtp_dir)))
+        sys.exit(1)
+    return drtp
 
-    threads = []
-    summary = []
-    # Create a thread for each connection
-    for i in range(parallel):
-        # Create a new socket for each connection for different ports
-        client_socket = socket.socket(
-            socket.AF_INET, socket.SOCK_STREAM)  # create a TCP socket
-        client_socket.settimeout(5)  # set a timeout of 5 seconds
 
-        try:
-            client_socket.connect((server, port))  # connect to the server
-            client_socket.send(str(parallel).encode())
+class GeneratedData:
+    '''
+    Description: Generated data for a DRTP transfer. The DRTP socket sends one bytes object, so this class
+    behaves like one (len() and slices) without holding the data: every slice is cut from one block of zeros.
+    With a deadline the length is cut to the data handed out so far once the deadline has passed, so the
+    transfer ends when the packets in flight are acknowledged.
+    '''
 
-        except socket.error as e:
-            print("Error connecting to server: ", e)
-            client_socket.close()
-            sys.exit(1)
+    def __init__(self, length, size, deadline=None):
+        self.length = length
+        self.block = bytes(size)
+        self.deadline = deadline
+        self.total_bytes = 0  # bytes handed to the socket (retransmissions are not counted)
 
-        # Print the main header
-        if i == 0:
-            print("-" * 64)
-            print("A simpleperf client connecting to server {}, port {}".format(
-                server, port))
-            print("-" * 64 + "\n")
+    def __len__(self):
+        if self.deadline is not None and time.time() >= self.deadline:
+            self.length = self.total_bytes
+            self.deadline = None
+        return self.length
 
-        # Create a thread for each connection
-        t = threading.Thread(target=handle_client, args=(
-            client_socket, server, port, time_, format, interval, parallel, num_bytes, summary))
-        threads.append(t)
-        t.start()
+    def __getitem__(self, index):
+        start, stop, _ = index.indices(self.length)
+        n = max(stop - start, 0)
+        self.total_bytes = max(self.total_bytes, start + n)
+        return self.block[:n] if n <= len(self.block) else bytes(n)
 
-    # Wait for all threads to finish
-    for t in threads:
-        t.join()
 
-    # Print the summary of each connection
-    if parallel > 1:
-        print("\nID\t\tInterval\tTransfer\tBandwidth\n")
+class ReceivedBytes(dict):
+    '''
+    Description: Receive buffer of a DRTP socket that counts the payload bytes instead of keeping them.
+    The sequence numbers are kept, so duplicates are still recognised and not counted twice.
+    '''
 
-    for i in range(parallel):
-        print(summary[i])
-    print()
+    def __init__(self):
+        super().__init__()
+        self.total_bytes = 0
 
+    def __setitem__(self, seq_num, payload):
+        if seq_num not in self:
+            self.total_bytes += len(payload)
+        super().__setitem__(seq_num, b'')
 
-def handle_client(client_socket, server, port, time_, format, interval, parallel, num_bytes, summary):
+
+class LastPacket(dict):
     '''
-    Description: This function handles the client side of the connection.
-    Parameters:
-        client_socket: client socket to connect to the server
-        server: IP address of the server
-        port: port number of the server
-        time_: the total duration in seconds for which data should be generated, also sent to the server (if it is set with -t flag at the client side) and must be > 0. If do not use -t flag, client runs for 25 seconds
-        format: format of the summary of the results – it should be either in B, KB or MB, default=MB
-        interval: prints statistics per z second
-        parallel: creates parallel connections to connect to the server and send data – it must be 1 and max value should be 5 – default: 1
-        num_bytes: transfer number of bytes specified by -n flag, it should be either in B, KB or MB. If -n flag is not specified, client will send data for 25 seconds
-        summary: list of summary results for each connection
-    Returns:
-        None
+    Description: Send buffer for stop and wait. Only the packet that waits for its ACK can be resent,
+    so older packets are dropped instead of keeping every packet of the transfer.
     '''
-    # Get the client ip and port
-    (client_ip, client_port) = client_socket.getsockname()
-
-    print("Client ip {}:{} connected with server {} port {}".format(
-        client_ip, client_port, server, port))
-
-    # Convert num_bytes to an integer
-    if num_bytes[-1] == "B" and num_bytes[-2] not in ["K", "M"]:
-        num_bytes = int(num_bytes[:-1])
-    elif num_bytes[-2:] == "KB":
-        num_bytes = int(num_bytes[:-2]) * 1000
-    elif num_bytes[-2:] == "MB":
-        num_bytes = int(num_bytes[:-2]) * 1000000
 
-    total_data = 0
-    start_time = time.time()
+    def __setitem__(self, seq_num, packet):
+        self.clear()
+        super().__setitem__(seq_num, packet)
 
-    # If -n flag is specified, send data for the specified number of bytes
-    if num_bytes != 0:
-        while total_data < num_bytes:
-            data = b"0" * 1000
-            client_socket.send(data)
-            total_data += len(data)
 
-    if parallel == 1:
-        print("\nID\t\tInterval\tTransfer\tBandwidth\n")
+def drtp_socket(drtp, payload_size, window):
+    '''
+    Description: This function creates a DRTP socket without simulated loss and with its log limited to warnings
+    Parameters:
+        drtp: the drtp module
+        payload_size: max payload bytes per packet
+        window: window size in packets
+    Returns:
+        the DRTPSocket
+    '''
+    from drtplog import WARNING
+    sock = drtp.DRTPSocket()
+    sock.config(payload_size, window, default_drtp_timeout, max_skips=0)
+    sock.log.set_level(WARNING)  # simpleperf prints its own connection lines
+    return sock
 
-    # If -n flag is not specified, send data for 25 seconds or the specified time and print the results in the specified interval
-    if num_bytes == 0:
-        interval_data = 0
-        interval_start_time = start_time
 
-        while interval_start_time - start_time < time_:
-            data = b"0" * 1000
-            client_socket.send(data)
-            total_data += len(data)
-            interval_data += len(data)
-            current_time = time.time()
+def drtp_receive(sock, protocol):
+    '''
+    Description: Thread of the DRTP server that receives one transfer
+    Parameters:
+        sock: connected DRTPSocket
+        protocol: 'saw', 'gbn' or 'sr'
+    Returns:
+        None
+    '''
+    try:
+        sock.recv(protocol)
+    except OSError:
+        pass  # the socket was closed because the client is gone
 
-            # If the specified interval has elapsed or the specified time has elapsed, print the results
-            if (current_time - interval_start_time >= interval or current_time - start_time >= time_):
 
-                if parallel == 1:
-                    # Calculate the bandwidth
-                    bandwidth = (interval_data * 8) / (interval * 1000000)
-                    # Format the total data to the specified format
-                    total_sent_data = format_bytes(interval_data, format)
-                    # Print statistics for the current interval
-                    ntabs = tabs(total_sent_data, format)
-                    print(f"{client_ip}:{client_port}\t{interval_start_time - start_time:.1f} - {current_time - start_time:.1f}\t{total_sent_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps")
+def monitor_drtp(thread, counter, start_time, interval, format, stream_id, direction, test_id=None, idle=None):
+    '''
+    Description: This function waits for the thread of a DRTP transfer and prints the bytes counted per interval
+    Parameters:
+        thread: the thread that runs the transfer
+        counter: object with the bytes of the transfer so far in total_bytes
+        start_time: start of the transfer
+        interval: prints statistics per z second
+        format: format of the summary of the results
+        stream_id: ID of the stream (ip:port)
+        direction: 'up' (sent by the client) or 'down'
+        test_id: test ID of the JSON records
+        idle: seconds without data after which the transfer is given up (None: wait for the thread)
+    Returns:
+        the end time of the transfer, None if it was given up
+    '''
+    interval_start = last_data = start_time
+    interval_bytes = 0
+    while True:
+        thread.join(max(interval_start + interval - time.time(), 0))
+        now = time.time()
+        if not thread.is_alive():
+            # The transfer often ends just after an interval, a last part shorter than half an interval is not printed
+            if now - interval_start < interval / 2:
+                return now
+        total_bytes = counter.total_bytes
+        if total_bytes > interval_bytes:
+            last_data = now
+        elif idle is not None and now - last_data > idle:
+            return None
+        num_bytes = total_bytes - interval_bytes
+        rate = (num_bytes * 8) / (now - interval_start) / 1000000
+        data = format_bytes(num_bytes, format)
+        ntabs = tabs(data, format)
+        report.text(f"{stream_id}\t{interval_start - start_time:.1f} - {now - start_time:.1f}\t{data:.0f} {format}{ntabs}{rate:.2f} Mbps")
+        report.record('interval', test_id=test_id, stream=stream_id, direction=direction, protocol='drtp',
+                      **rate_record(interval_start - start_time, now - start_time, num_bytes))
+        interval_start = now
+        interval_bytes = total_bytes
+        if not thread.is_alive():
+            return now
+
+
+def drtp_server(server, port, format, interval, protocol):
+    '''
+    Description: This function receives DRTP transfers from simpleperf clients, one after the other, and prints
+    the throughput per interval and of the whole transfer like the TCP server.
+    Parameters:
+        server: The IP address of the server's interface where the client should connect
+        port: The port number on which the server should listen
+        format: The format of the summary of results - it should be either in B, KB or MB
+        interval: prints statistics per interval seconds
+        protocol: 'drtp-saw', 'drtp-gbn' or 'drtp-sr'
+    Returns:
+        None
+    '''
+    drtp = load_drtp()
+    report.text("-" * 56)
+    report.text("A simpleperf server is listening on DRTP ({}) port {}".format(drtp_protocols[protocol], port))
+    report.text("-" * 56 + "\n")
 
-                # Reset the interval data and start time
-                interval_data = 0
-                interval_start_time = time.time()
+    try:
+        while True:
+            # The payload size of the server only limits what it can read, so any client length fits
+            sock = drtp_socket(drtp, drtp_max_payload, default_drtp_window)
+            try:
+                sock.bind((server, port))
+            except socket.error as e:
+                print("Socket binding error: ", str(e))
+                sys.exit()
+            sock.listen()
+
+            (ip, client_port) = sock.addr
+            stream_id = f"{ip}:{client_port}"
+            report.text("A simpleperf client with {} is connected with {}:{}".format(stream_id, server, port))
+            report.text("\nID\t\tInterval\tReceived\tRate\n")
+
+            received = ReceivedBytes()
+            sock.recv_buffer = received
+            thread = threading.Thread(target=drtp_receive, args=(sock, drtp_protocols[protocol]), daemon=True)
+            start_time = time.time()
+            thread.start()
+            end_time = monitor_drtp(thread, received, start_time, interval, format, stream_id, 'up', stream_id,
+                                    idle=10)
+            if end_time is None:
+                report.text("{} is gone without closing the connection\n".format(stream_id))
+                sock.sock.close()
+                thread.join()
+                report.dump(stream_id, role='server', protocol=protocol, client=stream_id)
+                continue
+
+            time_elapsed = end_time - start_time
+            rate = (received.total_bytes * 8) / time_elapsed / 1000000 if time_elapsed > 0 else 0
+            data = format_bytes(received.total_bytes, format)
+            ntabs = tabs(data, format)
+            report.text("\nID\t\tInterval\tReceived\tRate\n")
+            report.text(f"{stream_id}\t0.0 - {time_elapsed:.1f}\t{data:.0f} {format}{ntabs}{rate:.2f} Mbps")
+            report.text()
+            report.record('stream', test_id=stream_id, stream=stream_id, direction='up', protocol='drtp',
+                          **rate_record(0, time_elapsed, received.total_bytes))
+            report.dump(stream_id, role='server', protocol=protocol, client=stream_id)
+
+    except KeyboardInterrupt:
+        report.text("\nServer shutting down...")
 
-    # Send message to the server and wait for the acknowledgement message
-    client_socket.sendall(b"BYE")
-    client_socket.recv(1024)
-    client_socket.close()
+    sys.exit()
 
-    # Calculate the total time elapsed
-    end_time = time.time()
-    time_elapsed = end_time - start_time
 
-    # Calculate the bandwidth
-    if time_elapsed == 0:
-        bandwidth = 0
-    else:
-        bandwidth = (total_data * 8) / (time_elapsed * 1000000)
+def drtp_client(server, port, time_, format, interval, num_bytes, length, protocol, window):
+    '''
+    Description: This function sends generated data to a simpleperf DRTP server with stop and wait, Go-Back-N
+    or Selective Repeat of drtp.py and prints the throughput per interval and of the whole transfer.
+    The transfer is over when the server has acknowledged the last packet and the FIN.
+    Parameters:
+        server: IP address of the server
+        port: port number of the server
+        time_: the total duration in seconds
+        format: format of the summary of the results
+        interval: prints statistics per z second
+        num_bytes: number of bytes to send (0: send for time_ seconds)
+        length: payload bytes per DRTP packet
+        protocol: 'drtp-saw', 'drtp-gbn' or 'drtp-sr'
+        window: window size in packets (gbn and sr)
+    Returns:
+        None
+    '''
+    drtp = load_drtp()
+    num_bytes = parse_bytes(num_bytes)
+    sock = drtp_socket(drtp, length, window)
+    if not sock.connect((server, port)):
+        print("Error connecting to server: DRTP connection timed out")
+        sys.exit(1)
 
-    # Format the total data to the specified format
-    total_sent_data = format_bytes(total_data, format)
+    report.text("-" * 64)
+    report.text("A simpleperf client connecting to DRTP ({}) server {}, port {}".format(
+        drtp_protocols[protocol], server, port))
+    report.text("-" * 64 + "\n")
+    # The UDP socket of DRTP is not connected, the source address towards the server is found with a connected socket
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.connect((server, port))
+    client_ip = probe.getsockname()[0]
+    probe.close()
+    client_port = sock.sock.getsockname()[1]
+    stream_id = f"{client_ip}:{client_port}"
+    report.text("\nID\t\tInterval\tTransfer\tBandwidth\n")
 
-    # Print the summary of the results
-    ntabs = tabs(total_sent_data, format)
-    if parallel == 1 and num_bytes == 0:
-        print("\n" + "-" * (61 + len(f"{bandwidth:.2f}")) + "\n")
+    start_time = time.time()
+    data = GeneratedData(num_bytes or drtp_max_bytes, length, None if num_bytes else start_time + time_)
+    if protocol == 'drtp-saw':
+        sock.send_buffer = LastPacket()
+    send = {'drtp-saw': sock.stop_and_wait, 'drtp-gbn': sock.go_back_n, 'drtp-sr': sock.selective_repeat}[protocol]
+    thread = threading.Thread(target=send, args=(data,), daemon=True)
+    thread.start()
+    end_time = monitor_drtp(thread, data, start_time, interval, format, stream_id, 'up')
 
-    result = f"{client_ip}:{client_port}\t{start_time - start_time:.1f} - {end_time - start_time:.1f}\t{total_sent_data:.0f} {format}{ntabs}{bandwidth:.2f} Mbps"
-    summary.append(result)
+    time_elapsed = end_time - start_time
+    rate = (data.length * 8) / time_elapsed / 1000000 if time_elapsed > 0 else 0
+    sent = format_bytes(data.length, format)
+    ntabs = tabs(sent, format)
+    report.text("\nID\t\tInterval\tTransfer\tBandwidth\n")
+    report.text(f"{stream_id}\t0.0 - {time_elapsed:.1f}\t{sent:.0f} {format}{ntabs}{rate:.2f} Mbps")
+    report.text()
+    report.record('stream', stream=stream_id, direction='up', protocol='drtp',
+                  **rate_record(0, time_elapsed, data.length))
+    report.dump(role='client', protocol=protocol, server=server, port=port,
+                params={'time': time_, 'bytes': num_bytes, 'length': length, 'window': window})
 
 
 ###################################################
@@ -366,6 +2418,56 @@ def mode():
                         help='Number of parallel connections')
     parser.add_argument('-i', '--interval', default=default_interval,
                         help='Interval in seconds for which the results should be printed')
+    parser.add_argument('-l', '--length', default=None,
+                        help='Number of bytes per send/recv call or UDP datagram (B, KB or MB)')
+    parser.add_argument('-F', '--file', default=None,
+                        help='Send this file with sendfile instead of generated data')
+    parser.add_argument('-R', '--reverse', action='store_true',
+                        help='Reverse mode: the server sends and the client receives')
+    parser.add_argument('--bidir', action='store_true',
+                        help='Send in both directions at the same time on separate streams')
+    parser.add_argument('--procs', default=1,
+                        help='Number of worker processes the client streams are spread over')
+    parser.add_argument('--tcpinfo', action='store_true',
+                        help='Print cwnd, RTT, retransmits, pacing and delivery rate (TCP_INFO) of every stream per interval')
+    parser.add_argument('--latency', action='store_true',
+                        help='Measure request/response latency on one more connection, next to the bulk streams (-P 0: latency only)')
+    parser.add_argument('--req-size', default='1B',
+                        help='Size of a request in latency mode (B, KB or MB)')
+    parser.add_argument('--resp-size', default='1B',
+                        help='Size of a response in latency mode (B, KB or MB)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as one JSON document at the end (per test on the server)')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='Print one JSON record per line for every interval and stream as it happens')
+    parser.add_argument('--sndbuf', default=None,
+                        help='SO_SNDBUF of the data streams (B, KB or MB)')
+    parser.add_argument('--rcvbuf', default=None,
+                        help='SO_RCVBUF of the data streams (B, KB or MB)')
+    parser.add_argument('--nodelay', action='store_true',
+                        help='Set TCP_NODELAY on the data streams')
+    parser.add_argument('-C', '--congestion', default=None,
+                        help='TCP congestion control algorithm of the data streams (e.g. cubic, reno, bbr)')
+    parser.add_argument('-M', '--mss', default=None,
+                        help='TCP maximum segment size of the data streams in bytes')
+    parser.add_argument('--sweep', action='store_true',
+                        help='Run short tests over buffer sizes and congestion control algorithms and report the best')
+    parser.add_argument('--sweep-buffers', default=default_sweep_buffers,
+                        help='Buffer sizes of --sweep (comma separated, B, KB or MB)')
+    parser.add_argument('--sweep-cc', default=None,
+                        help='Congestion control algorithms of --sweep (comma separated), default: all that are allowed')
+    parser.add_argument('-u', '--udp', action='store_true',
+                        help='Use UDP instead of TCP')
+    parser.add_argument('-B', '--bitrate', default=None,
+                        help='Target bitrate of each UDP stream in bits per second (K, M or G), default 1M')
+    parser.add_argument('--jfi', action='store_true',
+                        help="Print Jain's fairness index of the concurrent streams every interval")
+    parser.add_argument('--jfi-threshold', default=default_jfi_threshold,
+                        help='Warn when the fairness index of an interval is below this value (0-1)')
+    parser.add_argument('--proto', default='tcp', choices=['tcp'] + list(drtp_protocols),
+                        help='Transport protocol: tcp or DRTP with stop and wait, Go-Back-N or Selective Repeat')
+    parser.add_argument('-w', '--window', default=default_drtp_window,
+                        help='Window size in packets of DRTP with Go-Back-N and Selective Repeat')
     
 
     args = parser.parse_args()  # parse the command line arguments
@@ -376,9 +2478,11 @@ def mode():
         print("Error: you must run either in server or client mode")
         sys.exit(1)
 
-    # If -s flag is specified, only allow the -b, -p and -f flags
+    # If -s flag is specified, only allow the -b, -p and -f flags (and -i with UDP)
     if args.server == True:
-        if args.serverip != default_server or args.time != default_time or args.num_bytes != default_num_bytes or args.num_conn != default_parallel or args.interval != default_interval:
+        if args.serverip != default_server or args.time != default_time or args.num_bytes != default_num_bytes or args.num_conn != default_parallel or (args.interval != default_interval and not (args.udp or args.proto != 'tcp' or args.json or args.jsonl or args.jfi)) or args.file is not None or args.bitrate is not None or args.reverse or args.bidir or args.procs != 1 or args.tcpinfo or args.latency or args.sweep \
+                or args.sndbuf is not None or args.rcvbuf is not None or args.nodelay \
+                or args.congestion is not None or args.mss is not None or args.window != default_drtp_window:
             print("Error: invalid flags for server mode")
             sys.exit(1)
         
@@ -439,8 +2543,8 @@ def mode():
         print("Error: number of parallel connections must be an integer")
         sys.exit(1)
 
-    if args.num_conn < 1 or args.num_conn > 5:
-        print("Error: number of parallel connections must be between 1 and 5")
+    if args.num_conn < 1 and not (args.num_conn == 0 and args.latency):
+        print("Error: number of parallel connections must be at least 1 (0 is allowed with --latency)")
         sys.exit(1)
 
     try:
@@ -453,12 +2557,184 @@ def mode():
         print("Error: interval must be greater than 0")
         sys.exit(1)
 
+    if args.length is None:
+        args.length = str(default_udp_length if args.udp else default_drtp_length if args.proto != 'tcp'
+                          else default_length)
+    if re.match(r'^\d+$', args.length) is None and re.match(pattern_bytes, args.length) is None:
+        print("Error: invalid length")
+        sys.exit(1)
+
+    args.length = parse_bytes(args.length)
+    if args.length <= 0:
+        print("Error: length must be greater than 0")
+        sys.exit(1)
+
+    try:
+        args.procs = int(args.procs)
+    except ValueError:
+        print("Error: number of processes must be an integer")
+        sys.exit(1)
+
+    if args.procs < 1:
+        print("Error: number of processes must be at least 1")
+        sys.exit(1)
+
+    if args.procs > 1 and args.udp:
+        print("Error: --procs can not be used with UDP")
+        sys.exit(1)
+
+    if args.latency and args.udp:
+        print("Error: --latency can not be used with UDP")
+        sys.exit(1)
+
+    for size in ('req_size', 'resp_size'):
+        value = getattr(args, size)
+        if re.match(r'^\d+$', value) is None and re.match(pattern_bytes, value) is None or parse_bytes(value) <= 0:
+            print("Error: invalid {}".format(size.replace('_', ' ')))
+            sys.exit(1)
+        setattr(args, size, parse_bytes(value))
+
+    if args.tcpinfo and (args.udp or not hasattr(socket, 'TCP_INFO')):
+        print("Error: --tcpinfo needs TCP on Linux")
+        sys.exit(1)
+
+    tuning = {'nodelay': args.nodelay, 'congestion': args.congestion}
+    for name in ('sndbuf', 'rcvbuf', 'mss'):
+        value = getattr(args, name)
+        if value is None:
+            tuning[name] = 0
+        elif (re.match(r'^\d+$', value) or re.match(pattern_bytes, value)) and parse_bytes(value) > 0:
+            tuning[name] = parse_bytes(value)
+        else:
+            print("Error: invalid {}".format(name))
+            sys.exit(1)
+
+    if (args.congestion or args.sweep) and args.congestion not in [None] + congestion_algorithms():
+        print("Error: congestion control algorithm {} is not available".format(args.congestion))
+        sys.exit(1)
+
+    if args.sweep:
+        try:
+            args.sweep_buffers = [parse_bytes(size) for size in args.sweep_buffers.split(',')]
+        except ValueError:
+            print("Error: invalid sweep buffers")
+            sys.exit(1)
+        args.sweep_cc = args.sweep_cc.split(',') if args.sweep_cc else congestion_algorithms() or [None]
+        unknown = [name for name in args.sweep_cc if name is not None and name not in congestion_algorithms()]
+        if unknown:
+            print("Error: congestion control algorithm {} is not available".format(','.join(unknown)))
+            sys.exit(1)
+        if args.udp or args.file is not None or args.latency:
+            print("Error: --sweep can not be used with UDP, -F or --latency")
+            sys.exit(1)
+        if args.time == default_time:
+            args.time = default_sweep_time
+
+    if (any(tuning.values())) and args.udp:
+        print("Error: socket options can only be used with TCP")
+        sys.exit(1)
+
+    if args.proto != 'tcp':
+        if args.udp or args.file is not None or args.reverse or args.bidir or args.procs > 1 or args.latency \
+                or args.tcpinfo or args.sweep or any(tuning.values()) or args.num_conn != 1:
+            print("Error: DRTP can not be used with -u, -F, -R, --bidir, --procs, --latency, --tcpinfo, "
+                  "--sweep, socket options or more than one connection")
+            sys.exit(1)
+        if args.length > drtp_max_payload:
+            print("Error: DRTP payload length must be at most {}".format(drtp_max_payload))
+            sys.exit(1)
+        if parse_bytes(args.num_bytes) > drtp_max_bytes:
+            print("Error: DRTP can send at most {} bytes".format(drtp_max_bytes))
+            sys.exit(1)
+    try:
+        args.window = int(args.window)
+    except ValueError:
+        print("Error: window must be an integer")
+        sys.exit(1)
+
+    if args.window < 1:
+        print("Error: window must be at least 1")
+        sys.exit(1)
+
+    if args.window != default_drtp_window and args.proto == 'tcp':
+        print("Error: window can only be used with DRTP")
+        sys.exit(1)
+
+    try:
+        args.jfi_threshold = float(args.jfi_threshold)
+    except ValueError:
+        print("Error: JFI threshold must be a number")
+        sys.exit(1)
+
+    if not 0 <= args.jfi_threshold <= 1:
+        print("Error: JFI threshold must be between 0 and 1")
+        sys.exit(1)
+
+    if args.jfi and (args.udp or args.proto != 'tcp' or args.sweep):
+        print("Error: --jfi can only be used with TCP and not with --sweep")
+        sys.exit(1)
+    fairness = args.jfi_threshold if args.jfi else None
+
+    if args.json and args.jsonl:
+        print("Error: --json and --jsonl can not be used together")
+        sys.exit(1)
+    report.mode = 'json' if args.json else 'jsonl' if args.jsonl else 'text'
+
+    if args.reverse and args.bidir:
+        print("Error: -R and --bidir can not be used together")
+        sys.exit(1)
+
+    if (args.reverse or args.bidir) and (args.udp or args.file is not None):
+        print("Error: -R and --bidir can not be used with UDP or -F")
+        sys.exit(1)
+
+    if args.udp:
+        if args.file is not None:
+            print("Error: -F can not be used with UDP")
+            sys.exit(1)
+        if args.length < udp_header.size or args.length > 65507:
+            print("Error: UDP datagram length must be between {} and 65507".format(udp_header.size))
+            sys.exit(1)
+    elif args.bitrate is not None:
+        print("Error: bitrate can only be used with UDP")
+        sys.exit(1)
+
+    try:
+        args.bitrate = parse_bitrate(args.bitrate or default_bitrate)
+    except ValueError:
+        print("Error: invalid bitrate")
+        sys.exit(1)
+
+    if args.bitrate <= 0:
+        print("Error: bitrate must be greater than 0")
+        sys.exit(1)
+
+    if args.file is not None and not os.path.isfile(args.file):
+        print("Error: file does not exist")
+        sys.exit(1)
+
     # Call the server or client function based on the command line arguments
-    if args.server:
-        server(args.bind, args.port, args.format)
+    if args.server and args.proto != 'tcp':
+        drtp_server(args.bind, args.port, args.format, args.interval, args.proto)
+    elif args.server and args.udp:
+        udp_server(args.bind, args.port, args.format, args.interval, args.length)
+    elif args.server:
+        server(args.bind, args.port, args.format, args.length, args.interval, fairness)
+    elif args.client and args.proto != 'tcp':
+        drtp_client(args.serverip, args.port, args.time, args.format, args.interval, args.num_bytes, args.length,
+                    args.proto, args.window)
+    elif args.client and args.udp:
+        udp_client(args.serverip, args.port, args.time, args.format, args.interval,
+                   args.num_conn, args.num_bytes, args.length, args.bitrate)
+    elif args.client and args.sweep:
+        sweep(args.serverip, args.port, args.time, args.format, args.interval, args.num_conn, args.num_bytes,
+              args.length, 'bidir' if args.bidir else 'down' if args.reverse else 'up', args.procs, tuning,
+              args.sweep_buffers, args.sweep_cc)
     elif args.client:
         client(args.serverip, args.port, args.time, args.format,
-               args.interval, args.num_conn, args.num_bytes)
+               args.interval, args.num_conn, args.num_bytes, args.length, args.file,
+               'bidir' if args.bidir else 'down' if args.reverse else 'up', args.procs, args.tcpinfo,
+               args.latency, args.req_size, args.resp_size, tuning, fairness)
     else:
         sys.exit(1)
 
@@ -0,0 +1,422 @@
+'''
+
+DATA 2410: builds a Mininet network from a topology description (JSON or YAML) instead of
+hand-written addHost/addLink/ip route calls, e.g. portfolio-topology.json:
+
+    {
+        "name": "PortfolioNetwork2410",
+        "hosts": ["h1", ...],
+        "routers": ["r1", ...],
+        "switches": ["s1", ...],
+        "links": [
+            {"a": "h1", "b": "s1", "ip_a": "10.0.0.2/24"},
+            {"name": "L1", "a": "r1", "b": "r2", "ip_a": "10.0.1.1/24", "ip_b": "10.0.1.2/24",
+             "bw": 40, "delay": "10ms", "queue": 67},
+            ...
+        ]
+    }
+
+Interfaces are named like Mininet does (node-eth0, node-eth1, ... in link order). Hosts get a
+default route via the router on their subnet, and the static routes of the routers are worked
+out from the graph (shortest path). All commands for a node are sent in one batch, including the
+tc commands that shape its links (the same htb + netem setup as TCLink).
+
+    $ python3 topology.py portfolio-topology.json --dry-run
+    $ sudo python3 topology.py portfolio-topology.json
+
+'''
+
+import argparse
+import collections
+import ipaddress
+import json
+import sys
+
+offload_features = ['tso', 'gso', 'lro', 'gro', 'ufo']
+
+
+def load_topology(path):
+    '''
+    Description: Loads a topology description (JSON, or YAML if PyYAML is installed) with hosts,
+    routers, switches and links. Links may have a name, bw (Mbit/s), delay and queue (packets),
+    like the TCLink parameters, and ip_a/ip_b for the interfaces at each end.
+    Parameters:
+        path: path to the description
+    Returns:
+        the topology as a dictionary
+    '''
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError('PyYAML is needed to read {}'.format(path))
+            topo = yaml.safe_load(f)
+        else:
+            topo = json.load(f)
+
+    for key in ('hosts', 'routers', 'switches'):
+        topo.setdefault(key, [])
+    nodes = set(topo['hosts']) | set(topo['routers']) | set(topo['switches'])
+    if len(nodes) != len(topo['hosts']) + len(topo['routers']) + len(topo['switches']):
+        raise ValueError('node names must be unique')
+    for link in topo['links']:
+        for end in ('a', 'b'):
+            if link[end] not in nodes:
+                raise ValueError('unknown node in link: {}'.format(link[end]))
+            if link.get('ip_' + end):
+                ipaddress.ip_interface(link['ip_' + end])  # raises ValueError if invalid
+    return topo
+
+
+def interface_names(topo):
+    '''
+    Description: Names the interfaces at both ends of every link the way Mininet does:
+    node-ethN, where N counts the links of the node (switch ports start at 1).
+    Parameters:
+        topo: topology dictionary
+    Returns:
+        list of (name of interface a, name of interface b), one per link
+    '''
+    switches = set(topo['switches'])
+    count = collections.Counter()
+    names = []
+    for link in topo['links']:
+        pair = []
+        for end in ('a', 'b'):
+            node = link[end]
+            default = '{}-eth{}'.format(node, count[node] + (1 if node in switches else 0))
+            count[node] += 1
+            pair.append(link.get('intf_' + end, default))
+        names.append(tuple(pair))
+    return names
+
+
+def segments(topo, names):
+    '''
+    Description: Finds the layer 2 segments: interfaces that are connected directly or through switches.
+    Parameters:
+        topo: topology dictionary
+        names: interface names from interface_names()
+    Returns:
+        list of segments, each a dictionary with the subnet and the (node, interface, ip) in it
+    '''
+    switches = set(topo['switches'])
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    # Every link end is an interface; a switch joins all of its links into one segment
+    for i, link in enumerate(topo['links']):
+        for end in ('a', 'b'):
+            if link[end] in switches:
+                parent[find(('link', i))] = find(('switch', link[end]))
+
+    groups = collections.defaultdict(list)
+    for i, link in enumerate(topo['links']):
+        for j, end in enumerate(('a', 'b')):
+            if link[end] not in switches:
+                groups[find(('link', i))].append((link[end], names[i][j], link.get('ip_' + end)))
+
+    result = []
+    for members in groups.values():
+        subnets = {ipaddress.ip_interface(ip).network for node, intf, ip in members if ip}
+        if len(subnets) > 1:
+            raise ValueError('segment with more than one subnet: {}'.format(sorted(map(str, subnets))))
+        result.append({'subnet': subnets.pop() if subnets else None, 'members': members})
+    return result
+
+
+def compute_routes(topo, segs):
+    '''
+    Description: Works out the default route of every host and the static routes of every router.
+    A router gets a route to every subnet it is not on, via the next router on the shortest path.
+    Parameters:
+        topo: topology dictionary
+        segs: segments from segments()
+    Returns:
+        dictionary, key: node, value: list of (destination, gateway ip, interface)
+    '''
+    routers = set(topo['routers'])
+    hosts = set(topo['hosts'])
+    routes = collections.defaultdict(list)
+
+    # Router graph: two routers are neighbours if they share a segment
+    neighbours = collections.defaultdict(list)  # router: list of (neighbour, neighbour ip, own interface)
+    subnets = collections.defaultdict(list)  # router: subnets it is on
+    for seg in segs:
+        members = [m for m in seg['members'] if m[0] in routers and m[2]]
+        for node, intf, ip in members:
+            subnets[node].append(seg['subnet'])
+            for other, other_intf, other_ip in members:
+                if other != node:
+                    neighbours[node].append((other, str(ipaddress.ip_interface(other_ip).ip), intf))
+
+    for router in sorted(routers):
+        # Breadth-first search, remembering the first hop used to reach every router
+        first_hop = {router: None}
+        todo = collections.deque([router])
+        while todo:
+            node = todo.popleft()
+            for other, via, intf in neighbours[node]:
+                if other not in first_hop:
+                    first_hop[other] = first_hop[node] or (via, intf)
+                    todo.append(other)
+        # first_hop is filled in breadth-first order, so the closest router on a subnet comes first
+        known = set(subnets[router])
+        for other, hop in first_hop.items():
+            for subnet in subnets[other]:
+                if subnet not in known:
+                    known.add(subnet)
+                    routes[router].append((str(subnet), hop[0], hop[1]))
+
+    for seg in segs:
+        gateways = [m for m in seg['members'] if m[0] in routers and m[2]]
+        for node, intf, ip in seg['members']:
+            if node in hosts and gateways:
+                routes[node].append(('default', str(ipaddress.ip_interface(gateways[0][2]).ip), intf))
+    return routes
+
+
+def shaping_commands(intf, bw, delay, queue):
+    '''
+    Description: The tc commands TCLink runs for a shaped interface (use_htb=True): an htb class
+    with the rate and a netem qdisc under it with the delay and the queue size.
+    Parameters:
+        intf: interface name
+        bw: rate in Mbit/s
+        delay: delay (e.g. '10ms') or None
+        queue: queue size in packets or None
+    Returns:
+        list of tc batch lines
+    '''
+    lines = ['qdisc add dev {} root handle 5:0 htb default 1'.format(intf),
+             'class add dev {} parent 5:0 classid 5:1 htb rate {}Mbit burst 15k'.format(intf, bw)]
+    netem = ''
+    if delay:
+        netem += ' delay {}'.format(delay)
+    if queue:
+        netem += ' limit {}'.format(int(queue))
+    if netem:
+        lines.append('qdisc add dev {} parent 5:1 handle 10: netem{}'.format(intf, netem))
+    return lines
+
+
+def build_plan(topo, offload=False):
+    '''
+    Description: Builds the full plan of a network: nodes, links with interface names and IPs,
+    and the batched commands for every node.
+    Parameters:
+        topo: topology dictionary
+        offload: keep TSO/GSO/LRO/GRO/UFO on (by default they are turned off like in portfolio-topology.py)
+    Returns:
+        dictionary with nodes, links, routes and commands
+    '''
+    names = interface_names(topo)
+    segs = segments(topo, names)
+    routes = compute_routes(topo, segs)
+    switches = set(topo['switches'])
+
+    links = []
+    for link, (intf_a, intf_b) in zip(topo['links'], names):
+        links.append({
+            'name': link.get('name'),
+            'a': link['a'], 'b': link['b'],
+            'intf_a': intf_a, 'intf_b': intf_b,
+            'ip_a': link.get('ip_a'), 'ip_b': link.get('ip_b'),
+            'bw': link.get('bw'), 'delay': link.get('delay'), 'queue': link.get('queue'),
+        })
+
+    commands = collections.defaultdict(list)
+    for node in topo['routers']:
+        lines = ['route add {} via {} dev {}'.format(dst, via, intf) for dst, via, intf in routes[node]]
+        if lines:
+            commands[node].append('printf "%s\\n" {} | ip -batch -'.format(
+                ' '.join("'{}'".format(line) for line in lines)))
+
+    # Shaping of both ends of a link, as one tc -batch per node instead of one tc call per command
+    tc = collections.defaultdict(list)
+    for link in links:
+        if not link['bw']:
+            continue
+        for end in ('a', 'b'):
+            if link[end] not in switches:
+                tc[link[end]].extend(shaping_commands(link['intf_' + end], link['bw'], link['delay'], link['queue']))
+    for node, lines in tc.items():
+        commands[node].append('printf "%s\\n" {} | tc -batch -'.format(
+            ' '.join("'{}'".format(line) for line in lines)))
+
+    if not offload:
+        # Offloads off on every host interface and on both ends of shaped links, like portfolio-topology.py
+        features = ' '.join('{} off'.format(f) for f in offload_features)
+        for link in links:
+            for end in ('a', 'b'):
+                node = link[end]
+                if node in switches or not (node in topo['hosts'] or link['bw']):
+                    continue
+                commands[node].append('ethtool -K {} {} 2>/dev/null'.format(link['intf_' + end], features))
+
+    return {
+        'name': topo.get('name', 'topology'),
+        'hosts': topo['hosts'], 'routers': topo['routers'], 'switches': topo['switches'],
+        'links': links,
+        'routes': dict(routes),
+        # One shell call per node: Mininet's node.cmd() is a round trip through a pty
+        'commands': {node: '; '.join(cmds) for node, cmds in commands.items()},
+    }
+
+
+###################################################
+#################### BACKENDS #####################
+###################################################
+
+def dry_run(plan):
+    '''
+    Description: Prints the plan without creating anything (no root needed).
+    Parameters:
+        plan: plan from build_plan()
+    Returns:
+        None
+    '''
+    print("-" * 64)
+    print("Topology {}: {} hosts, {} routers, {} switches, {} links".format(
+        plan['name'], len(plan['hosts']), len(plan['routers']), len(plan['switches']), len(plan['links'])))
+    print("-" * 64 + "\n")
+
+    print("Links:")
+    for link in plan['links']:
+        ends = ['{} ({})'.format(link['intf_' + end], link['ip_' + end] or '-') for end in ('a', 'b')]
+        shaping = ''
+        if link['bw']:
+            shaping = ' bw={} delay={} queue={}'.format(link['bw'], link['delay'], link['queue'])
+        name = '{}: '.format(link['name']) if link['name'] else ''
+        print("  {}{} <-> {}{}".format(name, ends[0], ends[1], shaping))
+
+    print("\nRoutes:")
+    for node in plan['hosts'] + plan['routers']:
+        for dst, via, intf in plan['routes'].get(node, []):
+            print("  {}: ip route add {} via {} dev {}".format(node, dst, via, intf))
+
+    print("\nCommands (one batch per node):")
+    for node, command in plan['commands'].items():
+        print("  {}: {}".format(node, command))
+    print()
+
+
+def run_mininet(plan, cli=True, pingall=False, func=None):
+    '''
+    Description: Creates the network in Mininet, runs the batched commands and opens the CLI.
+    Every link is a plain Link; shaped links get their tc setup from the batched commands of the node,
+    so no tc command is run per link.
+    Parameters:
+        plan: plan from build_plan()
+        cli: open the Mininet CLI
+        pingall: run pingAll() after the start
+        func: function called with the started network (e.g. to run tests), before the CLI
+    Returns:
+        the return value of func (None without func)
+    '''
+    from mininet.topo import Topo
+    from mininet.net import Mininet
+    from mininet.node import Node
+    from mininet.cli import CLI
+    from mininet.link import Link
+
+    class LinuxRouter(Node):
+        """A Node with IP forwarding enabled."""
+
+        def config(self, **params):
+            super(LinuxRouter, self).config(**params)
+            self.cmd('sysctl net.ipv4.ip_forward=1')
+
+        def terminate(self):
+            self.cmd('sysctl net.ipv4.ip_forward=0')
+            super(LinuxRouter, self).terminate()
+
+    class PlannedTopo(Topo):
+
+        def build(self, **_opts):
+            for host in plan['hosts']:
+                default = [via for dst, via, intf in plan['routes'].get(host, []) if dst == 'default']
+                self.addHost(host, ip=None, defaultRoute='via ' + default[0] if default else None)
+            for router in plan['routers']:
+                self.addNode(router, cls=LinuxRouter, ip=None)
+            for switch in plan['switches']:
+                self.addSwitch(switch)
+            for link in plan['links']:
+                params = {'intfName1': link['intf_a'], 'intfName2': link['intf_b']}
+                if link['ip_a']:
+                    params['params1'] = {'ip': link['ip_a']}
+                if link['ip_b']:
+                    params['params2'] = {'ip': link['ip_b']}
+                self.addLink(link['a'], link['b'], cls=Link, **params)
+
+    net = Mininet(topo=PlannedTopo(), link=Link, waitConnected=False)
+    net.start()
+    for node, command in plan['commands'].items():
+        net[node].cmd(command)
+
+    result = None
+    try:
+        if pingall:
+            net.pingAll()
+        if func is not None:
+            result = func(net)
+        if cli:
+            CLI(net)
+    finally:
+        net.stop()
+    return result
+
+
+###################################################
+################ PARSE ARGUMENTS ##################
+###################################################
+
+def main():
+    '''
+    Description: This function parses the command line arguments and builds the network.
+    Parameters:
+        None
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(
+        description="Builds a Mininet network from a topology description (JSON or YAML)")
+    parser.add_argument('topology',
+                        help='Topology description')
+    parser.add_argument('-d', '--dry-run', action='store_true',
+                        help='Print the plan instead of creating the network (no root needed)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the plan as JSON (with --dry-run)')
+    parser.add_argument('--offload', action='store_true',
+                        help='Keep TSO/GSO/LRO/GRO/UFO on')
+    parser.add_argument('--pingall', action='store_true',
+                        help='Run pingAll after the network is started')
+    parser.add_argument('--no-cli', action='store_true',
+                        help='Do not open the Mininet CLI')
+
+    args = parser.parse_args()
+
+    try:
+        topo = load_topology(args.topology)
+        plan = build_plan(topo, args.offload)
+    except (OSError, ValueError, KeyError) as e:
+        print("Error: invalid topology:", e)
+        sys.exit(1)
+
+    if args.dry_run:
+        if args.json:
+            print(json.dumps(plan, indent=4))
+        else:
+            dry_run(plan)
+    else:
+        run_mininet(plan, cli=not args.no_cli, pingall=args.pingall)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import argparse
+import collections
+import itertools
+import math
+import multiprocessing
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # the pure Python versions are used
+
+# Global variables
+default_column = 0  # the number is in the first column, like tre.txt and fire.txt
+default_chunk = 65536  # lines parsed at a time when a file is read
+
+
+def jains(values):
+    '''
+    Description: Jain's fairness index (sum x)^2 / (n * sum x^2) of a list or array of rates.
+    It is 1 when every rate is the same and 1/n when one flow gets everything.
+    With NumPy the sums are computed over the whole array at once.
+    Parameters:
+        values: the rates
+    Returns:
+        the fairness index (1 if there are no values or they are all 0)
+    '''
+    if np is not None:
+        a = np.asarray(values, dtype=np.float64)
+        squares = float(np.dot(a, a))
+        return float(a.sum()) ** 2 / (a.size * squares) if a.size and squares else 1.0
+    stream = JainsStream()
+    stream.extend(values)
+    return stream.value()
+
+
+class JainsStream:
+    '''
+    Description: Jain's fairness index computed in one pass. Only the number of values, their sum and the
+    sum of their squares are kept, so any number of values fits in constant memory, and streams of
+    different parts of the data can be merged.
+    Methods:
+        add(): adds one value
+        extend(): adds many values (a NumPy array is added at once)
+        merge(): adds the values of another stream
+        value(): the fairness index of the values so far
+    '''
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0
+        self.squares = 0
+
+    def add(self, x):
+        self.n += 1
+        self.total += x
+        self.squares += x * x
+
+    def extend(self, values):
+        if np is not None and isinstance(values, np.ndarray):
+            a = values.astype(np.float64, copy=False)
+            self.n += a.size
+            self.total += float(a.sum())
+            self.squares += float(np.dot(a, a))
+            return
+        for x in values:
+            self.n += 1
+            self.total += x
+            self.squares += x * x
+
+    def merge(self, other):
+        self.n += other.n
+        self.total += other.total
+        self.squares += other.squares
+        return self
+
+    def value(self):
+        if not self.n or not self.squares:
+            return 1.0
+        return self.total ** 2 / (self.n * self.squares)
+
+
+def iter_rolling_jains(values, window):
+    '''
+    Description: Yields the fairness index of every window of consecutive values, from any iterable.
+    The sums are updated with the value that enters and the value that leaves the window.
+    Parameters:
+        values: iterable of rates
+        window: number of values in a window
+    Returns:
+        generator of fairness indexes, the first one when the first window is full
+    '''
+    last = collections.deque()
+    total = squares = 0
+    for x in values:
+        last.append(x)
+        total += x
+        squares += x * x
+        if len(last) > window:
+            old = last.popleft()
+            total -= old
+            squares -= old * old
+        if len(last) == window:
+            # squares can be a tiny bit below 0 from rounding when the window holds only zeros
+            yield total * total / (window * squares) if squares > 1e-12 * (total * total + 1) else 1.0
+
+
+def rolling_jains(values, window):
+    '''
+    Description: Fairness index of every window of consecutive values of a time series.
+    With NumPy the sums of all windows are taken from cumulative sums at once.
+    Parameters:
+        values: list or array of rates
+        window: number of values in a window
+    Returns:
+        array (list without NumPy) with len(values) - window + 1 fairness indexes
+    '''
+    if np is None:
+        return list(iter_rolling_jains(values, window))
+    a = np.asarray(values, dtype=np.float64)
+    if a.size < window:
+        return np.empty(0)
+    total = np.cumsum(np.concatenate(([0.0], a)))
+    squares = np.cumsum(np.concatenate(([0.0], a * a)))
+    total = total[window:] - total[:-window]
+    squares = squares[window:] - squares[:-window]
+    result = np.ones_like(total)
+    nonzero = squares > 1e-12 * (total * total + 1)
+    result[nonzero] = total[nonzero] ** 2 / (window * squares[nonzero])
+    return result
+
+
+def grouped_jains(keys, values):
+    '''
+    Description: Fairness index per group, e.g. over the flows of each interval of a test.
+    With NumPy the groups are summed with bincount.
+    Parameters:
+        keys: group of each value
+        values: the rates
+    Returns:
+        dictionary with the fairness index of each group (key: group)
+    '''
+    if np is None:
+        groups = {}
+        for key, x in zip(keys, values):
+            groups.setdefault(key, JainsStream()).add(x)
+        return {key: stream.value() for key, stream in groups.items()}
+    groups, index = np.unique(np.asarray(keys), return_inverse=True)
+    a = np.asarray(values, dtype=np.float64)
+    n = np.bincount(index)
+    total = np.bincount(index, weights=a)
+    squares = np.bincount(index, weights=a * a)
+    result = {}
+    for key, count, t, s in zip(groups.tolist(), n, total, squares):
+        result[key] = float(t * t / (count * s)) if s else 1.0
+    return result
+
+
+def read_columns(path, column=default_column, group_column=None, chunk=default_chunk):
+    '''
+    Description: Reads a file of numbers in chunks of lines, so files of any size can be read.
+    Lines without a number in the column (headers, empty lines) are skipped.
+    Parameters:
+        path: path to the file
+        column: column of the number (columns are split on white space)
+        group_column: column of the group of each number (None: no groups)
+        chunk: number of lines per chunk
+    Returns:
+        generator of (values, groups, skipped lines) per chunk, groups is None without group_column
+    '''
+    with open(path) as f:
+        while True:
+            lines = list(itertools.islice(f, chunk))
+            if not lines:
+                break
+            values = []
+            groups = [] if group_column is not None else None
+            skipped = 0
+            for line in lines:
+                fields = line.split()
+                try:
+                    x = float(fields[column])
+                    key = fields[group_column] if group_column is not None else None
+                except (IndexError, ValueError):
+                    skipped += 1
+                    continue
+                values.append(x)
+                if groups is not None:
+                    groups.append(key)
+            yield values, groups, skipped
+
+
+def process_file(args):
+    '''
+    Description: Computes the fairness of one file (the work of one process of the command line tool).
+    Parameters:
+        args: (path, column, group column, rolling window)
+    Returns:
+        dictionary with the results of the file
+    '''
+    path, column, group_column, window = args
+    total = JainsStream()
+    groups = {}
+    rolling = {'n': 0, 'min': math.inf, 'max': -math.inf, 'sum': 0.0}
+    skipped = 0
+    tail = []  # last window - 1 values of the previous chunk, for windows across chunks
+    try:
+        for values, keys, n in read_columns(path, column, group_column):
+            skipped += n
+            total.extend(np.asarray(values) if np is not None else values)
+            if keys is not None:
+                for key, x in zip(keys, values):
+                    groups.setdefault(key, JainsStream()).add(x)
+            if window:
+                series = rolling_jains(tail + values, window)
+                if len(series):
+                    rolling['n'] += len(series)
+                    if np is not None:
+                        low, high, total_ = float(series.min()), float(series.max()), float(series.sum())
+                    else:
+                        low, high, total_ = min(series), max(series), sum(series)
+                    rolling['min'] = min(rolling['min'], low)
+                    rolling['max'] = max(rolling['max'], high)
+                    rolling['sum'] += total_
+                tail = (tail + values)[-(window - 1):] if window > 1 else []
+    except OSError as e:
+        return {'path': path, 'error': str(e)}
+    return {'path': path, 'n': total.n, 'jfi': total.value(), 'skipped': skipped,
+            'groups': {key: (stream.n, stream.value()) for key, stream in groups.items()},
+            'rolling': rolling if window else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Jain's fairness index of the numbers in one or more files")
+    parser.add_argument('files', nargs='+',
+                        help='Files with one number per line (more columns are allowed)')
+    parser.add_argument('-c', '--column', default=default_column,
+                        help='Column of the number (0 is the first)')
+    parser.add_argument('-g', '--group-column', default=None,
+                        help='Column of a group (e.g. the interval), the index is also computed per group')
+    parser.add_argument('-w', '--window', default=0,
+                        help='Also compute the index over every window of this many consecutive numbers')
+    parser.add_argument('-j', '--jobs', default=None,
+                        help='Number of files processed at the same time (default: number of CPUs)')
+    args = parser.parse_args()
+
+    try:
+        column = int(args.column)
+        group_column = int(args.group_column) if args.group_column is not None else None
+        window = int(args.window)
+        jobs = int(args.jobs) if args.jobs is not None else multiprocessing.cpu_count()
+    except ValueError:
+        print("Error: column, group column, window and jobs must be integers")
+        sys.exit(1)
+
+    if column < 0 or (group_column is not None and group_column < 0) or window < 0 or jobs < 1:
+        print("Error: column, group column and window must be 0 or more and jobs at least 1")
+        sys.exit(1)
+
+    work = [(path, column, group_column, window) for path in args.files]
+    jobs = min(jobs, len(work))
+    if jobs > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.map(process_file, work)
+    else:
+        results = [process_file(w) for w in work]
+
+    failed = False
+    for result in results:
+        if 'error' in result:
+            print("Error: {}: {}".format(result['path'], result['error']))
+            failed = True
+            continue
+        line = "{}: {} values, JFI {:.6f}".format(result['path'], result['n'], result['jfi'])
+        if result['skipped']:
+            line += " ({} lines skipped)".format(result['skipped'])
+        print(line)
+        rolling = result['rolling']
+        if rolling is not None and rolling['n']:
+            print("  window {}: min {:.6f}, mean {:.6f}, max {:.6f} over {} windows".format(
+                window, rolling['min'], rolling['sum'] / rolling['n'], rolling['max'], rolling['n']))
+        for key, (n, jfi) in result['groups'].items():
+            print("  {}: {} values, JFI {:.6f}".format(key, n, jfi))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
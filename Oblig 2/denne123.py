@@ -2,6 +2,8 @@ from socket import *
 import sys
 import select
 
+from protokoll import Dekoder, ramme
+
 #def main():
 socketClient = socket(AF_INET, SOCK_STREAM) #Oppretter socket for client
 clientPort = 1234 #setter port
@@ -13,29 +15,49 @@ except:
     print ("connection error")
     sys.exit()
 
+print("Kommandoer: /join <rom>, /leave <rom>, /rooms, exit")
+dekoder = Dekoder() #setter sammen meldingene fra serveren
+ferdig = False
 
-
-while True:
+while not ferdig:
     inputs = [sys.stdin, socketClient] 
     read_sockets,write_socket, error_socket = select.select(inputs,[],[]) 
 
     # we check if the message is either coming from your terminal or from a server
     for socks in read_sockets:
         if socks == socketClient:
-            #lese data fra socket
-            data = socketClient.recv(1024).decode()
-
-            if (data == "exit" or not data):
+            #lese data fra socket, en recv kan inneholde flere meldinger eller bare en del av en
+            data = socketClient.recv(65536)
+            if not data:
+                ferdig = True
                 break
-            #print
-            print(data)
+            try:
+                meldinger = dekoder.feed(data)
+            except ValueError:
+                print("protocol error")
+                ferdig = True
+                break
+            for melding in meldinger:
+                #print
+                print(melding.decode(errors='replace').rstrip('\n'))
 
         else:
             #takes inputs from the user
             message = sys.stdin.readline()
-             #sende data
+            if not message:
+                ferdig = True
+                break
+             #sende data med lengden foran
             
-            socketClient.send(message.encode());
+            try:
+                data = ramme(message.encode())
+            except ValueError as e:
+                print(e)  #for lang melding, den sendes ikke
+                continue
+            socketClient.sendall(data)
+            if message.strip() == "exit":
+                ferdig = True
+                break
 
     
 socketClient.close()
@@ -1,88 +1,415 @@
-from queue import Empty
+import argparse
+import collections
+import errno
+import itertools
+import math
+import multiprocessing
+import selectors
+import sys
+import time
 from socket import *
-import _thread as thread
-import socketserver
 
+from protokoll import Dekoder, ramme, send_mange, maksIov, maksMelding
 
-#lage array her som inneholder alle klienter som kobler seg tl
-tilkoblet=[]
 
+#Standardverdier
+serverPort = 1234
+serverIp = '127.0.0.1'
+maksKoo = 256  #maks antall meldinger som kan ligge i utgaaende koo til en klient
+maksBytes = 1024 * 1024  #maks antall bytes i koo til en klient
+maksBusBytes = 64 * 1024 * 1024  #maks antall bytes i koo til en annen shard, en shard som ikke leser kobles fra
+tregKlient = 'drop'  #hva vi gjoor naar koo er full: 'drop' kaster meldingen, 'disconnect' kobler klienten fra
+lobby = 'lobby'  #rommet alle er med i naar de kobler til
+antallShards = 1  #prosesser som deler porten (SO_REUSEPORT)
+maksRomNavn = 32  #i bytes
+maksBus = maksMelding + maksRomNavn + 1  #en melding paa bussen har navnet paa rommet og et linjeskift foran
+pauseAccept = 0.1  #sekunder uten nye tilkoblinger naar serveren er tom for fildeskriptorer
 
-#denne lager en traad for hver connection, saa alle blir ikke inni her en funksjonen vil kjoore samtidig om flere blir sendt inn.
-def handleClient(connection, addr):
-    
-    
-    #legger til i liste
-    tilkoblet.append(connection);
-    #Kaller broadkast og sender inn den som er klienten som kobler til foorst. 
-    hei = "En person har joina"
-    broadcast(connection, hei)
 
-   
+class Klient:
+    '''
+    Description: En tilkoblet klient med sin egen utgaaende koo. Meldinger legges i koo og sendes naar
+    socketen er klar til aa skrive, saa en treg klient aldri stopper serveren eller de andre klientene.
+    Methods:
+        legg_i_koo(): legger en melding i koo (False naar koo er full)
+        send_fra_koo(): sender hele koo med ett sendmsg-kall, saa langt socketen tar imot
+    '''
 
-    
-    while True:
-            #tar i mot meldinger fra hver klient
-            data = connection.recv(1024).decode()
-            
-            
-            if (data == "exit"):
+    def __init__(self, connection, addr, peer=False):
+        self.connection = connection
+        self.addr = addr
+        self.peer = peer  #en forbindelse til en annen shard (bussen), ikke en bruker
+        self.ut = collections.deque()  #meldinger (bytes) som venter paa aa bli sendt
+        self.utBytes = 0
+        self.kastet = 0  #meldinger som er kastet fordi koo var full
+        self.dekoder = Dekoder(maksBus if peer else maksMelding)  #setter sammen meldingene fra klienten
+        self.skriver = False  #om socketen er registrert for EVENT_WRITE
+        self.rom = set()  #rommene klienten er med i
+        self.aktivt = None  #rommet vanlige meldinger sendes til
+
+    def legg_i_koo(self, data, maks_koo, maks_bytes):
+        if len(self.ut) >= maks_koo or self.utBytes + len(data) > maks_bytes:
+            return False
+        self.ut.append(data)
+        self.utBytes += len(data)
+        return True
+
+    def send_fra_koo(self):
+        #alle meldingene i koo sendes med ett kall; det som ikke fikk plass sendes naar socketen er skrivbar igjen
+        #Returns: (antall kall, antall meldinger som ble sendt helt)
+        try:
+            sendt = send_mange(self.connection, list(itertools.islice(self.ut, maksIov)))
+        except BlockingIOError:
+            return 1, 0
+        self.utBytes -= sendt
+        ferdige = 0
+        while sendt:
+            if sendt < len(self.ut[0]):
+                self.ut[0] = self.ut[0][sendt:]
                 break
-#Kaller brodcast med connection og sender inn meldingen vi mottok.
-            broadcast(connection, data)
-            
-    connection.close() #avslutter connection
-    tilkoblet.remove(connection); #Fjerner connection fra listen når den ikke er tilkoblet lenger
-
-
-def broadcast(hoved, melding):
-    
-    
-    #Hvis broadcast kkalles med en person har joinet:
-    if (melding =="En person har joina"):
-        #Looper gjennom alle 
-        for klient in tilkoblet:
-        #sjekk om det er klienten som tilkoblet foorst. hvis det ikke er det sender vi melding.
-            if (klient is not hoved):
-                klient.send(melding.encode());
-    #hvis det er annen melding vi sender med broadcast  
-    else:
-        for klient in tilkoblet:
-        #sjekk om det er klienten som tilkoblet foorst. hvis det ikke er det sender vi meldingen til de andre klientene.
-            if (klient is not hoved):
-                klient.send(melding.encode());
-
-    
+            sendt -= len(self.ut.popleft())
+            ferdige += 1
+        return 1, ferdige
 
-def main():
-    #Setter porten-Dette er serverporten vi maa ha i klienten etterpaa.
-    serverPort = 1234 
+
+class ChatServer:
+    '''
+    Description: Chat server med en selectors-loop i en traad i stedet for en traad per klient.
+    broadcast() bare legger meldingen i koo til hver klient, saa den tar like kort tid uansett hvor
+    treg en klient er. Koo til hver klient sendes en gang etter at alle hendelsene i en runde er
+    behandlet, saa flere meldinger til samme klient gaar i ett sendmsg-kall.
+    Meldinger sendes bare til medlemmene av et rom (/join, /leave), saa arbeidet per melding
+    avhenger av hvor stort rommet er og ikke av hvor mange som er tilkoblet.
+    Med flere shards sendes hver melding ogsaa en gang til hver av de andre shardene over bussen
+    (Unix sockets), og de leverer den til sine egne medlemmer av rommet.
+    Methods:
+        run(): tar imot klienter og meldinger til serveren stoppes
+        broadcast(): sender en melding til alle andre i et rom
+        kommando(): utfoorer /join, /leave og /rooms
+    '''
+
+    def __init__(self, socketServer, maks_koo=maksKoo, maks_bytes=maksBytes, treg=tregKlient, peers=()):
+        self.socketServer = socketServer
+        self.maks_koo = maks_koo
+        self.maks_bytes = maks_bytes
+        self.treg = treg
+        self.selector = selectors.DefaultSelector()
+        self.tilkoblet = {}  #key: socket, value: Klient
+        self.rom = {}  #key: navnet paa rommet, value: set med Klient (medlemmene)
+        self.skitne = {}  #klienter med nye meldinger i koo i denne runden (dict for fast rekkefoolge)
+        self.sendkall = 0
+        self.levert = 0  #meldinger sendt helt til en klient
+        self.selector.register(socketServer, selectors.EVENT_READ, None)
+        self.pause = None  #naar serveren tar imot tilkoblinger igjen (None: den gjoor det naa)
+        self.peers = []  #forbindelsene til de andre shardene
+        for connection in peers:
+            connection.setblocking(False)
+            peer = Klient(connection, 'shard', peer=True)
+            self.peers.append(peer)
+            self.tilkoblet[connection] = peer
+            self.selector.register(connection, selectors.EVENT_READ, peer)
+
+    def run(self):
+        while True:
+            timeout = None if self.pause is None else max(0, self.pause - time.monotonic())
+            for key, events in self.selector.select(timeout):
+                if key.data is None:
+                    self.accept()
+                    continue
+                klient = key.data
+                if events & selectors.EVENT_READ:
+                    self.read(klient)
+                if events & selectors.EVENT_WRITE and klient.connection in self.tilkoblet:
+                    self.skitne[klient] = None
+            #ett sendmsg-kall per klient per runde, med alle meldingene som kom i runden
+            skitne, self.skitne = self.skitne, {}
+            for klient in skitne:
+                if klient.connection in self.tilkoblet:
+                    self.write(klient)
+            if self.pause is not None and time.monotonic() >= self.pause:
+                self.pause = None
+                self.selector.register(self.socketServer, selectors.EVENT_READ, None)
+
+    def accept(self):
+        try:
+            connection, addr = self.socketServer.accept()
+        except BlockingIOError:
+            return  #klienten var borte eller en annen shard tok den
+        except OSError as e:
+            #f.eks. ECONNABORTED eller EMFILE, serveren fortsetter med de andre klientene
+            print('kunne ikke ta imot en tilkobling:', e)
+            if e.errno in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM):
+                #tilkoblingen venter fortsatt i koo, saa socketen er lesbar hele tiden; vent litt i stedet for aa spinne
+                self.selector.unregister(self.socketServer)
+                self.pause = time.monotonic() + pauseAccept
+            return
+        print('server er tilkoblet med ', addr)
+        connection.setblocking(False)
+        klient = Klient(connection, addr)
+        self.tilkoblet[connection] = klient
+        self.selector.register(connection, selectors.EVENT_READ, klient)
+        self.join(klient, lobby)
+
+    def read(self, klient):
+        try:
+            data = klient.connection.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        #tom data betyr at klienten har lukket forbindelsen
+        if not data:
+            self.fjern(klient)
+            return
+        try:
+            meldinger = klient.dekoder.feed(data)
+        except ValueError as e:
+            print('feil i protokollen fra', klient.addr, e)
+            self.fjern(klient)
+            return
+        if klient.peer:
+            self.fra_bus(meldinger)
+            return
+        for data in meldinger:
+            melding = data.decode(errors='replace')  #teksten brukes bare til kommandoer
+            if melding.strip() in ("exit", "/exit"):
+                self.fjern(klient)
+                return
+            if melding.startswith('/'):
+                self.kommando(klient, melding.split())
+            elif klient.aktivt is None:
+                self.send_til(klient, "Du er ikke med i noe rom, bruk /join <rom>")
+            else:
+                #bytene sendes videre som de kom: ugyldig UTF-8 blir lengre naar den kodes paa nytt
+                self.broadcast(klient, data, klient.aktivt)
+            if klient.connection not in self.tilkoblet:
+                return  #klienten ble koblet fra (f.eks. full koo med --slow disconnect), resten av meldingene droppes
+
+    def kommando(self, klient, ord):
+        if ord[0] in ('/join', '/leave') and len(ord) == 2 and len(ord[1].encode()) <= maksRomNavn:
+            if ord[0] == '/join':
+                self.join(klient, ord[1])
+            else:
+                self.leave(klient, ord[1])
+        elif ord[0] == '/rooms' and len(ord) == 1:
+            rom = ', '.join('{} ({})'.format(navn, len(medlemmer)) for navn, medlemmer in sorted(self.rom.items()))
+            #med flere shards vet vi bare om medlemmene paa denne sharden
+            self.send_til(klient, ("Rom paa denne sharden: " if self.peers else "Rom: ") + rom)
+        else:
+            self.send_til(klient, "Kommandoer: /join <rom>, /leave <rom>, /rooms, /exit")
+
+    def join(self, klient, navn):
+        #rommet blir aktivt, og de andre i rommet faar vite at en ny person er med
+        klient.aktivt = navn
+        if navn in klient.rom:
+            return
+        klient.rom.add(navn)
+        self.rom.setdefault(navn, set()).add(klient)
+        self.broadcast(klient, "En person har joina" if navn == lobby else "En person har joina " + navn, navn)
+
+    def leave(self, klient, navn):
+        if navn not in klient.rom:
+            self.send_til(klient, "Du er ikke med i " + navn)
+            return
+        klient.rom.discard(navn)
+        medlemmer = self.rom[navn]
+        medlemmer.discard(klient)
+        if not medlemmer:
+            del self.rom[navn]  #tomme rom fjernes
+        else:
+            self.broadcast(klient, "En person har forlatt " + navn, navn)
+        if klient.aktivt == navn:
+            klient.aktivt = min(klient.rom) if klient.rom else None
+
+    def write(self, klient):
+        try:
+            kall, ferdige = klient.send_fra_koo()
+        except OSError:
+            self.fjern(klient)
+            return
+        self.sendkall += kall
+        if not klient.peer:
+            self.levert += ferdige
+        #vi trenger bare vite naar socketen er skrivbar naar noe ikke fikk plass
+        if bool(klient.ut) != klient.skriver:
+            klient.skriver = bool(klient.ut)
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE if klient.skriver else selectors.EVENT_READ
+            self.selector.modify(klient.connection, events, klient)
+
+    def broadcast(self, hoved, melding, navn):
+        if isinstance(melding, str):
+            melding = melding.encode()
+        data = ramme(melding)  #rammen lages en gang for alle mottakere
+        for klient in list(self.rom.get(navn, ())):
+            if klient is not hoved:
+                self.legg_til(klient, data)
+        if self.peers:
+            #paa bussen: navnet paa rommet, linjeskift og meldingen (romnavn har ikke mellomrom)
+            bus = ramme(navn.encode() + b'\n' + melding, maksBus)
+            for peer in list(self.peers):
+                self.legg_til(peer, bus)
+
+    def fra_bus(self, meldinger):
+        #meldinger fra en annen shard leveres bare til medlemmene av rommet her
+        for melding in meldinger:
+            navn, _, tekst = melding.partition(b'\n')
+            medlemmer = self.rom.get(navn.decode(errors='replace'))
+            if medlemmer:
+                data = ramme(tekst)
+                for klient in list(medlemmer):
+                    self.legg_til(klient, data)
+
+    def send_til(self, klient, melding):
+        #svar fra serveren (f.eks. /rooms med veldig mange rom) kuttes heller enn aa bryte protokollen
+        self.legg_til(klient, ramme(melding.encode()[:maksMelding]))
+
+    def legg_til(self, klient, data):
+        #legger meldingen i koo til klienten, den sendes paa slutten av runden
+        #koo til en annen shard har bare en grense i bytes, ellers ville meldinger til alle klientene der bli kastet
+        maks_koo, maks_bytes = (math.inf, maksBusBytes) if klient.peer else (self.maks_koo, self.maks_bytes)
+        if not klient.legg_i_koo(data, maks_koo, maks_bytes):
+            if klient.peer:
+                #sharden leser ikke lenger (henger eller er borte), saa koo ville vokse uten grense
+                print('koo til en annen shard er full, kobler fra')
+                self.fjern(klient)
+            elif self.treg == 'disconnect':
+                print('kobler fra treg klient', klient.addr)
+                self.fjern(klient)
+            else:
+                klient.kastet += 1
+            return
+        self.skitne[klient] = None
+
+    def fjern(self, klient):
+        if klient.connection not in self.tilkoblet:
+            return
+        del self.tilkoblet[klient.connection]
+        for navn in klient.rom:
+            medlemmer = self.rom[navn]
+            medlemmer.discard(klient)
+            if not medlemmer:
+                del self.rom[navn]
+        self.selector.unregister(klient.connection)
+        klient.connection.close()
+        if klient.peer:
+            print('mistet forbindelsen til en annen shard')
+            self.peers.remove(klient)
+        if klient.kastet:
+            print('kastet {} meldinger til {}'.format(klient.kastet, klient.addr))
+
+
+def lag_socket(bind, port, reuseport=False):
     #Oppretter TCP socket.-standardfunksjon i pyton.
     socketServer = socket(AF_INET, SOCK_STREAM)
-    try:
-    #linje med Python-kode som binder en socket til en spesifikk IP-adresse og port.Sender med argumenter. Med andre ord, setter opp socketen til aa lytte til alle tilgjengelige IP-adresser paa den angitte porten.
-        socketServer.bind(('127.0.0.1', serverPort)) 
-    except:
-        print("Bind failed. Error : ")
-    #Server begynner aa lytte for innkommende TCP request. argumentet angir maksimal antall tilkoblingsforespoorsler som kan vaere i koo foor nye tilkoblingsforespoorsler blir avvist. Ved aa sette denne verdien til 1, angir vi at bare en enkelt tilkoblingsforespoorsl kan vaere i koo foor de blir avvist
-    socketServer.listen(1) 
-    print('Server er klar til aa ta i mot ')
-
-    #Saa lenge den er sann saa aksepter
-    while True:
-        #kaller metoden "accept" paa socketen og venter paa en tilkoblingsforespoorsel fra en klient. Naar en tilkobling er etablert, returnerer "accept" metoden en ny socket (kalt "client") som kan brukes til aa sende og motta data til/fra klienten, samt en tuple med informasjon om klientens IP-adresse og portnummer (kalt "addr")
-        cSocket, addr = socketServer.accept() 
-        print('server er tilkoblet med ' , addr)
-        #oppretter ny prosess/tråd 
-        thread.start_new_thread(handleClient, (cSocket,addr))
+    socketServer.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    if reuseport:
+        #alle shards lytter paa samme port, og kjernen fordeler nye forbindelser mellom dem
+        socketServer.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    socketServer.bind((bind, port))
+    socketServer.listen(128)
+    socketServer.setblocking(False)
+    return socketServer
 
+
+def serve(socketServer, maks_koo, treg, peers=(), navn=''):
+    server = ChatServer(socketServer, maks_koo, maksBytes, treg, peers)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    if server.levert:
+        print('{}{} meldinger levert med {} send-kall ({:.1f} meldinger per kall)'.format(
+            navn, server.levert, server.sendkall, server.levert / max(server.sendkall, 1)))
     socketServer.close()
-    
-    
 
 
+def shard(nummer, socketServer, maks_koo, treg, peers, andre):
+    '''
+    Description: En shard (egen prosess) med sin egen socket paa samme port og sin del av klientene
+    Parameters:
+        nummer: nummeret til sharden
+        socketServer: socketen til sharden (SO_REUSEPORT)
+        maks_koo: maks antall meldinger i koo til en klient
+        treg: hva som gjoores med en treg klient ('drop' eller 'disconnect')
+        peers: Unix sockets til de andre shardene
+        andre: socketene til de andre shardene, som prosessen arver fra main()
+    Returns:
+        None
+    '''
+    #naar en shard doer skal kjernen slutte aa sende nye forbindelser til socketen dens,
+    #og de andre shardene skal faa EOF paa bussen; det skjer bare hvis ingen andre holder dem aapne
+    for connection in andre:
+        connection.close()
+    serve(socketServer, maks_koo, treg, peers, 'shard {}: '.format(nummer))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat server")
+    parser.add_argument('-b', '--bind', default=serverIp,
+                        help='IP-adressen serveren lytter paa')
+    parser.add_argument('-p', '--port', default=serverPort,
+                        help='Porten serveren lytter paa')
+    parser.add_argument('-q', '--queue', default=maksKoo,
+                        help='Maks antall meldinger i koo til en klient')
+    parser.add_argument('--slow', choices=['drop', 'disconnect'], default=tregKlient,
+                        help='Naar koo til en klient er full: kast meldingen (drop) eller koble fra klienten (disconnect)')
+    parser.add_argument('-s', '--shards', default=antallShards,
+                        help='Antall prosesser som deler porten (SO_REUSEPORT), en per kjerne')
+    args = parser.parse_args()
+
+    try:
+        port = int(args.port)
+        maks_koo = int(args.queue)
+        shards = int(args.shards)
+    except ValueError:
+        print("Error: port, koo og shards maa vaere heltall")
+        sys.exit(1)
+    if not 0 < port < 65536 or maks_koo < 1 or shards < 1:
+        print("Error: port maa vaere mellom 1 og 65535 og koo og shards minst 1")
+        sys.exit(1)
+    if shards > 1 and ('SO_REUSEPORT' not in globals() or 'AF_UNIX' not in globals()):
+        print("Error: flere shards trenger SO_REUSEPORT og Unix sockets (Linux)")
+        sys.exit(1)
+
+    try:
+        #alle socketene lages her, saa en feil kommer foor noen shard er startet
+        sockets = [lag_socket(args.bind, port, reuseport=shards > 1) for _ in range(shards)]
+    except OSError as e:
+        print("Bind failed. Error : ", e)
+        sys.exit(1)
+    if shards == 1:
+        print('Server er klar til aa ta i mot ')
+        serve(sockets[0], maks_koo, args.slow)
+        return
+
+    #bussen: et par Unix sockets mellom hver to shards, saa en melding gaar direkte dit den skal
+    peers = [[] for _ in range(shards)]
+    for i in range(shards):
+        for j in range(i + 1, shards):
+            a, b = socketpair(AF_UNIX, SOCK_STREAM)
+            peers[i].append(a)
+            peers[j].append(b)
+    alle = sockets + [connection for connections in peers for connection in connections]
+    prosesser = []
+    for i in range(shards):
+        egne = [sockets[i]] + peers[i]
+        andre = [connection for connection in alle if connection not in egne]
+        prosesser.append(multiprocessing.Process(target=shard, args=(i, sockets[i], maks_koo, args.slow, peers[i],
+                                                                         andre)))
+    for p in prosesser:
+        p.start()
+    for connection in alle:
+        connection.close()  #bare shardene bruker dem
+    print('Server er klar til aa ta i mot ({} shards)'.format(shards))
+    try:
+        for p in prosesser:
+            p.join()
+    except KeyboardInterrupt:
+        for p in prosesser:
+            p.join()  #shardene faar ogsaa Ctrl-C og avslutter selv
+    if any(p.exitcode for p in prosesser):
+        sys.exit(1)
+
 
-main()  
-    
- 
-    
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import struct
+
+
+#Hver melding sendes som lengden (4 bytes, network byte order) og saa selve meldingen,
+#saa mottakeren vet hvor en melding slutter selv om TCP slaar sammen eller deler dem opp.
+header = struct.Struct('!I')
+maksMelding = 65536  #lengre meldinger er en feil i protokollen
+maksIov = 1024  #maks antall buffere i ett sendmsg-kall (IOV_MAX paa Linux)
+
+
+def ramme(data, maks=maksMelding):
+    '''
+    Description: Lager en melding med lengden foran
+    Parameters:
+        data: meldingen (bytes)
+        maks: lengste melding som er lov
+    Returns:
+        lengde + melding (bytes)
+    '''
+    if len(data) > maks:
+        raise ValueError('meldingen er lengre enn {} bytes'.format(maks))
+    return header.pack(len(data)) + data
+
+
+class Dekoder:
+    '''
+    Description: Setter sammen meldinger fra bytes slik de kommer fra recv(), uansett hvordan de er delt opp.
+    Methods:
+        feed(): legger til bytes og returnerer meldingene som er komplette
+    '''
+
+    def __init__(self, maks=maksMelding):
+        self.buffer = bytearray()
+        self.maks = maks  #lengste melding som er lov
+
+    def feed(self, data):
+        self.buffer += data
+        meldinger = []
+        start = 0
+        while len(self.buffer) - start >= header.size:
+            lengde, = header.unpack_from(self.buffer, start)
+            if lengde > self.maks:
+                raise ValueError('meldingen er lengre enn {} bytes'.format(self.maks))
+            slutt = start + header.size + lengde
+            if slutt > len(self.buffer):
+                break
+            meldinger.append(bytes(self.buffer[start + header.size:slutt]))
+            start = slutt
+        del self.buffer[:start]  #fjerner de ferdige meldingene en gang, ikke for hver melding
+        return meldinger
+
+
+def send_mange(connection, buffere):
+    '''
+    Description: Sender flere buffere med ett kall (sendmsg samler dem, som writev), eller sammenslaatt
+    der sendmsg ikke finnes (Windows)
+    Parameters:
+        connection: socket
+        buffere: liste med bytes
+    Returns:
+        antall bytes som ble sendt
+    '''
+    buffere = buffere[:maksIov]
+    if hasattr(connection, 'sendmsg'):
+        return connection.sendmsg(buffere)
+    return connection.send(b''.join(buffere))